@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark write throughput and on-disk size of the page body codecs.
+
+Uses the pages of an existing crawl (--input) or generated news-like HTML, and
+writes them with every available codec through both storage layouts.
+"""
+
+import os
+import time
+import shutil
+import random
+import argparse
+import tempfile
+
+from vibe_scraping.compression import CODECS, ZSTD_AVAILABLE
+from vibe_scraping.page_store import create_page_store, open_page_store, url_to_hash
+
+WORDS = ["საქართველო", "თბილისი", "პარლამენტი", "მთავრობა", "news", "article",
+         "sport", "economy", "politics", "weather", "culture", "ამბები"]
+
+
+def generate_pages(count, seed=42):
+    """Generate news-like HTML pages with shared boilerplate and varying article text."""
+    rng = random.Random(seed)
+    nav = "".join(f'<li><a href="/category/{i}">{rng.choice(WORDS)}</a></li>' for i in range(60))
+    pages = []
+    for i in range(count):
+        paragraphs = "".join(
+            "<p>" + " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120))) + "</p>"
+            for _ in range(rng.randint(5, 15))
+        )
+        html = (f"<html><head><title>Article {i}</title>"
+                f"<script>var config = {{page: {i}, ads: true}};</script></head>"
+                f"<body><ul class='nav'>{nav}</ul><article>{paragraphs}</article>"
+                f"<footer>{nav}</footer></body></html>")
+        pages.append((f"https://example.ge/news/{i}", html.encode('utf-8')))
+    return pages
+
+
+def load_pages(crawl_data_path, limit):
+    """Load up to limit page bodies from an existing crawl."""
+    pages = []
+    for body, page_metadata in open_page_store(crawl_data_path).scan():
+        pages.append((page_metadata.get("url", str(len(pages))), body))
+        if len(pages) >= limit:
+            break
+    return pages
+
+
+def directory_size(path):
+    """Return the total size in bytes of all files below path."""
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            total += os.path.getsize(os.path.join(root, file))
+    return total
+
+
+def run_benchmark(pages, storage, codec):
+    """Write all pages with one storage layout and codec; return (seconds, bytes on disk)."""
+    output_dir = tempfile.mkdtemp(prefix=f"vibe_bench_{storage}_{codec}_")
+    try:
+        store = create_page_store(output_dir, storage=storage, compression=codec)
+        start = time.perf_counter()
+        for url, body in pages:
+            store.write_page(url_to_hash(url), body, {"url": url, "html_length": len(body)})
+        store.close()
+        elapsed = time.perf_counter() - start
+        return elapsed, directory_size(output_dir)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark page body compression codecs")
+    parser.add_argument("--input", help="Crawl data directory to read pages from (default: generated pages)")
+    parser.add_argument("--pages", type=int, default=2000, help="Number of pages to write")
+    args = parser.parse_args()
+
+    pages = load_pages(args.input, args.pages) if args.input else generate_pages(args.pages)
+    raw_bytes = sum(len(body) for _, body in pages)
+    print(f"Benchmarking {len(pages)} pages, {raw_bytes / (1024 * 1024):.2f} MB of raw HTML")
+
+    codecs = [codec for codec in CODECS if codec != "zstd" or ZSTD_AVAILABLE]
+    if not ZSTD_AVAILABLE:
+        print("zstandard is not installed, skipping zstd (pip install zstandard)")
+
+    print(f"\n{'storage':<10} {'codec':<6} {'pages/s':>10} {'MB/s':>8} {'on disk MB':>11} {'ratio':>6}")
+    for storage in ("directory", "segments"):
+        for codec in codecs:
+            elapsed, disk_bytes = run_benchmark(pages, storage, codec)
+            print(f"{storage:<10} {codec:<6} {len(pages) / elapsed:>10.0f} "
+                  f"{raw_bytes / elapsed / (1024 * 1024):>8.1f} "
+                  f"{disk_bytes / (1024 * 1024):>11.2f} {raw_bytes / disk_bytes:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
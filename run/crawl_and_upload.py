@@ -11,6 +11,8 @@ from urllib.parse import urlparse
 import tldextract
 from botocore.exceptions import ClientError, NoCredentialsError
 from vibe_scraping.crawler import WebCrawler
+from vibe_scraping.crawl_index import open_crawl_index
+from vibe_scraping.compression import CONTENT_ENCODINGS, FILE_EXTENSIONS, codec_from_filename
 from dotenv import load_dotenv
 from boto3.s3.transfer import TransferConfig
 import json
@@ -36,7 +38,20 @@ def crawler_func(websites,
                 max_depth=5, 
                 remove_local_files=True, 
                 skip_existing=True,
-                force_fresh_crawl=True):
+                force_fresh_crawl=True,
+                storage="directory",
+                compression="none",
+                deduplicate_bodies=True,
+                incremental=True,
+                state_dir="./crawl_state",
+                revisit_budget=None,
+                discover_seeds=True,
+                url_scorer="article",
+                adaptive_throttle=True,
+                workers=1,
+                shared_frontier=None,
+                resume=False,
+                runner=None):
     """
     Crawls websites and uploads the data to an S3 bucket.
     
@@ -48,14 +63,98 @@ def crawler_func(websites,
         remove_local_files (bool): Whether to remove local files after upload
         skip_existing (bool): Whether to skip existing files in S3
         force_fresh_crawl (bool): Whether to force a fresh crawl by disabling HTTP cache
+        storage (str): Page storage layout, 'directory' or 'segments' (fewer, larger files to upload)
+        compression (str): Codec for stored page bodies, 'none', 'gzip' or 'zstd'
+        deduplicate_bodies (bool): Store identical page bodies once under blobs/, so each
+            distinct body is uploaded only once
+        incremental (bool): Send conditional requests using the ETag / Last-Modified
+            validators of earlier runs; unchanged pages are neither written nor uploaded
+        state_dir (str): Directory for the crawl index, kept between runs (the upload
+            directory is removed after each upload)
+        revisit_budget (int): Revisit at most this many known pages, picked by their
+            estimated change rate; new pages are always fetched
+        discover_seeds (bool): Seed the crawl from the sites' sitemaps and RSS/Atom feeds,
+            so new articles are fetched first
+        url_scorer (str): Scorer that orders the frontier best-first ('article' by
+            default); None crawls breadth-first
+        adaptive_throttle (bool): Adapt each host's concurrency and delay to its latency
+            and errors, starting from the rates saved in state_dir
+        workers (int): Number of crawler processes; the websites are split across
+            them by domain and their results merged before the upload
+        shared_frontier (str): Path to a frontier database shared by several crawler
+            containers working on the same websites; each leases URLs from it, so no
+            page is fetched twice
+        resume (bool): Continue the crawl interrupted last time (its checkpoint is kept
+            in state_dir). A crawl interrupted while resume is set is not uploaded: its
+            pages stay in the upload directory and go up with the resumed crawl
+        runner: CrawlerRunner of a running crawl daemon (see vibe_scraping.daemon);
+            the crawl is scheduled on its reactor and a Deferred is returned
         
     Returns:
-        dict: Summary of the crawl and upload operation
+        dict: Summary of the crawl and upload operation, or a Deferred firing
+        with it when a runner is given
     """
     # Ensure websites is a list
     if isinstance(websites, str):
         websites = [websites]
         
+    # Crawl the websites
+    logger.info(f"Starting crawl of {len(websites)} websites: {', '.join(websites)}")
+    local_dir = "./data_to_upload"
+    os.makedirs(local_dir, exist_ok=True)
+
+    # Create and run crawler with force_fresh_crawl option
+    crawler = WebCrawler(
+        start_urls=websites,
+        max_depth=max_depth,
+        max_pages=max_pages,
+        respect_robots_txt=False,
+        save_path=local_dir,
+        force_fresh_crawl=force_fresh_crawl,
+        storage=storage,
+        compression=compression,
+        deduplicate_bodies=deduplicate_bodies,
+        state_path=state_dir,
+        incremental=incremental,
+        revisit_budget=revisit_budget,
+        discover_seeds=discover_seeds,
+        url_scorer=url_scorer,
+        adaptive_throttle=adaptive_throttle,
+        workers=workers,
+        shared_frontier=shared_frontier,
+        resume=resume
+    )
+
+    # Daemon mode: crawl on the daemon's reactor, then upload on a thread so the
+    # reactor keeps serving other work
+    if runner is not None:
+        from twisted.internet.threads import deferToThread
+        return crawler.crawl(runner=runner).addCallback(
+            lambda result: deferToThread(upload_crawl, websites, result, bucket, local_dir, state_dir,
+                                         remove_local_files, skip_existing, resume)
+        )
+
+    return upload_crawl(websites, crawler.crawl(), bucket, local_dir, state_dir,
+                        remove_local_files, skip_existing, resume)
+
+def upload_crawl(websites, result, bucket, local_dir, state_dir, remove_local_files=True,
+                 skip_existing=True, resume=False):
+    """
+    Uploads the pages of a finished crawl to an S3 bucket.
+    
+    Args:
+        websites (list): URLs the crawl started from
+        result (dict or int): Crawl statistics returned by WebCrawler.crawl
+        bucket (str): S3 bucket name
+        local_dir (str): Directory the crawl saved its pages to
+        state_dir (str): Directory of the crawl index
+        remove_local_files (bool): Whether to remove local files after upload
+        skip_existing (bool): Whether to skip existing files in S3
+        resume (bool): Whether an interrupted crawl will be resumed (and uploaded then)
+        
+    Returns:
+        dict: Summary of the crawl and upload operation
+    """
     # Create a map of URLs to their extracted domains and S3 prefixes
     url_to_domain = {url: extract_domain(url) for url in websites}
     url_to_raw_domain = {url: urlparse(url).netloc for url in websites}
@@ -71,26 +170,28 @@ def crawler_func(websites,
     
     # Create mapping from domain to S3 prefix
     domain_to_prefix = {domain: f"crawler_data/{domain}" for domain in domains}
-    
-    # Crawl the websites
-    logger.info(f"Starting crawl of {len(websites)} websites: {', '.join(websites)}")
-    local_dir = "./data_to_upload"
-    os.makedirs(local_dir, exist_ok=True)
-
-    # Create and run crawler with force_fresh_crawl option
-    crawler = WebCrawler(
-        start_urls=websites,
-        max_depth=max_depth,
-        max_pages=max_pages,
-        respect_robots_txt=False,
-        save_path=local_dir,
-        force_fresh_crawl=force_fresh_crawl
-    )
 
-    result = crawler.crawl()
     pages = result.get('pages_crawled', 0) if isinstance(result, dict) else result
+    dedup = result.get('dedup', {}) if isinstance(result, dict) else {}
+    conditional_get = result.get('conditional_get', {}) if isinstance(result, dict) else {}
+    revisit = result.get('revisit', {}) if isinstance(result, dict) else {}
+    seeds = result.get('seeds', {}) if isinstance(result, dict) else {}
+    crawl_yield = result.get('yield', {}) if isinstance(result, dict) else {}
+    content_gate = result.get('content_gate', {}) if isinstance(result, dict) else {}
+    traps = result.get('traps', {}) if isinstance(result, dict) else {}
     logger.info(f"Crawled {pages} pages to {local_dir}")
 
+    # Leave the upload to the resumed crawl, so a stopping container isn't killed mid-upload
+    if resume and isinstance(result, dict) and result.get('interrupted'):
+        logger.info("Crawl interrupted; its pages will be uploaded when it is resumed")
+        return {
+            'success': False,
+            'pages_crawled': pages,
+            'websites': websites,
+            'interrupted': True,
+            'error': 'Crawl interrupted before it finished'
+        }
+
     # Get AWS credentials from environment variables
     aws_access_key_id = os.environ.get('AWS_ACCESS_KEY')
     aws_secret_access_key = os.environ.get('AWS_SECRET_KEY')
@@ -208,24 +309,44 @@ def crawler_func(websites,
 
     # Create a URL to domain/prefix mapping for all pages crawled
     url_to_domain_map = {}
+    # Shared bodies are uploaded under the prefix of the first domain that served them
+    content_hash_to_domain = {}
     
-    # First, try to get the mapping from metadata files
-    for root, dirs, files in os.walk(local_dir):
-        for file in files:
-            if file == "metadata.json":
-                try:
-                    metadata_path = os.path.join(root, file)
-                    with open(metadata_path, 'r') as f:
-                        metadata = json.load(f)
-                    
-                    if "url" in metadata:
-                        url = metadata["url"]
-                        # Extract clean domain using tldextract
-                        clean_domain = extract_domain(url)
-                        if clean_domain in domain_to_prefix:
-                            url_to_domain_map[os.path.dirname(metadata_path)] = clean_domain
-                except Exception as e:
-                    logger.warning(f"Error reading metadata file {metadata_path}: {e}")
+    # First, try to get the mapping from the crawl index, then from metadata files
+    crawl_index = open_crawl_index(state_dir) or open_crawl_index(local_dir)
+    if crawl_index is not None:
+        try:
+            # The index keeps earlier runs; only this run's pages are in local_dir
+            last_run = crawl_index.last_run()
+            for page in crawl_index.iter_pages(run_id=last_run["id"] if last_run else None):
+                clean_domain = extract_domain(page["url"])
+                if clean_domain in domain_to_prefix:
+                    url_to_domain_map[os.path.join(local_dir, page["hash"])] = clean_domain
+                    if page["content_hash"]:
+                        content_hash_to_domain.setdefault(page["content_hash"], clean_domain)
+        except Exception as e:
+            logger.warning(f"Error reading crawl index: {e}")
+        finally:
+            crawl_index.close()
+    else:
+        for root, dirs, files in os.walk(local_dir):
+            for file in files:
+                if file == "metadata.json":
+                    try:
+                        metadata_path = os.path.join(root, file)
+                        with open(metadata_path, 'r') as f:
+                            metadata = json.load(f)
+                        
+                        if "url" in metadata:
+                            url = metadata["url"]
+                            # Extract clean domain using tldextract
+                            clean_domain = extract_domain(url)
+                            if clean_domain in domain_to_prefix:
+                                url_to_domain_map[os.path.dirname(metadata_path)] = clean_domain
+                                if metadata.get("content_hash"):
+                                    content_hash_to_domain.setdefault(metadata["content_hash"], clean_domain)
+                    except Exception as e:
+                        logger.warning(f"Error reading metadata file {metadata_path}: {e}")
     
     # Helper function to determine the S3 prefix for a file
     def get_s3_prefix_for_file(file_path):
@@ -258,11 +379,21 @@ def crawler_func(websites,
     def upload_file(file_path, relative_path):
         nonlocal files_uploaded, bytes_uploaded, files_skipped
         
+        blob_name = os.path.basename(file_path)
+        is_blob = relative_path.split(os.sep)[0] == "blobs" and relative_path != blob_name
+        
         # Determine which S3 prefix to use based on the file's URL domain
-        s3_prefix = get_s3_prefix_for_file(file_path)
+        if is_blob:
+            content_domain = content_hash_to_domain.get(blob_name.split(".")[0], domains[0])
+            s3_prefix = domain_to_prefix[content_domain]
+        else:
+            s3_prefix = get_s3_prefix_for_file(file_path)
         
         # Create S3 key (path within the bucket)
-        if relative_path == ".":
+        if is_blob:
+            # Blob keys match the "blob" path recorded in page metadata
+            s3_key = f"{s3_prefix}/{relative_path.replace(os.sep, '/')}/{blob_name}"
+        elif relative_path == ".":
             s3_key = f"{s3_prefix}/{os.path.basename(file_path)}"
         else:
             # Preserve directory structure by using the full relative path
@@ -272,7 +403,23 @@ def crawler_func(websites,
             else:
                 s3_key = f"{s3_prefix}/{relative_path}/{os.path.basename(file_path)}"
         
-        # Check if file already exists in S3 and should be skipped
+        # Compressed page bodies keep their page.html key and are served with a
+        # Content-Encoding header, so S3 consumers see them as plain HTML
+        extra_args = None
+        codec = codec_from_filename(file_path)
+        if os.path.basename(file_path).startswith("page.html") and codec in CONTENT_ENCODINGS:
+            s3_key = s3_key[:-len(FILE_EXTENSIONS[codec])]
+            extra_args = {
+                'ContentType': 'text/html',
+                'ContentEncoding': CONTENT_ENCODINGS[codec]
+            }
+        elif is_blob:
+            extra_args = {'ContentType': 'text/html'}
+            if codec in CONTENT_ENCODINGS:
+                extra_args['ContentEncoding'] = CONTENT_ENCODINGS[codec]
+        
+        # Check if file already exists in S3 and should be skipped; blobs are
+        # content-addressed, so a body uploaded by an earlier run is never re-sent
         if skip_existing and s3_prefix in existing_s3_objects_by_prefix and s3_key in existing_s3_objects_by_prefix[s3_prefix]:
             logger.info(f"Skipping {file_path} - already exists in S3")
             files_skipped += 1
@@ -285,6 +432,7 @@ def crawler_func(websites,
                 file_path, 
                 bucket, 
                 s3_key,
+                ExtraArgs=extra_args,
                 Config=transfer_config
             )
             files_uploaded += 1
@@ -328,6 +476,13 @@ def crawler_func(websites,
         'files_uploaded': files_uploaded,
         'files_skipped': files_skipped,
         'bytes_uploaded': bytes_uploaded,
+        'dedup': dedup,
+        'conditional_get': conditional_get,
+        'revisit': revisit,
+        'seeds': seeds,
+        'yield': crawl_yield,
+        'content_gate': content_gate,
+        'traps': traps,
         'bucket': bucket,
         's3_prefixes': list(domain_to_prefix.values()),
         'domains': domains,
@@ -348,6 +503,12 @@ if __name__ == "__main__":
     if result['success']:
         print(f"Uploaded {result['files_uploaded']} files ({result['bytes_uploaded'] / (1024*1024):.2f} MB)")
         print(f"Skipped {result['files_skipped']} existing files")
+        if result.get('conditional_get'):
+            print(f"Unchanged pages: {result['conditional_get']['not_modified']} "
+                  f"({result['conditional_get']['bytes_saved'] / (1024*1024):.2f} MB not downloaded or uploaded)")
+        if result.get('dedup'):
+            print(f"Dedup ratio: {result['dedup']['dedup_ratio']:.2f} "
+                  f"({result['dedup']['duplicate_bodies']} duplicate bodies stored once)")
         print(f"Files stored in S3 bucket: {result['bucket']} with prefixes:")
         for prefix in result['s3_prefixes']:
             print(f"  - {prefix}")
@@ -8,6 +8,7 @@ import signal
 import logging
 import atexit
 import json
+import threading
 
 # Configure logging
 logging.basicConfig(
@@ -26,6 +27,19 @@ child_processes = []
 # Flag to control the main loop
 running = True
 
+# Seconds a crawl gets to checkpoint and stop before it is killed (Docker stop
+# kills the container 10 seconds after its SIGTERM)
+SHUTDOWN_GRACE_SECONDS = 8
+
+def kill_child(proc):
+    """Kill a child process that is still running"""
+    if proc.poll() is None:
+        logger.warning(f"Child process {proc.pid} did not stop in time, killing it")
+        try:
+            proc.kill()
+        except Exception as e:
+            logger.error(f"Error killing child process: {e}")
+
 def cleanup_children():
     """Clean up any child processes when parent exits"""
     for proc in child_processes:
@@ -33,24 +47,37 @@ def cleanup_children():
             logger.info(f"Terminating child process {proc.pid}")
             try:
                 proc.terminate()
-                # Give it a moment to terminate gracefully
-                time.sleep(1)
-                if proc.poll() is None:
-                    proc.kill()  # Force kill if still running
+                # Give it time to checkpoint its crawl
+                proc.wait(timeout=SHUTDOWN_GRACE_SECONDS)
+            except subprocess.TimeoutExpired:
+                kill_child(proc)  # Force kill if still running
             except Exception as e:
                 logger.error(f"Error terminating child process: {e}")
 
 # Handle SIGTERM signal (Docker stop)
 def handle_sigterm(signum, frame):
     global running
+    if not running:
+        logger.info("Received a second stop signal. Killing child processes...")
+        for proc in child_processes:
+            kill_child(proc)
+        return
     logger.info("Received SIGTERM signal. Shutting down gracefully...")
     running = False
-    cleanup_children()
+    # The crawl checkpoints and stops on its own; its output keeps streaming until it exits
+    for proc in child_processes:
+        if proc.poll() is None:
+            if signum == signal.SIGTERM:
+                proc.terminate()  # Ctrl+C already reached the whole process group
+            timer = threading.Timer(SHUTDOWN_GRACE_SECONDS, kill_child, args=(proc,))
+            timer.daemon = True
+            timer.start()
     # Don't exit immediately - let the main loop exit gracefully
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Web crawler with S3 upload')
-    parser.add_argument('--website', '-w', type=str, help='Website URL to crawl', default=None)
+    parser.add_argument('--website', '-w', type=str, action='append', default=None,
+                        help='Website URL to crawl (repeatable)')
     parser.add_argument('--max-pages', '-p', type=int, default=500, help='Maximum number of pages to crawl')
     parser.add_argument('--max-depth', '-d', type=int, default=5, help='Maximum crawl depth')
     parser.add_argument('--no-remove-local', action='store_false', dest='remove_local', 
@@ -59,11 +86,35 @@ def parse_args():
                         help='S3 bucket name')
     parser.add_argument('--no-loop', action='store_true', help='Run once without continuous looping')
     parser.add_argument('--wait-time', type=int, default=3600, help='Wait time between crawls in seconds (default: 1 hour)')
+    parser.add_argument('--full-recrawl', action='store_true',
+                        help='Download every page instead of sending conditional requests for known pages')
+    parser.add_argument('--revisit-budget', type=int, default=None,
+                        help='Revisit at most this many known pages per run, picked by how often they change')
+    parser.add_argument('--no-sitemaps', action='store_false', dest='discover_seeds',
+                        help='Discover pages by following links only, without sitemaps and RSS/Atom feeds')
+    parser.add_argument('--breadth-first', action='store_true',
+                        help='Crawl breadth-first instead of fetching article-shaped links first')
+    parser.add_argument('--fixed-rate', action='store_false', dest='adaptive_throttle',
+                        help='Use fixed concurrency and delay instead of adapting them per host')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Crawl the websites in this many parallel processes, split by domain')
+    parser.add_argument('--shared-frontier', type=str, default=None,
+                        help='Frontier database on a volume shared with other crawler containers of the same crawl')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue a crawl interrupted by a stop or a crash instead of starting over '
+                             '(interrupted crawls are uploaded when they finish)')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Run every crawl in this process on one long-lived reactor instead of a '
+                             'subprocess per crawl (connections, DNS and robots.txt caches are kept)')
+    parser.add_argument('--max-memory', type=int, default=None,
+                        help='In daemon mode, exit after a crawl once the process uses more than this many MB')
     parser.add_argument('--single-crawl', action='store_true', help='Internal flag for single-crawl subprocess')
     parser.add_argument('--crawl-args', type=str, help='JSON encoded arguments for crawler (internal use)')
     return parser.parse_args()
 
-def run_single_crawl_process(website, max_pages, max_depth, remove_local, bucket):
+def run_single_crawl_process(website, max_pages, max_depth, remove_local, bucket, incremental=True,
+                             revisit_budget=None, discover_seeds=True, url_scorer="article",
+                             adaptive_throttle=True, workers=1, shared_frontier=None, resume=False):
     """Run a single crawl in a dedicated subprocess to avoid reactor restart issues"""
     
     # Create a JSON string with the arguments to pass to the subprocess
@@ -72,7 +123,15 @@ def run_single_crawl_process(website, max_pages, max_depth, remove_local, bucket
         'max_pages': max_pages,
         'max_depth': max_depth,
         'remove_local': remove_local,
-        'bucket': bucket
+        'bucket': bucket,
+        'incremental': incremental,
+        'revisit_budget': revisit_budget,
+        'discover_seeds': discover_seeds,
+        'url_scorer': url_scorer,
+        'adaptive_throttle': adaptive_throttle,
+        'workers': workers,
+        'shared_frontier': shared_frontier,
+        'resume': resume
     }
     
     # Get the current script path
@@ -113,7 +172,9 @@ def run_single_crawl_process(website, max_pages, max_depth, remove_local, bucket
     
     return {'success': process.returncode == 0}
 
-def run_single_crawl(website, max_pages, max_depth, remove_local, bucket):
+def run_single_crawl(website, max_pages, max_depth, remove_local, bucket, incremental=True, revisit_budget=None,
+                     discover_seeds=True, url_scorer="article", adaptive_throttle=True, workers=1,
+                     shared_frontier=None, resume=False):
     """Run a single crawl for the given website"""
     print(f"Starting crawl for website: {website}")
     
@@ -123,26 +184,88 @@ def run_single_crawl(website, max_pages, max_depth, remove_local, bucket):
         max_pages=max_pages,
         max_depth=max_depth,
         remove_local_files=remove_local,
-        bucket=bucket
+        bucket=bucket,
+        incremental=incremental,
+        revisit_budget=revisit_budget,
+        discover_seeds=discover_seeds,
+        url_scorer=url_scorer,
+        adaptive_throttle=adaptive_throttle,
+        workers=workers,
+        shared_frontier=shared_frontier,
+        resume=resume
     )
     
-    # Print summary
+    return print_crawl_summary(website, result)
+
+def print_crawl_summary(website, result):
+    """Print the summary of a crawl and upload"""
     print("\nCrawl and upload summary:")
     print(f"Crawled {result['pages_crawled']} pages from {website}")
     
     if result['success']:
         print(f"Uploaded {result['files_uploaded']} files ({result['bytes_uploaded'] / (1024*1024):.2f} MB)")
         print(f"Skipped {result['files_skipped']} existing files")
+        if result.get('revisit'):
+            print(f"Revisited {result['revisit']['planned']} known pages by expected change "
+                  f"({result['revisit']['expected_changes']:.1f} expected changed), "
+                  f"skipped {result['revisit']['requests_skipped']} requests for stable pages")
+        if result.get('seeds'):
+            print(f"Seeded {result['seeds']['seeded']} pages from {result['seeds']['documents']} sitemaps/feeds "
+                  f"({result['seeds']['unchanged']} unchanged since the last crawl)")
+        if result.get('yield'):
+            print(f"Yield: {result['yield']['useful']} articles in {result['yield']['fetches']} fetches "
+                  f"({result['yield']['yield']:.2f} per fetch, {result['yield']['scorer']})")
+        if result.get('conditional_get'):
+            print(f"Unchanged pages: {result['conditional_get']['not_modified']} "
+                  f"({result['conditional_get']['bytes_saved'] / (1024*1024):.2f} MB not downloaded or uploaded)")
+        if result.get('content_gate', {}).get('skipped'):
+            print(f"Dropped {result['content_gate']['skipped']} non-HTML or oversized responses at the headers "
+                  f"({result['content_gate']['bytes_saved'] / (1024*1024):.2f} MB not downloaded)")
+        if result.get('traps', {}).get('links_pruned') or result.get('traps', {}).get('links_throttled'):
+            print(f"Crawler traps: {result['traps']['links_pruned']} links pruned, "
+                  f"{result['traps']['links_throttled']} throttled "
+                  f"({result['traps']['templates_pruned']} URL templates pruned)")
         print(f"Files stored in S3 bucket: {result['bucket']} with prefixes:")
         for prefix in result['s3_prefixes']:
             print(f"  - {prefix}")
         if result.get('local_files_removed', False):
             print("Local files have been removed.")
+    elif result.get('interrupted'):
+        print("Crawl interrupted; run again with --resume to continue it and upload its pages")
     else:
         print(f"Error: {result.get('error', 'Unknown error')}") 
     
     return result
 
+def run_daemon(website, args):
+    """Run the crawls on one long-lived reactor until stopped"""
+    from vibe_scraping.daemon import CrawlDaemon
+    
+    daemon = CrawlDaemon(max_rss_mb=args.max_memory)
+    
+    def crawl_cycle(daemon):
+        print(f"Starting crawl for website: {website}")
+        result = crawler_func(
+            websites=website,
+            max_pages=args.max_pages,
+            max_depth=args.max_depth,
+            remove_local_files=args.remove_local,
+            bucket=args.bucket,
+            incremental=not args.full_recrawl,
+            revisit_budget=args.revisit_budget,
+            discover_seeds=args.discover_seeds,
+            url_scorer=None if args.breadth_first else "article",
+            adaptive_throttle=args.adaptive_throttle,
+            workers=args.workers,
+            shared_frontier=args.shared_frontier,
+            resume=args.resume,
+            runner=daemon.runner
+        )
+        return result.addCallback(lambda result: print_crawl_summary(website, result))
+    
+    # The daemon handles SIGTERM and SIGINT itself: running crawls stop gracefully
+    daemon.run(crawl_cycle, interval=args.wait_time, once=args.no_loop)
+
 def wait_for_next_crawl(wait_time):
     """Wait for the specified time, with clean interruption handling"""
     global running
@@ -189,7 +312,15 @@ if __name__ == "__main__":
                 crawl_args['max_pages'],
                 crawl_args['max_depth'],
                 crawl_args['remove_local'],
-                crawl_args['bucket']
+                crawl_args['bucket'],
+                crawl_args.get('incremental', True),
+                crawl_args.get('revisit_budget'),
+                crawl_args.get('discover_seeds', True),
+                crawl_args.get('url_scorer', "article"),
+                crawl_args.get('adaptive_throttle', True),
+                crawl_args.get('workers', 1),
+                crawl_args.get('shared_frontier'),
+                crawl_args.get('resume', False)
             )
             sys.exit(0 if result['success'] else 1)
         except Exception as e:
@@ -199,15 +330,34 @@ if __name__ == "__main__":
     # Main process - use provided website or fall back to default
     website = args.website if args.website else default_website
     
+    if args.daemon:
+        run_daemon(website, args)
+        logger.info("Crawler daemon exiting...")
+        sys.exit(0)
+    
     # Run once or in continuous loop
     if args.no_loop:
-        run_single_crawl_process(website, args.max_pages, args.max_depth, args.remove_local, args.bucket)
+        run_single_crawl_process(website, args.max_pages, args.max_depth, args.remove_local, args.bucket,
+                                 incremental=not args.full_recrawl, revisit_budget=args.revisit_budget,
+                                 discover_seeds=args.discover_seeds,
+                                 url_scorer=None if args.breadth_first else "article",
+                                 adaptive_throttle=args.adaptive_throttle,
+                                 workers=args.workers, shared_frontier=args.shared_frontier,
+                                 resume=args.resume)
     else:
         try:
             # Main loop - keep running crawls until interrupted
             while running:
                 # Run a crawl in a subprocess
-                run_single_crawl_process(website, args.max_pages, args.max_depth, args.remove_local, args.bucket)
+                run_single_crawl_process(website, args.max_pages, args.max_depth, args.remove_local, args.bucket,
+                                         incremental=not args.full_recrawl,
+                                         revisit_budget=args.revisit_budget,
+                                         discover_seeds=args.discover_seeds,
+                                         url_scorer=None if args.breadth_first else "article",
+                                         adaptive_throttle=args.adaptive_throttle,
+                                         workers=args.workers,
+                                         shared_frontier=args.shared_frontier,
+                                         resume=args.resume)
                 
                 # Wait for the next crawl, exit if interrupted or signaled to stop
                 if not wait_for_next_crawl(args.wait_time):
@@ -0,0 +1,92 @@
+"""Tests for URL canonicalization and the canonical request fingerprint."""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from vibe_scraping.canonicalize import CanonicalRequestFingerprinter, URLCanonicalizer
+
+scrapy = pytest.importorskip("scrapy")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A directory-style site: pages live at /section/, and /section and
+# /dir/index.html redirect there
+PAGES = {
+    "/": '<a href="/section">section</a><a href="/dir/index.html">dir</a>',
+    "/section/": '<a href="/section/a/">a</a><a href="/section/b/">b</a>',
+    "/section/a/": "a",
+    "/section/b/": "b",
+    "/dir/": '<a href="/dir/c/">c</a>',
+    "/dir/c/": "c",
+}
+
+
+class SlashRedirectHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/dir/index.html" or (self.path not in PAGES and self.path + "/" in PAGES):
+            self.send_response(301)
+            self.send_header("Location", self.path[:-len("index.html")] if self.path.endswith("index.html")
+                             else self.path + "/")
+            self.end_headers()
+            return
+        if self.path not in PAGES:
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = f"<html><body><p>Page {self.path}</p>{PAGES[self.path]}</body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def slash_site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlashRedirectHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_canonical_form_strips_slash_and_index_page():
+    canonicalizer = URLCanonicalizer()
+    assert canonicalizer("http://Example.com:80/section/") == "http://example.com/section"
+    assert canonicalizer("http://example.com/dir/index.html?b=2&a=1&utm_source=x") == "http://example.com/dir?a=1&b=2"
+
+
+def test_fingerprint_keeps_slash_and_index_page():
+    fingerprinter = CanonicalRequestFingerprinter()
+
+    def fingerprint(url):
+        return fingerprinter.fingerprint(scrapy.Request(url))
+
+    assert fingerprint("http://example.com/section") != fingerprint("http://example.com/section/")
+    assert fingerprint("http://example.com") == fingerprint("http://example.com/")
+    assert fingerprint("http://example.com/dir/index.html") != fingerprint("http://example.com/dir/")
+    assert fingerprint("http://example.com/a?b=2&a=1&utm_source=x") == fingerprint("http://example.com/a?a=1&b=2")
+
+
+def test_crawl_follows_slash_redirects(slash_site, tmp_path):
+    # Crawl in a child process: the Twisted reactor cannot be restarted
+    script = (
+        "import json, sys\n"
+        "from vibe_scraping.scrapy_adapter import crawl_with_scrapy\n"
+        "result = crawl_with_scrapy(start_url=sys.argv[1], save_path=sys.argv[2], delay=0,\n"
+        "                           follow_external_links=True, host_cache=False)\n"
+        "print(json.dumps(result['pages_crawled']))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", script, slash_site, str(tmp_path)], cwd=REPO_ROOT,
+                            capture_output=True, text=True, timeout=120, check=True).stdout
+    assert json.loads(output.strip().splitlines()[-1]) == len(PAGES)
@@ -0,0 +1,26 @@
+"""Tests for the Bloom filter request dupefilter."""
+
+import pytest
+
+from vibe_scraping.canonicalize import CanonicalRequestFingerprinter
+from vibe_scraping.dupefilter import BloomDupeFilter
+
+scrapy = pytest.importorskip("scrapy")
+
+
+def test_links_back_to_start_url_are_filtered():
+    dupefilter = BloomDupeFilter(CanonicalRequestFingerprinter(), capacity=1000)
+    start = scrapy.Request("http://example.com", dont_filter=True)
+    dupefilter.request_scheduled(start)
+    assert dupefilter.request_seen(scrapy.Request("http://example.com/"))
+    assert not dupefilter.request_seen(scrapy.Request("http://example.com/page"))
+    dupefilter.close("finished")
+
+
+def test_filtered_requests_are_not_recorded_when_scheduled():
+    dupefilter = BloomDupeFilter(CanonicalRequestFingerprinter(), capacity=1000)
+    request = scrapy.Request("http://example.com/page")
+    dupefilter.request_scheduled(request)
+    assert not dupefilter.request_seen(request)
+    assert dupefilter.request_seen(request)
+    dupefilter.close("finished")
@@ -0,0 +1,75 @@
+"""Tests for incremental recrawls (conditional GET) into the same crawl directory."""
+
+import functools
+import json
+import os
+import subprocess
+import sys
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from vibe_scraping.journal import load_crawl_metadata
+from vibe_scraping.page_store import open_page_store
+
+pytest.importorskip("scrapy")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGE_COUNT = 5
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """Static files with Last-Modified; If-Modified-Since is answered with 304."""
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def static_site(tmp_path):
+    root = tmp_path / "site"
+    root.mkdir()
+    links = "".join(f'<a href="/p{i}.html">p{i}</a>' for i in range(PAGE_COUNT))
+    (root / "index.html").write_text(f"<html><body><p>Home</p>{links}</body></html>")
+    for i in range(PAGE_COUNT):
+        (root / f"p{i}.html").write_text(f"<html><body><p>Page {i}</p></body></html>")
+    (root / "robots.txt").write_text("")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+
+
+def crawl(start_url, save_path, storage):
+    # Crawl in a child process: the Twisted reactor cannot be restarted
+    script = (
+        "import json, sys\n"
+        "from vibe_scraping.scrapy_adapter import crawl_with_scrapy\n"
+        "result = crawl_with_scrapy(start_url=sys.argv[1], save_path=sys.argv[2], storage=sys.argv[3],\n"
+        "                           incremental=True, delay=0, follow_external_links=True, host_cache=False)\n"
+        "print(json.dumps(result['conditional_get']))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", script, start_url, str(save_path), storage], cwd=REPO_ROOT,
+                            capture_output=True, text=True, timeout=120, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("storage", ["directory", "segments"])
+def test_incremental_recrawl_keeps_bodies(static_site, tmp_path, storage):
+    save_path = tmp_path / "crawl"
+    crawl(static_site, save_path, storage)
+    conditional_get = crawl(static_site, save_path, storage)
+    assert conditional_get["not_modified"] == PAGE_COUNT + 1
+
+    crawled_urls = load_crawl_metadata(str(save_path))["crawled_urls"]
+    assert len(crawled_urls) == PAGE_COUNT + 1
+    store = open_page_store(str(save_path))
+    for url, entry in crawled_urls.items():
+        assert entry["not_modified"]
+        page = store.read_page(entry["hash"])
+        assert page is not None and page[0], url
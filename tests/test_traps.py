@@ -0,0 +1,37 @@
+"""Tests for crawler trap detection."""
+
+from vibe_scraping.traps import FOLLOW, NORMAL, PRUNE, PRUNED, THROTTLED, TrapDetector
+
+
+def test_wide_template_with_new_pages_is_not_throttled():
+    detector = TrapDetector(max_template_urls=50)
+    urls = [f"http://example.com/news/2024/05/story-{i}" for i in range(300)]
+    for url in urls[:100]:
+        detector.record_fetch(url, new_content=True)
+    assert all(detector.check(url) == FOLLOW for url in urls)
+    assert detector.templates[detector.template_key(urls[0])].state == NORMAL
+
+
+def test_wide_template_with_few_new_pages_is_throttled():
+    detector = TrapDetector(max_template_urls=50)
+    urls = [f"http://example.com/list?page={i}" for i in range(90)]
+    for i, url in enumerate(urls[:40]):
+        detector.check(url)
+        detector.record_fetch(url, new_content=i % 3 == 0)
+    followed = sum(detector.check(url) == FOLLOW for url in urls[40:])
+    assert detector.templates[detector.template_key(urls[0])].state == THROTTLED
+    assert followed < 50
+
+
+def test_template_without_new_pages_is_pruned():
+    detector = TrapDetector()
+    for month in range(detector.min_fetches):
+        url = f"http://example.com/calendar?month={month}"
+        assert detector.check(url) == FOLLOW
+        detector.record_fetch(url, new_content=False)
+    assert detector.templates[detector.template_key(url)].state == PRUNED
+    assert detector.check("http://example.com/calendar?month=99") == PRUNE
+
+
+def test_repeating_path_is_pruned():
+    assert TrapDetector().check("http://example.com/a/b/a/b/a/b/") == PRUNE
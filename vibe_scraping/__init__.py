@@ -3,6 +3,19 @@
 __version__ = "0.3.0"
 
 from .crawler import WebCrawler, crawl_site
+from .journal import load_crawl_metadata
+from .crawl_index import CrawlIndex, open_crawl_index
+from .page_store import SegmentPageStore, DirectoryPageStore, open_page_store
+from .simhash import SimHashIndex, text_fingerprint
+from .canonicalize import URLCanonicalizer
+from .parallel import crawl_parallel, shard_start_urls
+from .frontier import SharedFrontier
+from .hostcache import HostCache
+from .traps import TrapDetector
+from .checkpoint import load_checkpoint
+from .daemon import CrawlDaemon
+from .stream import stream_crawl
+from .parsing import ParsedResponse
 
 # Import Scrapy adapter if available
 try:
@@ -30,6 +43,24 @@ except ImportError:
 __all__ = [
     'WebCrawler',
     'crawl_site',
+    'load_crawl_metadata',
+    'CrawlIndex',
+    'open_crawl_index',
+    'SegmentPageStore',
+    'DirectoryPageStore',
+    'open_page_store',
+    'SimHashIndex',
+    'text_fingerprint',
+    'URLCanonicalizer',
+    'crawl_parallel',
+    'shard_start_urls',
+    'SharedFrontier',
+    'HostCache',
+    'TrapDetector',
+    'load_checkpoint',
+    'CrawlDaemon',
+    'stream_crawl',
+    'ParsedResponse',
     'SCRAPY_AVAILABLE',
     'crawl_with_scrapy',
     'HTMLAnalyzer',
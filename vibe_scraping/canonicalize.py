@@ -0,0 +1,203 @@
+"""
+URL canonicalization for vibe-scraping.
+
+Many URLs that differ only in query parameter order, tracking parameters,
+host case, default ports or an explicit ``index.html`` serve the same page.
+:class:`URLCanonicalizer` maps them to one canonical form, which the spider
+uses for the ``crawled_urls`` key, the storage hash and deduplication.
+
+Requests keep the URL of the link: servers redirect ``/section`` to
+``/section/`` (and back), so fetching the canonical form can cost a redirect
+or miss the page. Scrapy's request fingerprint uses
+:func:`request_canonicalizer`, which leaves trailing slashes and index pages
+alone, so a redirect between those forms is not dropped as a duplicate of the
+request that caused it.
+
+Per-domain rules are given as a dictionary keyed by domain (subdomains match
+their parent's rules)::
+
+    {
+        "ambebi.ge": {"drop": ["ref", "from"]},
+        "newshub.ge": {"keep": ["id", "page"]}
+    }
+
+``drop`` lists extra parameters to remove (``*`` wildcards allowed); ``keep``
+is an allow-list, and every other parameter is removed.
+"""
+
+import re
+import json
+import hashlib
+import logging
+from fnmatch import fnmatchcase
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Tracking parameters removed on every domain
+DEFAULT_DROP_PARAMS = (
+    "utm_*", "fbclid", "gclid", "dclid", "msclkid", "yclid", "mc_cid", "mc_eid",
+    "_ga", "_gl", "igshid", "ref_src", "spm",
+)
+
+# Directory index documents that serve the same page as their directory
+DEFAULT_INDEX_PAGES = ("index.html", "index.htm", "index.php", "default.asp", "default.aspx")
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Characters left unescaped when quoting paths
+_PATH_SAFE = "/%:@!$&'()*+,;=-._~"
+_UNRESERVED = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+_PERCENT_ESCAPE_RE = re.compile(r"%([0-9A-Fa-f]{2})")
+
+
+def _normalize_escape(match):
+    char = chr(int(match.group(1), 16))
+    return char if char in _UNRESERVED else "%" + match.group(1).upper()
+
+
+class URLCanonicalizer:
+    """Configurable URL canonicalizer with per-domain query parameter rules."""
+
+    def __init__(self, domain_rules=None, drop_params=DEFAULT_DROP_PARAMS,
+                 index_pages=DEFAULT_INDEX_PAGES, strip_trailing_slash=True):
+        """
+        Initialize the canonicalizer.
+
+        Args:
+            domain_rules: Dictionary of domain -> {"drop": [...], "keep": [...]}
+            drop_params: Parameter names (or * patterns) removed on every domain
+            index_pages: Final path segments removed as directory index pages
+            strip_trailing_slash: Whether to remove a trailing slash from the path
+        """
+        self.domain_rules = {domain.lower().lstrip("."): rules
+                             for domain, rules in (domain_rules or {}).items()}
+        self.drop_params = tuple(drop_params)
+        self.index_pages = tuple(index_pages)
+        self.strip_trailing_slash = strip_trailing_slash
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """Create a canonicalizer from a JSON file of per-domain rules."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(domain_rules=json.load(f), **kwargs)
+
+    def _rules_for(self, host):
+        """Return the rules of the most specific configured domain matching host."""
+        parts = host.split(".")
+        for i in range(len(parts)):
+            rules = self.domain_rules.get(".".join(parts[i:]))
+            if rules is not None:
+                return rules
+        return {}
+
+    def _keep_param(self, name, rules):
+        keep = rules.get("keep")
+        if keep is not None:
+            return any(fnmatchcase(name, pattern) for pattern in keep)
+        patterns = self.drop_params + tuple(rules.get("drop", ()))
+        return not any(fnmatchcase(name.lower(), pattern) for pattern in patterns)
+
+    def canonicalize(self, url):
+        """
+        Return the canonical form of a URL.
+
+        Non-HTTP URLs and URLs that cannot be parsed are returned unchanged.
+
+        Args:
+            url: Absolute URL
+
+        Returns:
+            Canonical URL string
+        """
+        try:
+            parts = urlsplit(url.strip())
+            port = parts.port
+        except ValueError:
+            return url
+
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS or not parts.hostname:
+            return url
+
+        host = parts.hostname.rstrip(".")
+        netloc = host
+        if port and port != DEFAULT_PORTS[scheme]:
+            netloc = f"{host}:{port}"
+        if parts.username:
+            netloc = f"{parts.username}{':' + parts.password if parts.password else ''}@{netloc}"
+
+        # Normalize percent-encoding so %7E and ~ (or %c3 and %C3) compare equal
+        path = _PERCENT_ESCAPE_RE.sub(_normalize_escape, quote(parts.path, safe=_PATH_SAFE))
+        segments = path.split("/")
+        if segments[-1] in self.index_pages:
+            segments[-1] = ""
+            path = "/".join(segments)
+        if self.strip_trailing_slash:
+            path = path.rstrip("/")
+        elif not path:
+            # http://example.com and http://example.com/ request the same resource
+            path = "/"
+
+        rules = self._rules_for(host)
+        params = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                  if self._keep_param(name, rules)]
+        # A stable sort keeps the order of repeated parameters
+        params.sort(key=lambda param: param[0])
+        query = urlencode(params, quote_via=quote)
+
+        return urlunsplit((scheme, netloc, path, query, ""))
+
+    __call__ = canonicalize
+
+
+def request_canonicalizer(domain_rules=None):
+    """
+    Return the canonicalizer of request fingerprints.
+
+    Trailing slashes and index pages are kept: ``/section`` and ``/section/``
+    can be different resources, and one often redirects to the other.
+    """
+    return URLCanonicalizer(domain_rules=domain_rules, index_pages=(), strip_trailing_slash=False)
+
+
+class CanonicalRequestFingerprinter:
+    """
+    Scrapy request fingerprinter that fingerprints the canonical URL.
+
+    Requests whose URLs canonicalize to the same form (see
+    request_canonicalizer) are treated as duplicates by the dupefilter and
+    share HTTP cache entries.
+
+    Settings:
+        URL_CANONICAL_RULES: Per-domain rules dictionary (see module docstring)
+    """
+
+    def __init__(self, canonicalizer=None):
+        self.canonicalizer = canonicalizer or request_canonicalizer()
+        self._cache = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(request_canonicalizer(crawler.settings.getdict('URL_CANONICAL_RULES')))
+
+    def fingerprint(self, request):
+        key = (request.method, request.url, request.body)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        fingerprint = hashlib.sha1()
+        fingerprint.update(request.method.encode())
+        fingerprint.update(b"\0")
+        fingerprint.update(self.canonicalizer.canonicalize(request.url).encode())
+        fingerprint.update(b"\0")
+        fingerprint.update(request.body or b"")
+        digest = fingerprint.digest()
+
+        # Requests are fingerprinted a few times each; keep the cache small
+        if len(self._cache) >= 10000:
+            self._cache.clear()
+        self._cache[key] = digest
+        return digest
@@ -0,0 +1,148 @@
+"""
+Crawl checkpoints for vibe-scraping.
+
+A crawl keeps its resumable state in a job directory under the state path:
+Scrapy's ``JOBDIR`` (the pending request queue, the seen-set of the Bloom
+dupefilter and the spider state), plus a ``checkpoint.json`` written every
+CHECKPOINT_INTERVAL seconds by :class:`CheckpointExtension` with the crawl
+run id and the spider's statistics.
+
+A crawl stopped gracefully (SIGTERM or SIGINT, which Scrapy turns into a
+clean shutdown) leaves a consistent queue behind and resumes exactly where it
+stopped. A crawl that was killed outright leaves a queue that cannot be
+trusted; it is discarded and the frontier is rebuilt from the crawl index:
+the links of the pages the interrupted run stored that it had not fetched yet.
+"""
+
+import os
+import json
+import shutil
+import logging
+from datetime import datetime
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Scrapy is only needed for the extension class
+try:
+    from scrapy import signals
+    from scrapy.exceptions import NotConfigured
+    from scrapy.utils.job import job_dir
+    from twisted.internet import task
+    SCRAPY_AVAILABLE = True
+except ImportError:
+    SCRAPY_AVAILABLE = False
+
+CHECKPOINT_DIRNAME = "job"
+CHECKPOINT_FILENAME = "checkpoint.json"
+
+# Close reasons of crawls that stopped before their work was done; None is a
+# crawl killed before it could close
+RESUMABLE_REASONS = (None, "shutdown")
+
+
+def load_checkpoint(jobdir):
+    """
+    Load the checkpoint of a job directory.
+
+    Returns:
+        Checkpoint dictionary, or None if there is none or it cannot be read
+    """
+    path = os.path.join(jobdir, CHECKPOINT_FILENAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read checkpoint {path}: {e}")
+        return None
+
+
+def is_resumable(checkpoint):
+    """Return True if a checkpoint belongs to a crawl that stopped before it was done."""
+    return checkpoint.get("reason") in RESUMABLE_REASONS
+
+
+def save_checkpoint(jobdir, checkpoint):
+    """Write a checkpoint atomically."""
+    os.makedirs(jobdir, exist_ok=True)
+    path = os.path.join(jobdir, CHECKPOINT_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def clear_job(jobdir, keep_checkpoint=False):
+    """
+    Delete the contents of a job directory.
+
+    Args:
+        jobdir: Job directory
+        keep_checkpoint: Keep checkpoint.json (used when only Scrapy's queue
+            and seen-set are discarded)
+    """
+    if not os.path.isdir(jobdir):
+        return
+    for entry in os.scandir(jobdir):
+        if keep_checkpoint and entry.name == CHECKPOINT_FILENAME:
+            continue
+        if entry.is_dir() and not entry.is_symlink():
+            shutil.rmtree(entry.path)
+        else:
+            os.remove(entry.path)
+
+
+class CheckpointExtension:
+    """
+    Scrapy extension that saves the spider's checkpoint state periodically and on close.
+
+    The spider provides the state through a ``checkpoint_state()`` method.
+
+    Settings:
+        JOBDIR: Job directory (the extension is disabled without it)
+        CHECKPOINT_INTERVAL: Seconds between checkpoints (default 60)
+    """
+
+    def __init__(self, jobdir, interval=60):
+        self.jobdir = jobdir
+        self.interval = interval
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        jobdir = job_dir(crawler.settings)
+        if not jobdir:
+            raise NotConfigured
+        extension = cls(jobdir, interval=crawler.settings.getfloat('CHECKPOINT_INTERVAL', 60))
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def spider_opened(self, spider):
+        self.task = task.LoopingCall(self.save, spider)
+        self.task.start(self.interval, now=True)
+
+    def spider_closed(self, spider, reason):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        self.save(spider, reason)
+
+    def save(self, spider, reason=None):
+        """
+        Save a checkpoint of the spider.
+
+        Args:
+            spider: The running spider
+            reason: Close reason once the spider closed; a checkpoint without
+                one belongs to a crawl that was interrupted before it could close
+        """
+        state_method = getattr(spider, 'checkpoint_state', None)
+        if state_method is None:
+            return
+        checkpoint = dict(state_method(), saved=datetime.now().isoformat(), reason=reason)
+        try:
+            save_checkpoint(self.jobdir, checkpoint)
+        except OSError as e:
+            logger.warning(f"Could not save checkpoint in {self.jobdir}: {e}")
@@ -2,9 +2,11 @@
 """CLI for vibe-scraping."""
 
 import argparse
+import json
 import os
 import sys
 from vibe_scraping.crawler import WebCrawler
+from vibe_scraping.compression import CODECS
 from vibe_scraping import SCRAPY_AVAILABLE, __version__
 
 def main():
@@ -12,7 +14,7 @@ def main():
     parser.add_argument('--version', action='version', version=f'vibe-scraping {__version__}')
     
     # URL argument
-    parser.add_argument('url', nargs='?', help='URL to crawl')
+    parser.add_argument('url', nargs='*', help='URL(s) to crawl')
     
     # Options
     parser.add_argument('-o', '--output', default='./crawled_data', help='Output directory')
@@ -21,6 +23,69 @@ def main():
     parser.add_argument('--delay', type=float, default=0.1, help='Request delay')
     parser.add_argument('-f', '--follow-external', action='store_true', help='Follow external links')
     parser.add_argument('-i', '--ignore-robots', action='store_true', help='Ignore robots.txt')
+    parser.add_argument('--storage', choices=['directory', 'segments'], default='directory',
+                        help='Page storage layout (segments packs pages into a few large files)')
+    parser.add_argument('-c', '--compression', choices=CODECS, default='none',
+                        help='Codec for stored page bodies (zstd requires the zstandard package)')
+    parser.add_argument('--dedup', action='store_true',
+                        help='Store identical page bodies only once (by content hash)')
+    parser.add_argument('--near-dup-distance', type=int, default=None,
+                        help='Flag near-duplicate pages whose text SimHash differs by at most N bits (e.g. 3)')
+    parser.add_argument('--skip-near-dup-links', action='store_true',
+                        help='Do not follow links found on near-duplicate pages')
+    parser.add_argument('--canonical-rules',
+                        help='JSON file with per-domain URL canonicalization rules '
+                             '(e.g. {"example.com": {"drop": ["ref"]}})')
+    parser.add_argument('--state-dir', default=None,
+                        help='Directory for the crawl index (default: the output directory)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Send conditional requests and skip pages unchanged since the last crawl')
+    parser.add_argument('--revisit-budget', type=int, default=None,
+                        help='Revisit at most N known pages, picked by how often they change '
+                             '(new pages are always fetched; needs a kept --state-dir)')
+    parser.add_argument('--sitemaps', action='store_true',
+                        help='Seed the crawl from robots.txt sitemaps, /sitemap.xml and the RSS/Atom '
+                             'feeds the start page advertises (listed pages go first, newest first)')
+    parser.add_argument('--seed-url', action='append', default=None,
+                        help='Sitemap, sitemap index or feed URL to seed the crawl from (repeatable)')
+    parser.add_argument('--seed-max-age', type=float, default=None,
+                        help='Ignore sitemap and feed entries older than this many days')
+    parser.add_argument('--url-scorer', default=None,
+                        help="Crawl best-first instead of breadth-first: 'article' (article-shaped URLs first, "
+                             "learning from earlier runs in --state-dir) or a dotted URLScorer class path")
+    parser.add_argument('--adaptive-throttle', action='store_true',
+                        help='Adapt per-host concurrency and delay to latency, errors and 429/503 responses '
+                             '(the state is kept in --state-dir for the next crawl)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Crawl in N parallel processes, one share of the domains each '
+                             '(needs URLs on more than one domain)')
+    parser.add_argument('--shared-frontier', default=None,
+                        help='SQLite frontier shared by several crawler processes working on one crawl: '
+                             'each leases batches of URLs from it and no URL is fetched twice '
+                             '(give each process its own --output and --state-dir)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue the crawl interrupted last time (stopped by Ctrl-C, SIGTERM or a crash) '
+                             'instead of starting over')
+    parser.add_argument('--extract-fields', action='store_true',
+                        help="Store each page's text, title, meta tags and publish date next to it "
+                             "(extracted.json), so processing does not parse the page again")
+    parser.add_argument('--content-type', action='append', default=None,
+                        help='Media type to download, e.g. application/pdf (repeatable; default: HTML). '
+                             'Other responses are dropped as soon as their headers arrive')
+    parser.add_argument('--max-page-size', type=float, default=None,
+                        help='Drop responses larger than this many MB (default: 10)')
+    parser.add_argument('--no-content-gate', action='store_true',
+                        help='Download responses of every type and size')
+    parser.add_argument('--host-cache', default=None,
+                        help='Database of robots.txt files and DNS results shared by the crawls on this host '
+                             '(default: ~/.cache/vibe-scraping/hostcache.db)')
+    parser.add_argument('--no-host-cache', action='store_true',
+                        help='Fetch robots.txt and resolve host names afresh')
+    parser.add_argument('--trap-limits', default=None,
+                        help='JSON object of crawler trap limits, e.g. \'{"max_template_urls": 500, '
+                             '"prune_ratio": 0.1}\' (see vibe_scraping.traps.TrapDetector)')
+    parser.add_argument('--no-trap-detection', action='store_true',
+                        help='Follow links into calendars, faceted filters and other endless URL spaces')
     
     args = parser.parse_args()
     
@@ -34,18 +99,45 @@ def main():
         parser.print_help()
         return 1
     
+    canonical_rules = None
+    if args.canonical_rules:
+        with open(args.canonical_rules, 'r', encoding='utf-8') as f:
+            canonical_rules = json.load(f)
+    
     # Ensure output directory exists
     os.makedirs(args.output, exist_ok=True)
     
     # Create crawler
     crawler = WebCrawler(
-        start_url=args.url,
+        start_urls=args.url,
         max_depth=args.depth,
         max_pages=args.pages,
         follow_external_links=args.follow_external,
         respect_robots_txt=not args.ignore_robots,
         delay=args.delay,
-        save_path=args.output
+        save_path=args.output,
+        storage=args.storage,
+        compression=args.compression,
+        deduplicate_bodies=args.dedup,
+        near_duplicate_distance=args.near_dup_distance,
+        skip_near_duplicate_links=args.skip_near_dup_links,
+        canonical_rules=canonical_rules,
+        state_path=args.state_dir,
+        incremental=args.incremental,
+        revisit_budget=args.revisit_budget,
+        discover_seeds=args.sitemaps,
+        seed_urls=args.seed_url,
+        seed_max_age_days=args.seed_max_age,
+        url_scorer=args.url_scorer,
+        adaptive_throttle=args.adaptive_throttle,
+        workers=args.workers,
+        shared_frontier=args.shared_frontier,
+        resume=args.resume,
+        extract_fields=args.extract_fields,
+        content_types=[] if args.no_content_gate else args.content_type,
+        max_body_sizes={'*': int(args.max_page_size * 1024 * 1024)} if args.max_page_size else None,
+        host_cache=False if args.no_host_cache else args.host_cache or True,
+        trap_detection=False if args.no_trap_detection else json.loads(args.trap_limits or "{}") or True
     )
     
     # Run crawler
@@ -55,6 +147,47 @@ def main():
         # Print results
         pages_crawled = result.get('pages_crawled', 0) if isinstance(result, dict) else result
         print(f"\nCrawl completed: {pages_crawled} pages")
+        if isinstance(result, dict) and result.get('resumed'):
+            print("Resumed an interrupted crawl")
+        dedup = result.get('dedup') if isinstance(result, dict) else None
+        if dedup:
+            print(f"Duplicate bodies: {dedup['duplicate_bodies']} (dedup ratio {dedup['dedup_ratio']:.2f})")
+        canonicalization = result.get('canonicalization') if isinstance(result, dict) else None
+        if canonicalization:
+            print(f"Fetches saved by URL canonicalization: {canonicalization['fetches_saved']}")
+        conditional_get = result.get('conditional_get') if isinstance(result, dict) else None
+        if conditional_get:
+            print(f"Unchanged pages (304): {conditional_get['not_modified']} "
+                  f"({conditional_get['bytes_saved'] / (1024 * 1024):.2f} MB not downloaded)")
+        near_duplicates = result.get('near_duplicates') if isinstance(result, dict) else None
+        if near_duplicates:
+            print(f"Near-duplicate pages: {near_duplicates['near_duplicates']} "
+                  f"({near_duplicates['requests_skipped']} links not followed)")
+        seeds = result.get('seeds') if isinstance(result, dict) else None
+        if seeds:
+            print(f"Seeded from sitemaps/feeds: {seeds['seeded']} pages from {seeds['documents']} documents "
+                  f"({seeds['unchanged']} unchanged since the last crawl)")
+        crawl_yield = result.get('yield') if isinstance(result, dict) else None
+        if crawl_yield:
+            print(f"Yield ({crawl_yield['scorer']}): {crawl_yield['useful']} articles in "
+                  f"{crawl_yield['fetches']} fetches ({crawl_yield['yield']:.2f} per fetch)")
+        content_gate = result.get('content_gate') if isinstance(result, dict) else None
+        if content_gate and content_gate['skipped']:
+            reasons = ', '.join(f"{count} {reason}" for reason, count in content_gate['reasons'].items())
+            print(f"Responses dropped at the headers: {content_gate['skipped']} ({reasons}; "
+                  f"{content_gate['bytes_saved'] / (1024 * 1024):.2f} MB not downloaded)")
+        traps = result.get('traps') if isinstance(result, dict) else None
+        if traps and (traps['links_pruned'] or traps['links_throttled']):
+            print(f"Crawler traps: {traps['links_pruned']} links pruned, {traps['links_throttled']} throttled "
+                  f"({traps['templates_pruned']} URL templates pruned, {traps['templates_throttled']} throttled)")
+        shards = result.get('shards') if isinstance(result, dict) else None
+        if shards:
+            print(f"Worker processes: {len(shards)} "
+                  f"({', '.join(str(shard['pages_crawled']) for shard in shards)} pages)")
+        frontier = result.get('frontier') if isinstance(result, dict) else None
+        if frontier:
+            print(f"Shared frontier: {frontier['requests_leased']} requests leased by this process, "
+                  f"{frontier['pending']} pending, {frontier['done']} done overall")
         print(f"Data saved to: {args.output}")
         
         return 0
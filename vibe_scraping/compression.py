@@ -0,0 +1,103 @@
+"""
+Compression codecs for stored page bodies.
+
+Supported codecs are ``none``, ``gzip`` (standard library) and ``zstd``
+(requires the ``zstandard`` package).
+"""
+
+import gzip
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# zstd is optional
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+CODECS = ("none", "gzip", "zstd")
+
+# File suffix used for page bodies in the directory layout
+FILE_EXTENSIONS = {
+    "none": "",
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+# HTTP Content-Encoding values, used when uploading compressed bodies
+CONTENT_ENCODINGS = {
+    "gzip": "gzip",
+    "zstd": "zstd",
+}
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def check_codec(codec):
+    """
+    Validate a codec name.
+
+    Raises:
+        ValueError: If the codec is unknown
+        ImportError: If the codec's library is not installed
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression codec: {codec}. Choose from: {', '.join(CODECS)}")
+    if codec == "zstd" and not ZSTD_AVAILABLE:
+        raise ImportError("zstandard is not installed. Install with: pip install zstandard")
+    return codec
+
+
+def compress(data, codec):
+    """
+    Compress bytes with the given codec.
+
+    Args:
+        data: Bytes to compress
+        codec: 'none', 'gzip' or 'zstd'
+
+    Returns:
+        Compressed bytes
+    """
+    if codec in (None, "none"):
+        return data
+    if codec == "gzip":
+        # mtime=0 keeps the output deterministic for identical bodies
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if codec == "zstd":
+        check_codec(codec)
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+
+def decompress(data, codec):
+    """
+    Decompress bytes produced by :func:`compress`.
+
+    Args:
+        data: Compressed bytes
+        codec: 'none', 'gzip' or 'zstd'
+
+    Returns:
+        Decompressed bytes
+    """
+    if codec in (None, "none"):
+        return data
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        check_codec(codec)
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+
+def codec_from_filename(filename):
+    """Return the codec implied by a file's suffix ('none' if it has no codec suffix)."""
+    for codec, extension in FILE_EXTENSIONS.items():
+        if extension and filename.endswith(extension):
+            return codec
+    return "none"
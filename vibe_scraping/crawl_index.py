@@ -0,0 +1,497 @@
+"""
+SQLite-backed crawl index for vibe-scraping.
+
+Stores crawled pages, their outgoing links and crawl runs in an indexed SQLite
+database (WAL mode) next to the crawled data. The spider writes to it in
+batched transactions; readers query it by depth, domain, crawl time or URL
+prefix and iterate over the results without loading the whole crawl into
+memory.
+"""
+
+import os
+import json
+import sqlite3
+import logging
+from datetime import datetime
+from urllib.parse import urlparse
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "crawl_index.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    start_time TEXT NOT NULL,
+    end_time TEXT,
+    start_urls TEXT,
+    max_depth INTEGER,
+    max_pages INTEGER,
+    pages_crawled INTEGER DEFAULT 0,
+    stats TEXT
+);
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    domain TEXT,
+    depth INTEGER,
+    crawl_time TEXT,
+    html_length INTEGER,
+    run_id INTEGER REFERENCES runs(id)
+);
+CREATE INDEX IF NOT EXISTS idx_pages_depth ON pages(depth);
+CREATE INDEX IF NOT EXISTS idx_pages_domain ON pages(domain);
+CREATE INDEX IF NOT EXISTS idx_pages_crawl_time ON pages(crawl_time);
+CREATE INDEX IF NOT EXISTS idx_pages_hash ON pages(hash);
+CREATE TABLE IF NOT EXISTS change_stats (
+    url TEXT PRIMARY KEY,
+    intervals INTEGER NOT NULL DEFAULT 0,
+    changes INTEGER NOT NULL DEFAULT 0,
+    observed_seconds REAL NOT NULL DEFAULT 0,
+    last_change TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS links (
+    src_url TEXT NOT NULL,
+    dst_url TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (src_url, position)
+) WITHOUT ROWID;
+"""
+
+# Columns added to the pages table after its first release; older indexes
+# are migrated on open
+_ADDED_PAGE_COLUMNS = {
+    "content_hash": "TEXT",
+    "near_duplicate_of": "TEXT",
+    "etag": "TEXT",
+    "last_modified": "TEXT",
+    "not_modified": "INTEGER",
+    "sitemap_lastmod": "TEXT",
+    "url_template": "TEXT",
+    "is_article": "INTEGER",
+}
+
+_PAGE_COLUMNS = ("url", "hash", "domain", "depth", "crawl_time", "html_length", "run_id",
+                 *_ADDED_PAGE_COLUMNS)
+
+_INSERT_PAGE = (f"INSERT OR REPLACE INTO pages ({', '.join(_PAGE_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(_PAGE_COLUMNS))})")
+
+
+def _seconds_between(start, end):
+    """Return the seconds between two ISO timestamps, or None if either is missing or invalid."""
+    try:
+        return (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+
+def _prefix_upper_bound(prefix):
+    """Return the smallest string greater than every string starting with prefix."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class CrawlIndex:
+    """Indexed store of crawled pages, links and crawl runs."""
+
+    def __init__(self, db_path, batch_size=100):
+        """
+        Open (or create) a crawl index.
+
+        Args:
+            db_path: Path to the SQLite database file
+            batch_size: Number of pages buffered before a write transaction is committed
+        """
+        self.db_path = str(db_path)
+        self.batch_size = batch_size
+        self._pending = []
+
+        # The spider's writer thread adds pages; callers must not share the
+        # index between threads concurrently
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._migrate()
+        self.conn.commit()
+
+    def _migrate(self):
+        """Add columns introduced after the index was created."""
+        existing = {row["name"] for row in self.conn.execute("PRAGMA table_info(pages)")}
+        for column, column_type in _ADDED_PAGE_COLUMNS.items():
+            if column not in existing:
+                self.conn.execute(f"ALTER TABLE pages ADD COLUMN {column} {column_type}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_content_hash ON pages(content_hash)")
+
+    @staticmethod
+    def remove(db_path):
+        """Delete an index database together with its WAL and shared-memory files."""
+        for suffix in ("", "-wal", "-shm"):
+            path = str(db_path) + suffix
+            if os.path.exists(path):
+                os.remove(path)
+
+    # Writing
+
+    def start_run(self, start_urls, max_depth=None, max_pages=None):
+        """
+        Record the start of a crawl run.
+
+        Returns:
+            The id of the new run
+        """
+        cursor = self.conn.execute(
+            "INSERT INTO runs (start_time, start_urls, max_depth, max_pages) VALUES (?, ?, ?, ?)",
+            (datetime.now().isoformat(), json.dumps(list(start_urls)), max_depth, max_pages)
+        )
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def finish_run(self, run_id, pages_crawled, stats=None):
+        """Flush pending pages and record the end of a crawl run."""
+        self.flush()
+        self.conn.execute(
+            "UPDATE runs SET end_time = ?, pages_crawled = ?, stats = ? WHERE id = ?",
+            (datetime.now().isoformat(), pages_crawled, json.dumps(stats or {}, default=str), run_id)
+        )
+        self.conn.commit()
+
+    def add_page(self, url, entry, run_id=None):
+        """
+        Buffer a crawled page for the next batched write.
+
+        Args:
+            url: URL of the crawled page
+            entry: The page's crawled_urls entry (hash, depth, links, html_length,
+                last_visit and the optional content_hash, near_duplicate_of, etag,
+                last_modified, not_modified, sitemap_lastmod, url_template and is_article)
+            run_id: Id of the crawl run that fetched the page
+        """
+        self._pending.append((url, entry, run_id))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered pages in a single transaction."""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, []
+        with self.conn:
+            for url, entry, run_id in pending:
+                self._record_change(url, entry, run_id)
+                self.conn.execute(
+                    _INSERT_PAGE,
+                    (url, entry.get("hash"), urlparse(url).netloc.lower(), entry.get("depth"),
+                     entry.get("last_visit"), entry.get("html_length"), run_id,
+                     *(entry.get(column) for column in _ADDED_PAGE_COLUMNS))
+                )
+                self.conn.execute("DELETE FROM links WHERE src_url = ?", (url,))
+                self.conn.executemany(
+                    "INSERT INTO links (src_url, dst_url, position) VALUES (?, ?, ?)",
+                    ((url, link, position) for position, link in enumerate(entry.get("links", [])))
+                )
+
+    def _record_change(self, url, entry, run_id):
+        """Update the change statistics of a page revisited by a later run."""
+        previous = self.conn.execute(
+            "SELECT content_hash, crawl_time, run_id FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if previous is None or previous["run_id"] == run_id or not previous["content_hash"]:
+            return
+
+        interval = _seconds_between(previous["crawl_time"], entry.get("last_visit"))
+        content_hash = entry.get("content_hash")
+        if interval is None or interval <= 0 or not content_hash:
+            return
+
+        changed = content_hash != previous["content_hash"]
+        self.conn.execute(
+            "INSERT INTO change_stats (url, intervals, changes, observed_seconds, last_change) "
+            "VALUES (?, 1, ?, ?, ?) "
+            "ON CONFLICT(url) DO UPDATE SET intervals = intervals + 1, "
+            "changes = changes + excluded.changes, "
+            "observed_seconds = observed_seconds + excluded.observed_seconds, "
+            "last_change = COALESCE(excluded.last_change, last_change)",
+            (url, int(changed), interval, entry.get("last_visit") if changed else None)
+        )
+
+    def merge_run(self, other_path, run_id):
+        """
+        Copy the pages of the latest run of another index into this one.
+
+        Used to merge the indexes of a sharded crawl: the pages, their links
+        and their change statistics replace any earlier entries for the same
+        URLs, and the pages are attributed to run_id of this index.
+
+        Args:
+            other_path: Path to the other index database
+            run_id: Id of the run in this index the pages belong to
+
+        Returns:
+            Number of pages copied
+        """
+        self.flush()
+        self.conn.execute("ATTACH DATABASE ? AS other", (str(other_path),))
+        try:
+            row = self.conn.execute("SELECT MAX(id) AS id FROM other.runs").fetchone()
+            if row["id"] is None:
+                return 0
+            columns = ", ".join(_PAGE_COLUMNS)
+            values = ", ".join("?" if column == "run_id" else f"p.{column}" for column in _PAGE_COLUMNS)
+            latest_pages = "SELECT url FROM other.pages WHERE run_id = ?"
+            with self.conn:
+                self.conn.execute(f"DELETE FROM main.links WHERE src_url IN ({latest_pages})", (row["id"],))
+                cursor = self.conn.execute(
+                    f"INSERT OR REPLACE INTO main.pages ({columns}) "
+                    f"SELECT {values} FROM other.pages p WHERE p.run_id = ?",
+                    (run_id, row["id"])
+                )
+                copied = cursor.rowcount
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO main.links (src_url, dst_url, position) "
+                    f"SELECT src_url, dst_url, position FROM other.links WHERE src_url IN ({latest_pages})",
+                    (row["id"],)
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO main.change_stats "
+                    "(url, intervals, changes, observed_seconds, last_change) "
+                    "SELECT url, intervals, changes, observed_seconds, last_change FROM other.change_stats "
+                    f"WHERE url IN ({latest_pages})",
+                    (row["id"],)
+                )
+            return copied
+        finally:
+            self.conn.execute("DETACH DATABASE other")
+
+    def close(self):
+        """Flush pending pages and close the database."""
+        if self.conn is None:
+            return
+        self.flush()
+        self.conn.close()
+        self.conn = None
+
+    # Reading
+
+    @staticmethod
+    def _page_filter(depth=None, min_depth=None, max_depth=None, domain=None, since=None,
+                     until=None, url_prefix=None, run_id=None, content_hash=None,
+                     near_duplicates=None):
+        """Build a WHERE clause and its parameters for the page filters."""
+        clauses = []
+        params = []
+        if depth is not None:
+            clauses.append("depth = ?")
+            params.append(depth)
+        if min_depth is not None:
+            clauses.append("depth >= ?")
+            params.append(min_depth)
+        if max_depth is not None:
+            clauses.append("depth <= ?")
+            params.append(max_depth)
+        if domain is not None:
+            clauses.append("domain = ?")
+            params.append(domain.lower())
+        if since is not None:
+            clauses.append("crawl_time >= ?")
+            params.append(since.isoformat() if isinstance(since, datetime) else since)
+        if until is not None:
+            clauses.append("crawl_time < ?")
+            params.append(until.isoformat() if isinstance(until, datetime) else until)
+        if url_prefix:
+            # Range scan on the primary key instead of a LIKE table scan
+            clauses.append("url >= ? AND url < ?")
+            params.extend([url_prefix, _prefix_upper_bound(url_prefix)])
+        if run_id is not None:
+            clauses.append("run_id = ?")
+            params.append(run_id)
+        if content_hash is not None:
+            clauses.append("content_hash = ?")
+            params.append(content_hash)
+        if near_duplicates is not None:
+            clauses.append("near_duplicate_of IS NOT NULL" if near_duplicates else "near_duplicate_of IS NULL")
+
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return where, params
+
+    def iter_pages(self, include_links=False, **filters):
+        """
+        Iterate over indexed pages matching the given filters.
+
+        Rows are streamed from SQLite, so memory use is constant regardless of
+        the size of the crawl.
+
+        Args:
+            include_links: Whether to attach each page's outgoing links
+            **filters: Any of depth, min_depth, max_depth, domain (e.g. 'www.ambebi.ge'),
+                since / until (ISO timestamp or datetime), url_prefix, run_id, content_hash,
+                near_duplicates (True for only near-duplicate pages, False to exclude them)
+
+        Yields:
+            Dictionaries with url, hash, domain, depth, crawl_time, html_length,
+            run_id, content_hash, near_duplicate_of and (optionally) links
+        """
+        where, params = self._page_filter(**filters)
+        query = f"SELECT {', '.join(_PAGE_COLUMNS)} FROM pages{where} ORDER BY url"
+
+        self.flush()
+        # A dedicated cursor lets callers issue other queries while iterating
+        for row in self.conn.cursor().execute(query, params):
+            page = dict(row)
+            if include_links:
+                page["links"] = self.get_links(page["url"])
+            yield page
+
+    def count_pages(self, **filters):
+        """Return the number of pages matching the same filters as iter_pages."""
+        where, params = self._page_filter(**filters)
+        self.flush()
+        return self.conn.execute(f"SELECT COUNT(*) FROM pages{where}", params).fetchone()[0]
+
+    def get_page(self, url):
+        """Return the indexed page for a URL, or None."""
+        self.flush()
+        row = self.conn.execute(
+            f"SELECT {', '.join(_PAGE_COLUMNS)} FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def get_hash(self, url):
+        """Return the storage hash for a URL, or None."""
+        page = self.get_page(url)
+        return page["hash"] if page else None
+
+    def get_links(self, url):
+        """Return the outgoing links recorded for a URL, in page order."""
+        return [row[0] for row in self.conn.execute(
+            "SELECT dst_url FROM links WHERE src_url = ? ORDER BY position", (url,)
+        )]
+
+    def count_unique_bodies(self, **filters):
+        """Return the number of distinct page bodies among the matching pages."""
+        where, params = self._page_filter(**filters)
+        self.flush()
+        return self.conn.execute(f"SELECT COUNT(DISTINCT content_hash) FROM pages{where}", params).fetchone()[0]
+
+    def load_validators(self):
+        """
+        Load the HTTP cache validators recorded for crawled pages.
+
+        Returns:
+            Dictionary of url -> (etag, last_modified) for pages with at least one validator
+        """
+        self.flush()
+        return {row[0]: (row[1], row[2]) for row in self.conn.execute(
+            "SELECT url, etag, last_modified FROM pages WHERE etag IS NOT NULL OR last_modified IS NOT NULL"
+        )}
+
+    def load_sitemap_lastmods(self):
+        """
+        Load the sitemap or feed dates recorded for seeded pages.
+
+        Returns:
+            Dictionary of url -> ISO lastmod for pages that were seeded with a date
+        """
+        self.flush()
+        return dict(self.conn.execute(
+            "SELECT url, sitemap_lastmod FROM pages WHERE sitemap_lastmod IS NOT NULL"
+        ).fetchall())
+
+    def load_template_stats(self):
+        """
+        Count the pages and articles seen under each URL template.
+
+        Returns:
+            Dictionary of (domain, url_template) -> (pages, articles)
+        """
+        self.flush()
+        return {(row[0], row[1]): (row[2], row[3] or 0) for row in self.conn.execute(
+            "SELECT domain, url_template, COUNT(*), SUM(is_article) FROM pages "
+            "WHERE url_template IS NOT NULL AND is_article IS NOT NULL GROUP BY domain, url_template"
+        )}
+
+    def iter_change_stats(self, **filters):
+        """
+        Iterate over pages with their change statistics across runs.
+
+        Args:
+            **filters: Same filters as iter_pages
+
+        Yields:
+            Dictionaries with url, depth, crawl_time, intervals (number of
+            revisits), changes (revisits that found a new body), observed_seconds
+            (total time between revisits) and last_change
+        """
+        where, params = self._page_filter(**filters)
+        query = (f"SELECT p.url, p.depth, p.crawl_time, COALESCE(c.intervals, 0) AS intervals, "
+                 f"COALESCE(c.changes, 0) AS changes, COALESCE(c.observed_seconds, 0) AS observed_seconds, "
+                 f"c.last_change FROM (SELECT * FROM pages{where}) AS p "
+                 f"LEFT JOIN change_stats AS c ON c.url = p.url")
+
+        self.flush()
+        for row in self.conn.cursor().execute(query, params):
+            yield dict(row)
+
+    @staticmethod
+    def _run_from_row(row):
+        run = dict(row)
+        run["start_urls"] = json.loads(run["start_urls"] or "[]")
+        run["stats"] = json.loads(run["stats"] or "{}")
+        return run
+
+    def iter_runs(self):
+        """Iterate over recorded crawl runs, oldest first."""
+        for row in self.conn.execute("SELECT * FROM runs ORDER BY id"):
+            yield self._run_from_row(row)
+
+    def last_run(self):
+        """Return the most recent crawl run, or None."""
+        row = self.conn.execute("SELECT * FROM runs ORDER BY id DESC LIMIT 1").fetchone()
+        return self._run_from_row(row) if row else None
+
+    def to_metadata(self):
+        """
+        Build a dictionary in the metadata.json layout from the index.
+
+        This materializes the whole crawl; prefer iter_pages for large crawls.
+        """
+        crawled_urls = {}
+        for page in self.iter_pages(include_links=True):
+            crawled_urls[page["url"]] = {
+                "last_visit": page["crawl_time"],
+                "depth": page["depth"],
+                "hash": page["hash"],
+                "links": page["links"],
+                "html_length": page["html_length"],
+                "content_hash": page["content_hash"]
+            }
+            if page["near_duplicate_of"]:
+                crawled_urls[page["url"]]["near_duplicate_of"] = page["near_duplicate_of"]
+
+        run = self.last_run() or {}
+        return {
+            "last_crawl": run.get("end_time"),
+            "crawled_urls": crawled_urls,
+            "pages_crawled": len(crawled_urls),
+            "start_urls": run.get("start_urls", []),
+            "crawl_stats": run.get("stats", {})
+        }
+
+
+def open_crawl_index(crawl_data_path):
+    """
+    Open the crawl index in a crawl data directory if one exists.
+
+    Args:
+        crawl_data_path: Path to the crawl data directory
+
+    Returns:
+        CrawlIndex instance, or None if the directory has no index
+    """
+    db_path = os.path.join(str(crawl_data_path), INDEX_FILENAME)
+    if not os.path.exists(db_path):
+        return None
+    return CrawlIndex(db_path)
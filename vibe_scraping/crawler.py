@@ -6,6 +6,9 @@ import os
 from urllib.parse import urlparse
 
 from vibe_scraping.scrapy_adapter import crawl_with_scrapy, SCRAPY_AVAILABLE
+from vibe_scraping.parallel import crawl_parallel
+from vibe_scraping.stream import stream_crawl
+from vibe_scraping.compression import CODECS, check_codec
 
 class WebCrawler:
     """
@@ -24,7 +27,30 @@ class WebCrawler:
         delay=0.1,
         save_path="./data/crawl_data",
         additional_settings=None,
-        force_fresh_crawl=True
+        force_fresh_crawl=True,
+        storage="directory",
+        compression="none",
+        deduplicate_bodies=False,
+        near_duplicate_distance=None,
+        skip_near_duplicate_links=False,
+        canonical_rules=None,
+        state_path=None,
+        incremental=False,
+        revisit_budget=None,
+        discover_seeds=False,
+        seed_urls=None,
+        seed_max_age_days=None,
+        url_scorer=None,
+        adaptive_throttle=False,
+        throttle_limits=None,
+        workers=1,
+        shared_frontier=None,
+        resume=False,
+        extract_fields=False,
+        content_types=None,
+        max_body_sizes=None,
+        host_cache=True,
+        trap_detection=True
     ):
         self.start_url = start_url
         self.start_urls = []
@@ -48,22 +74,81 @@ class WebCrawler:
         self.save_path = save_path
         self.additional_settings = additional_settings or {}
         self.force_fresh_crawl = force_fresh_crawl
+        self.storage = storage
+        self.compression = check_codec(compression)
+        self.deduplicate_bodies = deduplicate_bodies
+        self.near_duplicate_distance = near_duplicate_distance
+        self.skip_near_duplicate_links = skip_near_duplicate_links
+        self.canonical_rules = canonical_rules
+        self.state_path = state_path
+        self.incremental = incremental
+        self.revisit_budget = revisit_budget
+        self.discover_seeds = discover_seeds
+        self.seed_urls = seed_urls
+        self.seed_max_age_days = seed_max_age_days
+        self.url_scorer = url_scorer
+        self.adaptive_throttle = adaptive_throttle
+        self.throttle_limits = throttle_limits
+        self.workers = max(1, int(workers or 1))
+        self.shared_frontier = shared_frontier
+        self.resume = resume
+        self.extract_fields = extract_fields
+        self.content_types = content_types
+        self.max_body_sizes = max_body_sizes
+        self.host_cache = host_cache
+        self.trap_detection = trap_detection
         
         os.makedirs(self.save_path, exist_ok=True)
         
         # Get domain from first URL if available
         self.domain = urlparse(self.start_urls[0]).netloc if self.start_urls else ""
     
-    def crawl(self):
-        """Start crawling using Scrapy."""
+    def crawl(self, runner=None):
+        """
+        Start crawling using Scrapy.
+        
+        Args:
+            runner: CrawlerRunner of a running reactor (see vibe_scraping.daemon) to
+                schedule the crawl on; the crawl statistics are then returned in a Deferred
+        """
         if not SCRAPY_AVAILABLE:
             raise ImportError("Scrapy is not installed. Install with: pip install scrapy")
             
         if not self.start_urls:
             raise ValueError("No start URLs provided. Set either start_url or start_urls.")
+        
+        # Each worker process crawls its own share of the domains with its own reactor
+        if self.workers > 1 and len({urlparse(url).netloc.lower() for url in self.start_urls}) > 1:
+            if runner is not None:
+                # Waiting for the workers must not block the daemon's reactor
+                from twisted.internet.threads import deferToThread
+                return deferToThread(crawl_parallel, workers=self.workers, **self._crawl_args())
+            return crawl_parallel(workers=self.workers, **self._crawl_args())
             
-        return crawl_with_scrapy(
-            start_url=self.start_url,
+        return crawl_with_scrapy(start_url=self.start_url, runner=runner, **self._crawl_args())
+    
+    def stream(self, buffer_size=64):
+        """
+        Crawl and yield a record for every page as it is fetched.
+        
+        The records hold the page's url, depth, status, headers, body and links
+        (see vibe_scraping.stream.stream_crawl); the pages are saved as by crawl().
+        The crawl runs in this process, whatever the number of workers.
+        
+        Args:
+            buffer_size: Records held for the consumer before the crawl waits for it
+        """
+        if not SCRAPY_AVAILABLE:
+            raise ImportError("Scrapy is not installed. Install with: pip install scrapy")
+            
+        if not self.start_urls:
+            raise ValueError("No start URLs provided. Set either start_url or start_urls.")
+        
+        return stream_crawl(buffer_size=buffer_size, start_url=self.start_url, **self._crawl_args())
+    
+    def _crawl_args(self):
+        """Return the keyword arguments of crawl_with_scrapy for this crawler."""
+        return dict(
             start_urls=self.start_urls,
             save_path=self.save_path,
             max_depth=self.max_depth,
@@ -74,12 +159,40 @@ class WebCrawler:
             delay=self.delay,
             additional_settings=self.additional_settings,
             enable_caching=False,  # Disable caching by default
-            force_recrawl=self.force_fresh_crawl
+            force_recrawl=self.force_fresh_crawl,
+            storage=self.storage,
+            compression=self.compression,
+            deduplicate_bodies=self.deduplicate_bodies,
+            near_duplicate_distance=self.near_duplicate_distance,
+            skip_near_duplicate_links=self.skip_near_duplicate_links,
+            canonical_rules=self.canonical_rules,
+            state_path=self.state_path,
+            incremental=self.incremental,
+            revisit_budget=self.revisit_budget,
+            discover_seeds=self.discover_seeds,
+            seed_urls=self.seed_urls,
+            seed_max_age_days=self.seed_max_age_days,
+            url_scorer=self.url_scorer,
+            adaptive_throttle=self.adaptive_throttle,
+            throttle_limits=self.throttle_limits,
+            shared_frontier=self.shared_frontier,
+            resume=self.resume,
+            extract_fields=self.extract_fields,
+            content_types=self.content_types,
+            max_body_sizes=self.max_body_sizes,
+            host_cache=self.host_cache,
+            trap_detection=self.trap_detection
         )
 
 def crawl_site(start_url=None, start_urls=None, output_dir="crawled_data", max_depth=5, max_pages=1000, 
                delay=0.1, follow_external_links=False, respect_robots_txt=True, user_agent=None,
-               force_fresh_crawl=True):
+               force_fresh_crawl=True, storage="directory", compression="none",
+               deduplicate_bodies=False, near_duplicate_distance=None, skip_near_duplicate_links=False,
+               canonical_rules=None, state_path=None, incremental=False, revisit_budget=None,
+               discover_seeds=False, seed_urls=None, seed_max_age_days=None, url_scorer=None,
+               adaptive_throttle=False, throttle_limits=None, workers=1, shared_frontier=None,
+               resume=False, extract_fields=False, content_types=None, max_body_sizes=None,
+               host_cache=True, trap_detection=True):
     """Convenience function to crawl a website."""
     crawler = WebCrawler(
         start_url=start_url,
@@ -91,7 +204,30 @@ def crawl_site(start_url=None, start_urls=None, output_dir="crawled_data", max_d
         user_agent=user_agent,
         delay=delay,
         save_path=output_dir,
-        force_fresh_crawl=force_fresh_crawl
+        force_fresh_crawl=force_fresh_crawl,
+        storage=storage,
+        compression=compression,
+        deduplicate_bodies=deduplicate_bodies,
+        near_duplicate_distance=near_duplicate_distance,
+        skip_near_duplicate_links=skip_near_duplicate_links,
+        canonical_rules=canonical_rules,
+        state_path=state_path,
+        incremental=incremental,
+        revisit_budget=revisit_budget,
+        discover_seeds=discover_seeds,
+        seed_urls=seed_urls,
+        seed_max_age_days=seed_max_age_days,
+        url_scorer=url_scorer,
+        adaptive_throttle=adaptive_throttle,
+        throttle_limits=throttle_limits,
+        workers=workers,
+        shared_frontier=shared_frontier,
+        resume=resume,
+        extract_fields=extract_fields,
+        content_types=content_types,
+        max_body_sizes=max_body_sizes,
+        host_cache=host_cache,
+        trap_detection=trap_detection
     )
     
     return crawler.crawl()
@@ -99,6 +235,7 @@ def crawl_site(start_url=None, start_urls=None, output_dir="crawled_data", max_d
 
 # Example usage
 if __name__ == "__main__":
+    import json
     import argparse
     
     # Parse command-line arguments
@@ -110,9 +247,64 @@ if __name__ == "__main__":
     parser.add_argument("--delay", type=float, default=0.1, help="Delay between requests in seconds")
     parser.add_argument("--subdomains", action="store_true", help="Follow links to subdomains")
     parser.add_argument("--fresh", action="store_true", help="Force a fresh crawl ignoring cache")
+    parser.add_argument("--storage", choices=["directory", "segments"], default="directory",
+                        help="Page storage layout")
+    parser.add_argument("--compression", choices=CODECS, default="none",
+                        help="Codec for stored page bodies")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Store identical page bodies only once")
+    parser.add_argument("--near-dup-distance", type=int, default=None,
+                        help="Flag pages whose text SimHash differs by at most this many bits")
+    parser.add_argument("--skip-near-dup-links", action="store_true",
+                        help="Don't follow links from near-duplicate pages")
+    parser.add_argument("--canonical-rules",
+                        help="JSON file with per-domain URL canonicalization rules")
+    parser.add_argument("--state-dir", default=None,
+                        help="Directory for the crawl index (default: the output directory)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Use conditional requests to skip pages unchanged since the last crawl")
+    parser.add_argument("--revisit-budget", type=int, default=None,
+                        help="Revisit at most this many known pages, chosen by estimated change rate")
+    parser.add_argument("--sitemaps", action="store_true",
+                        help="Seed the crawl from robots.txt sitemaps and advertised RSS/Atom feeds")
+    parser.add_argument("--seed-url", action="append", default=None,
+                        help="Sitemap or feed URL to seed the crawl from (repeatable)")
+    parser.add_argument("--seed-max-age", type=float, default=None,
+                        help="Ignore sitemap and feed entries older than this many days")
+    parser.add_argument("--url-scorer", default=None,
+                        help="Fetch the most promising links first: 'article' or a dotted URLScorer class path")
+    parser.add_argument("--adaptive-throttle", action="store_true",
+                        help="Adapt each host's concurrency and delay to its latency and errors")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Crawl the domains in this many parallel processes")
+    parser.add_argument("--shared-frontier", default=None,
+                        help="Frontier database shared with other crawler processes of the same crawl")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the crawl interrupted last time instead of starting over")
+    parser.add_argument("--extract-fields", action="store_true",
+                        help="Store each page's text, title, meta tags and publish date next to it")
+    parser.add_argument("--content-type", action="append", default=None,
+                        help="Media type to download (repeatable; default: HTML)")
+    parser.add_argument("--max-page-size", type=float, default=None,
+                        help="Drop responses larger than this many MB (default: 10)")
+    parser.add_argument("--no-content-gate", action="store_true",
+                        help="Download responses of every type and size")
+    parser.add_argument("--host-cache", default=None,
+                        help="Database of robots.txt files and DNS results shared by the crawls on this host")
+    parser.add_argument("--no-host-cache", action="store_true",
+                        help="Fetch robots.txt and resolve host names afresh")
+    parser.add_argument("--trap-limits", default=None,
+                        help='JSON object of crawler trap limits, e.g. \'{"max_template_urls": 500}\'')
+    parser.add_argument("--no-trap-detection", action="store_true",
+                        help="Follow links into calendars, filters and other endless URL spaces")
     
     args = parser.parse_args()
     
+    canonical_rules = None
+    if args.canonical_rules:
+        with open(args.canonical_rules, 'r', encoding='utf-8') as f:
+            canonical_rules = json.load(f)
+    
     # Crawl the site
     stats = crawl_site(
         start_urls=args.urls,
@@ -123,12 +315,56 @@ if __name__ == "__main__":
         follow_external_links=args.subdomains,
         respect_robots_txt=True,
         user_agent=None,
-        force_fresh_crawl=args.fresh
+        force_fresh_crawl=args.fresh,
+        storage=args.storage,
+        compression=args.compression,
+        deduplicate_bodies=args.dedup,
+        near_duplicate_distance=args.near_dup_distance,
+        skip_near_duplicate_links=args.skip_near_dup_links,
+        canonical_rules=canonical_rules,
+        state_path=args.state_dir,
+        incremental=args.incremental,
+        revisit_budget=args.revisit_budget,
+        discover_seeds=args.sitemaps,
+        seed_urls=args.seed_url,
+        seed_max_age_days=args.seed_max_age,
+        url_scorer=args.url_scorer,
+        adaptive_throttle=args.adaptive_throttle,
+        workers=args.workers,
+        shared_frontier=args.shared_frontier,
+        resume=args.resume,
+        extract_fields=args.extract_fields,
+        content_types=[] if args.no_content_gate else args.content_type,
+        max_body_sizes={'*': int(args.max_page_size * 1024 * 1024)} if args.max_page_size else None,
+        host_cache=False if args.no_host_cache else args.host_cache or True,
+        trap_detection=False if args.no_trap_detection else json.loads(args.trap_limits or "{}") or True
     )
     
     # Print stats
     print(f"\nCrawl completed:")
     print(f"Pages crawled: {stats['pages_crawled']}")
     print(f"Max depth: {stats['max_depth']}")
+    if stats.get('dedup'):
+        print(f"Dedup ratio: {stats['dedup']['dedup_ratio']:.2f} "
+              f"({stats['dedup']['duplicate_bodies']} duplicate bodies)")
+    if stats.get('canonicalization'):
+        print(f"Fetches saved by URL canonicalization: {stats['canonicalization']['fetches_saved']}")
+    if stats.get('conditional_get'):
+        print(f"Unchanged pages (304): {stats['conditional_get']['not_modified']}, "
+              f"{stats['conditional_get']['bytes_saved']} bytes not downloaded")
+    if stats.get('near_duplicates'):
+        print(f"Near-duplicate pages: {stats['near_duplicates']['near_duplicates']}")
+    if stats.get('seeds'):
+        print(f"Seeded from sitemaps/feeds: {stats['seeds']['seeded']} pages "
+              f"from {stats['seeds']['documents']} documents ({stats['seeds']['unchanged']} unchanged)")
+    if stats.get('yield'):
+        print(f"Yield ({stats['yield']['scorer']}): {stats['yield']['useful']} articles "
+              f"in {stats['yield']['fetches']} fetches ({stats['yield']['yield']:.2f} per fetch)")
+    if stats.get('shards'):
+        print(f"Worker processes: {stats['workers']} "
+              f"({', '.join(str(shard['pages_crawled']) for shard in stats['shards'])} pages)")
+    if stats.get('frontier'):
+        print(f"Shared frontier: {stats['frontier']['requests_leased']} requests leased, "
+              f"{stats['frontier']['pending']} pending, {stats['frontier']['done']} done overall")
     print(f"Start URLs: {', '.join(stats['start_urls'])}")
     print(f"Output directory: {args.output}") 
\ No newline at end of file
@@ -0,0 +1,282 @@
+"""
+Long-lived crawl daemon for vibe-scraping.
+
+A Twisted reactor cannot be restarted, so :func:`crawl_with_scrapy` with its
+``CrawlerProcess`` can run only once per process and every scheduled crawl has
+needed a fresh interpreter. :class:`CrawlDaemon` keeps one reactor running and
+schedules successive crawls on a ``CrawlerRunner`` instead. Scrapy, boto3 and
+the other imports are paid for once, and state that is independent of a crawl
+is kept between crawls:
+
+- the DNS cache of the resolver installed on the reactor,
+- persistent HTTP(S) connections, in one connection pool shared by the
+  crawls' download handlers (:class:`SharedPoolDownloadHandler`),
+- fetched robots.txt files.
+
+The resolver and the robots.txt middleware keep their results in memory and
+in the host cache, which crawls in other processes share (see
+:mod:`vibe_scraping.hostcache`).
+
+Everything else belongs to the crawl's spider and is released when the crawl
+finishes; the daemon runs a garbage collection after every crawl and can stop
+itself once its memory use passes a limit, for a supervisor to restart it.
+"""
+
+import gc
+import os
+import time
+import signal
+import inspect
+import logging
+import threading
+import resource
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Scrapy is only needed when the daemon runs
+try:
+    from scrapy.core.downloader.handlers.http11 import HTTP11DownloadHandler
+    from scrapy.utils.misc import build_from_crawler, load_object
+    SCRAPY_AVAILABLE = True
+except ImportError:
+    HTTP11DownloadHandler = object
+    SCRAPY_AVAILABLE = False
+
+from vibe_scraping.hostcache import RESOLVER_SETTING, default_host_cache_path
+
+# The connection pool shared by the download handlers of all crawls
+_connection_pool = None
+
+
+def _shared_connection_pool(handler_pool):
+    """Return the shared connection pool, created like the one of the first download handler."""
+    global _connection_pool
+    if _connection_pool is None:
+        from twisted.internet import reactor
+        from twisted.web.client import HTTPConnectionPool
+        _connection_pool = HTTPConnectionPool(reactor, persistent=True)
+        _connection_pool._factory = handler_pool._factory
+    _connection_pool.maxPersistentPerHost = max(_connection_pool.maxPersistentPerHost,
+                                                handler_pool.maxPersistentPerHost)
+    return _connection_pool
+
+
+def close_shared_connections(timeout=1):
+    """
+    Close the persistent connections of the shared connection pool.
+
+    Args:
+        timeout: Seconds to wait for the connections to close
+
+    Returns:
+        Deferred that fires when they are closed or the timeout passed
+    """
+    global _connection_pool
+    from twisted.internet import defer, reactor
+    if _connection_pool is None:
+        return defer.succeed(None)
+    pool, _connection_pool = _connection_pool, None
+    closed = pool.closeCachedConnections()
+    # closeCachedConnections can hang on network errors
+    timer = reactor.callLater(timeout, closed.callback, None)
+    return closed.addBoth(lambda _: timer.cancel() if timer.active() else None)
+
+
+def current_rss_mb():
+    """Return the resident memory of this process in MB (the peak where the current value is not available)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class SharedPoolDownloadHandler(HTTP11DownloadHandler):
+    """
+    HTTP(S) download handler whose persistent connections outlive its crawl.
+
+    Connections (and their TLS sessions) go back to the daemon's shared pool, so
+    the next crawl of the same sites does not reconnect; the daemon closes the
+    pool when it stops.
+    """
+
+    # Scrapy 2.13 dropped the settings argument and made close() a coroutine
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = _shared_connection_pool(self._pool)
+
+    # The pool is not this crawl's to close
+    if inspect.iscoroutinefunction(getattr(HTTP11DownloadHandler, 'close', None)):
+        async def close(self):
+            return None
+    else:
+        def close(self):
+            return None
+
+
+class CrawlDaemon:
+    """
+    Runs crawls one after another on a single, long-lived reactor.
+
+    Example:
+        daemon = CrawlDaemon()
+        daemon.run(lambda daemon: daemon.crawl(start_urls=["https://example.com/"],
+                                               save_path="./data"),
+                   interval=3600)
+    """
+
+    def __init__(self, max_rss_mb=None, settings=None):
+        """
+        Install the reactor and create the crawler runner.
+
+        Args:
+            max_rss_mb: Stop after a crawl once the process uses more memory than
+                this (None never stops for memory)
+            settings: Scrapy settings for the runner, the DNS resolver and the
+                reactor thread pool (each crawl has its own settings); the
+                resolver keeps its addresses in the HOST_CACHE_PATH database
+                (default: the host cache shared by the crawls on this host)
+        """
+        if not SCRAPY_AVAILABLE:
+            raise ImportError("Scrapy is not installed. Install with: pip install scrapy")
+
+        from scrapy.crawler import CrawlerRunner
+        from scrapy.settings import Settings
+        from scrapy.utils.log import configure_logging
+        from scrapy.utils.reactor import install_reactor
+
+        self.settings = Settings(settings)
+        # Our own logging configuration stays in place
+        self.settings.set('LOG_INSTALL_ROOT_HANDLER', False, priority='default')
+        self.settings.set(RESOLVER_SETTING, 'vibe_scraping.hostcache.PersistentCachingResolver', priority='default')
+        self.settings.set('HOST_CACHE_PATH', default_host_cache_path(), priority='default')
+        # Before Scrapy 2.13 no reactor is set by default and Twisted's default one is used
+        if self.settings['TWISTED_REACTOR']:
+            install_reactor(self.settings['TWISTED_REACTOR'], self.settings['ASYNCIO_EVENT_LOOP'])
+        configure_logging(self.settings)
+        self.runner = CrawlerRunner(self.settings)
+
+        self.max_rss_mb = max_rss_mb
+        self.running = False
+        self.crawls = 0
+        self._wait = None
+
+    def crawl(self, **crawl_args):
+        """
+        Schedule a crawl on the daemon's reactor.
+
+        Args:
+            **crawl_args: Keyword arguments of crawl_with_scrapy
+
+        Returns:
+            Deferred firing with the crawl statistics
+        """
+        from vibe_scraping.scrapy_adapter import crawl_with_scrapy
+        return crawl_with_scrapy(runner=self.runner, **crawl_args)
+
+    def run(self, job, interval=3600, once=False):
+        """
+        Run a job repeatedly until the daemon is stopped; blocks until then.
+
+        Args:
+            job: Callable taking the daemon and returning a Deferred (or a value)
+                for one cycle of work, e.g. a crawl followed by an upload
+            interval: Seconds to wait between the end of a cycle and the next one
+            once: Run the job a single time
+        """
+        from twisted.internet import reactor
+
+        self._setup_reactor(reactor)
+        self.running = True
+        reactor.callWhenRunning(self._loop, job, interval, once)
+        reactor.run(installSignalHandlers=False)
+
+    def start_in_thread(self):
+        """
+        Run the reactor on a background thread, for crawls scheduled from other
+        threads with reactor.callFromThread (see vibe_scraping.stream).
+
+        Returns:
+            The reactor thread (a daemon thread)
+        """
+        from twisted.internet import reactor
+
+        self._setup_reactor(reactor, handle_signals=False)
+        self.running = True
+        thread = threading.Thread(target=reactor.run, kwargs={'installSignalHandlers': False},
+                                  name="crawl-reactor", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Stop the daemon: running crawls close gracefully (and can be resumed), no new cycle starts."""
+        from twisted.internet import reactor
+        # Signal handlers must not log; the reactor thread does it
+        reactor.callFromThread(self._stop)
+
+    def _stop(self):
+        from twisted.internet import reactor
+
+        if not self.running:
+            # Second request: don't wait for the crawls
+            logger.info("Stopping the crawl daemon now")
+            if reactor.running:
+                reactor.stop()
+            return
+        self.running = False
+        logger.info("Stopping the crawl daemon after its current crawls")
+        self.runner.stop()
+        if self._wait is not None and not self._wait.called:
+            self._wait.cancel()
+
+    def _setup_reactor(self, reactor, handle_signals=True):
+        """Install the caching DNS resolver, size the thread pool and handle stop signals."""
+        # The runner stands in for a crawler: the resolver only reads its settings
+        resolver = build_from_crawler(load_object(self.settings[RESOLVER_SETTING]), self.runner, reactor=reactor)
+        resolver.install_on_reactor()
+        reactor.getThreadPool().adjustPoolsize(maxthreads=self.settings.getint('REACTOR_THREADPOOL_MAXSIZE'))
+        if handle_signals:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, lambda signum, frame: self.stop())
+
+    def _loop(self, job, interval, once):
+        from twisted.internet import defer, reactor, task
+
+        @defer.inlineCallbacks
+        def loop():
+            try:
+                while self.running:
+                    started = time.time()
+                    try:
+                        yield defer.maybeDeferred(job, self)
+                    except Exception as e:
+                        logger.error(f"Crawl cycle failed: {e}")
+                    self.crawls += 1
+
+                    # The crawl's spider, index and caches are garbage once it finished
+                    gc.collect()
+                    rss = current_rss_mb()
+                    logger.info(f"Crawl cycle {self.crawls} took {time.time() - started:.1f}s; "
+                                f"daemon memory {rss:.0f} MB")
+                    if self.max_rss_mb is not None and rss > self.max_rss_mb:
+                        logger.warning(f"Memory above {self.max_rss_mb} MB; stopping the daemon to release it")
+                        break
+                    if once or not self.running:
+                        break
+
+                    logger.info(f"Waiting {interval} seconds before the next crawl...")
+                    self._wait = task.deferLater(reactor, interval, lambda: None)
+                    try:
+                        yield self._wait
+                    except defer.CancelledError:
+                        break
+                    finally:
+                        self._wait = None
+            finally:
+                self.running = False
+                yield close_shared_connections()
+                if reactor.running:
+                    reactor.stop()
+
+        return loop()
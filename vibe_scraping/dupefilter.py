@@ -0,0 +1,294 @@
+"""
+Memory-bounded request deduplication for vibe-scraping.
+
+:class:`BloomDupeFilter` replaces Scrapy's ``RFPDupeFilter`` (which keeps every
+request fingerprint in a Python set) with a :class:`ScalableBloomFilter`: a
+chain of Bloom filters that grows as the crawl does while keeping the overall
+false-positive rate below a configured bound. The bit arrays can be kept in
+memory or in mmap'ed files on disk.
+
+A false positive means a never-seen URL is skipped, so the error rate should
+be small; at the default 0.1% a million URLs take about 1.8 MB.
+"""
+
+import os
+import json
+import math
+import mmap
+import shutil
+import hashlib
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Scrapy is only needed for the dupefilter class itself
+try:
+    from scrapy import signals
+    from scrapy.dupefilters import BaseDupeFilter
+    from scrapy.utils.job import job_dir
+    SCRAPY_AVAILABLE = True
+except ImportError:
+    BaseDupeFilter = object
+    SCRAPY_AVAILABLE = False
+
+BLOOM_STATE_FILENAME = "bloom.json"
+
+
+class BloomFilter:
+    """Fixed-capacity Bloom filter over bytes, backed by a bytearray or an mmap'ed file."""
+
+    def __init__(self, capacity, error_rate, path=None):
+        """
+        Initialize the filter.
+
+        Args:
+            capacity: Number of items the filter holds at the given error rate
+            error_rate: Target false-positive probability at capacity
+            path: File for an mmap'ed bit array (in memory if None); an existing
+                file of the right size is reused
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.path = path
+        self.count = 0
+
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        num_bytes = (self.num_bits + 7) // 8
+
+        self._file = None
+        if path is None:
+            self.bits = bytearray(num_bytes)
+        else:
+            exists = os.path.exists(path) and os.path.getsize(path) == num_bytes
+            self._file = open(path, 'r+b' if exists else 'w+b')
+            if not exists:
+                self._file.truncate(num_bytes)
+            self.bits = mmap.mmap(self._file.fileno(), num_bytes)
+
+    def _positions(self, item):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def add(self, item):
+        """
+        Add an item.
+
+        Returns:
+            True if the item was (probably) already present
+        """
+        bits = self.bits
+        present = True
+        for pos in self._positions(item):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                present = False
+                bits[pos >> 3] |= mask
+        if not present:
+            self.count += 1
+        return present
+
+    @property
+    def size_bytes(self):
+        return len(self.bits)
+
+    def flush(self):
+        if self._file is not None:
+            self.bits.flush()
+
+    def close(self):
+        if self._file is not None:
+            self.bits.close()
+            self._file.close()
+            self._file = None
+
+
+class ScalableBloomFilter:
+    """
+    Bloom filter that grows by adding larger filters with tighter error rates.
+
+    Each new filter has growth times the capacity of the previous one and
+    tightening times its error rate, so the compound false-positive rate stays
+    below error_rate however many items are added.
+    """
+
+    def __init__(self, initial_capacity=1000000, error_rate=0.001, growth=2, tightening=0.5, path=None):
+        """
+        Initialize the filter.
+
+        Args:
+            initial_capacity: Capacity of the first filter
+            error_rate: Upper bound on the overall false-positive rate
+            growth: Capacity multiplier for each new filter
+            tightening: Error rate multiplier for each new filter
+            path: Directory for mmap'ed bit arrays (in memory if None); filters
+                already saved there are reopened
+        """
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.path = path
+        self.filters = []
+
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self._load_state()
+
+    def _filter_path(self, number):
+        return os.path.join(self.path, f"bloom-{number:03d}.bits") if self.path else None
+
+    def _add_filter(self):
+        number = len(self.filters)
+        capacity = self.initial_capacity * self.growth ** number
+        # The first filter gets error_rate * (1 - tightening) so the series sums to error_rate
+        error_rate = self.error_rate * (1 - self.tightening) * self.tightening ** number
+        self.filters.append(BloomFilter(capacity, error_rate, path=self._filter_path(number)))
+
+    def _load_state(self):
+        state_path = os.path.join(self.path, BLOOM_STATE_FILENAME)
+        if not os.path.exists(state_path):
+            return
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if (state.get("initial_capacity"), state.get("error_rate")) != (self.initial_capacity, self.error_rate):
+            logger.warning(f"Bloom filter parameters changed, discarding saved filters in {self.path}")
+            return
+        for count in state.get("counts", []):
+            self._add_filter()
+            self.filters[-1].count = count
+
+    def _save_state(self):
+        state = {
+            "initial_capacity": self.initial_capacity,
+            "error_rate": self.error_rate,
+            "counts": [bloom.count for bloom in self.filters]
+        }
+        tmp_path = os.path.join(self.path, BLOOM_STATE_FILENAME + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, os.path.join(self.path, BLOOM_STATE_FILENAME))
+
+    def __contains__(self, item):
+        return any(item in bloom for bloom in reversed(self.filters))
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+
+    def add(self, item):
+        """
+        Add an item.
+
+        Returns:
+            True if the item was (probably) already present
+        """
+        if item in self:
+            return True
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            self._add_filter()
+        return self.filters[-1].add(item)
+
+    @property
+    def size_bytes(self):
+        return sum(bloom.size_bytes for bloom in self.filters)
+
+    def close(self):
+        """Flush mmap'ed filters to disk and release them."""
+        for bloom in self.filters:
+            bloom.flush()
+        if self.path is not None:
+            self._save_state()
+        for bloom in self.filters:
+            bloom.close()
+
+    @staticmethod
+    def remove(path):
+        """Delete filters saved in a directory."""
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+
+
+class BloomDupeFilter(BaseDupeFilter):
+    """
+    Scrapy dupefilter that remembers request fingerprints in a scalable Bloom filter.
+
+    Fingerprints come from the crawler's request fingerprinter. With JOBDIR set
+    the filter lives in the job directory and survives a pause/resume;
+    otherwise it is in memory, or in mmap'ed files under
+    BLOOM_DUPEFILTER_PATH that are cleared when the spider opens.
+
+    Requests scheduled with ``dont_filter`` (the start URLs) bypass
+    request_seen; their fingerprints are recorded when they are scheduled, so
+    links back to them are filtered like any other duplicate.
+
+    Settings:
+        BLOOM_DUPEFILTER_CAPACITY: Capacity of the first filter (default 1000000)
+        BLOOM_DUPEFILTER_ERROR_RATE: Upper bound on the false-positive rate (default 0.001)
+        BLOOM_DUPEFILTER_PATH: Directory for mmap'ed bit arrays (default: in memory)
+        DUPEFILTER_DEBUG: Log every filtered request instead of only the first
+    """
+
+    def __init__(self, fingerprinter, capacity=1000000, error_rate=0.001, path=None,
+                 persist=False, debug=False, stats=None):
+        if persist is False and path is not None:
+            # A plain on-disk filter is a memory saving only; start every run empty
+            ScalableBloomFilter.remove(path)
+        self.fingerprinter = fingerprinter
+        self.seen = ScalableBloomFilter(initial_capacity=capacity, error_rate=error_rate, path=path)
+        self.debug = debug
+        self.stats = stats
+        self.logdupes = True
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        path = settings.get('BLOOM_DUPEFILTER_PATH')
+        persist = False
+        jobdir = job_dir(settings)
+        if jobdir:
+            path = os.path.join(jobdir, "bloom")
+            persist = True
+        dupefilter = cls(
+            crawler.request_fingerprinter,
+            capacity=settings.getint('BLOOM_DUPEFILTER_CAPACITY', 1000000),
+            error_rate=settings.getfloat('BLOOM_DUPEFILTER_ERROR_RATE', 0.001),
+            path=path,
+            persist=persist,
+            debug=settings.getbool('DUPEFILTER_DEBUG'),
+            stats=crawler.stats
+        )
+        crawler.signals.connect(dupefilter.request_scheduled, signal=signals.request_scheduled)
+        return dupefilter
+
+    def request_seen(self, request):
+        return self.seen.add(self.fingerprinter.fingerprint(request))
+
+    def request_scheduled(self, request):
+        """Remember requests that skip request_seen (runs before the scheduler takes them)."""
+        if request.dont_filter:
+            self.seen.add(self.fingerprinter.fingerprint(request))
+
+    def close(self, reason):
+        if self.stats is not None:
+            self.stats.set_value('vibe/dupefilter/fingerprints', len(self.seen))
+            self.stats.set_value('vibe/dupefilter/filters', len(self.seen.filters))
+            self.stats.set_value('vibe/dupefilter/size_bytes', self.seen.size_bytes)
+        self.seen.close()
+
+    def log(self, request, spider):
+        if self.debug:
+            logger.debug(f"Filtered duplicate request: {request}")
+        elif self.logdupes:
+            logger.debug(f"Filtered duplicate request: {request} - no more duplicates will be shown "
+                         f"(see DUPEFILTER_DEBUG to show all duplicates)")
+            self.logdupes = False
+        if self.stats is not None:
+            self.stats.inc_value('dupefilter/filtered')
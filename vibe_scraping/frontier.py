@@ -0,0 +1,332 @@
+"""
+Shared on-disk crawl frontier for vibe-scraping.
+
+:class:`SharedFrontier` keeps the URL frontier and the seen-set of a crawl in
+a SQLite database (WAL mode), so several crawler processes, or containers
+sharing a volume on one host, can work through one large site without an
+external queue service and without fetching a URL twice.
+
+Workers lease batches of pending requests. A leased request stays assigned
+to its worker until the worker reports it done (when it leaves the
+downloader) or the lease expires; expired leases of a dead worker go back to
+the queue, and requests that keep failing that way are given up after a few
+attempts. :class:`SharedFrontierScheduler` plugs the frontier into Scrapy in
+place of the default scheduler and dupefilter.
+"""
+
+import os
+import time
+import pickle
+import socket
+import sqlite3
+import logging
+from collections import deque
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Scrapy is only needed for the scheduler class
+try:
+    from scrapy import signals
+    from scrapy.core.scheduler import BaseScheduler
+    from scrapy.utils.request import request_from_dict
+    SCRAPY_AVAILABLE = True
+except ImportError:
+    BaseScheduler = object
+    SCRAPY_AVAILABLE = False
+
+FRONTIER_FILENAME = "frontier.db"
+
+# Request states
+PENDING = 0
+LEASED = 1
+DONE = 2
+FAILED = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fingerprint TEXT NOT NULL UNIQUE,
+    url TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state INTEGER NOT NULL DEFAULT 0,
+    request BLOB NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    added REAL
+);
+CREATE INDEX IF NOT EXISTS idx_frontier_queue ON frontier(state, priority DESC, id);
+CREATE INDEX IF NOT EXISTS idx_frontier_lease ON frontier(state, lease_expires);
+CREATE TABLE IF NOT EXISTS frontier_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+) WITHOUT ROWID;
+"""
+
+
+def default_worker_id():
+    """Return an id unique to this process on this host."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class SharedFrontier:
+    """SQLite-backed queue and seen-set shared by the processes of one crawl."""
+
+    def __init__(self, db_path, worker_id=None, lease_seconds=600, max_attempts=3):
+        """
+        Open (or create) a shared frontier.
+
+        Args:
+            db_path: Path to the SQLite database file, on a filesystem all workers share
+            worker_id: Id this process leases requests under (default: host name and pid)
+            lease_seconds: Time after which a request leased by a worker that has
+                not reported it done is handed to another worker
+            max_attempts: Leases of a request after which it is given up
+        """
+        self.db_path = str(db_path)
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        # Autocommit mode: every write is its own short transaction, and lease()
+        # takes the write lock up front with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def reset_if_finished(self):
+        """
+        Clear a frontier whose crawl has finished, so the next crawl starts over.
+
+        Returns:
+            True if the frontier was cleared
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("SELECT value FROM frontier_state WHERE key = 'finished'").fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return False
+            self.conn.execute("DELETE FROM frontier")
+            self.conn.execute("DELETE FROM frontier_state")
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        logger.info(f"Cleared the shared frontier of the finished crawl in {self.db_path}")
+        return True
+
+    def mark_finished(self):
+        """Record that the crawl finished (no pending or leased requests were left)."""
+        self.conn.execute("INSERT OR REPLACE INTO frontier_state (key, value) VALUES ('finished', ?)",
+                          (str(time.time()),))
+
+    def add(self, fingerprint, url, request, priority=0):
+        """
+        Add a request unless one with the same fingerprint was ever added.
+
+        Args:
+            fingerprint: Request fingerprint (hex string)
+            url: Request URL, for inspection
+            request: Serialized request (bytes)
+            priority: Request priority (higher is leased first)
+
+        Returns:
+            True if the request was added, False if it was already seen
+        """
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO frontier (fingerprint, url, priority, request, added) VALUES (?, ?, ?, ?, ?)",
+            (fingerprint, url, priority, request, time.time())
+        )
+        return cursor.rowcount == 1
+
+    def lease(self, limit):
+        """
+        Lease up to `limit` pending requests to this worker, highest priority first.
+
+        Expired leases are reclaimed first; a request whose lease expired
+        max_attempts times is marked failed instead.
+
+        Returns:
+            List of (fingerprint, serialized request) tuples
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "UPDATE frontier SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, lease_owner = NULL "
+                "WHERE state = ? AND lease_expires < ?",
+                (self.max_attempts, FAILED, PENDING, LEASED, now)
+            )
+            # Select, then update: BEGIN IMMEDIATE holds the write lock in between,
+            # and UPDATE ... RETURNING needs SQLite 3.35, newer than some Pythons ship
+            rows = self.conn.execute(
+                "SELECT id, fingerprint, request FROM frontier WHERE state = ? ORDER BY priority DESC, id LIMIT ?",
+                (PENDING, limit)
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE frontier SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                ((LEASED, self.worker_id, now + self.lease_seconds, row[0]) for row in rows)
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return [(row[1], row[2]) for row in rows]
+
+    def complete(self, fingerprints):
+        """Mark requests leased by this worker as done."""
+        self.conn.executemany(
+            "UPDATE frontier SET state = ?, lease_owner = NULL WHERE fingerprint = ? AND lease_owner = ?",
+            ((DONE, fingerprint, self.worker_id) for fingerprint in fingerprints)
+        )
+
+    def release(self, fingerprints):
+        """Return requests leased by this worker to the queue without counting the attempt."""
+        self.conn.executemany(
+            "UPDATE frontier SET state = ?, lease_owner = NULL, attempts = MAX(attempts - 1, 0) "
+            "WHERE fingerprint = ? AND lease_owner = ? AND state = ?",
+            ((PENDING, fingerprint, self.worker_id, LEASED) for fingerprint in fingerprints)
+        )
+
+    def has_pending(self):
+        """
+        Return True if any request is pending or leased to another worker.
+
+        Requests leased to other workers count, since their pages may link to
+        more work; this worker's own leases are its caller's business.
+        """
+        row = self.conn.execute(
+            "SELECT 1 FROM frontier WHERE state = ? OR (state = ? AND (lease_owner != ? OR lease_expires < ?)) "
+            "LIMIT 1",
+            (PENDING, LEASED, self.worker_id, time.time())
+        ).fetchone()
+        return row is not None
+
+    def counts(self):
+        """Return the number of requests in each state."""
+        names = {PENDING: "pending", LEASED: "leased", DONE: "done", FAILED: "failed"}
+        counts = dict.fromkeys(names.values(), 0)
+        for state, count in self.conn.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state"):
+            counts[names.get(state, str(state))] = count
+        return counts
+
+    def close(self):
+        """Close the database."""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class SharedFrontierScheduler(BaseScheduler):
+    """
+    Scrapy scheduler that queues and deduplicates requests in a SharedFrontier.
+
+    Every request goes through the shared seen-set, so a URL found by several
+    workers is fetched once. Retries of a leased request (which reuse its
+    fingerprint) stay with the worker that leased it. A request is reported
+    done once it leaves the downloader; requests still leased when the spider
+    closes are handed back (buffered) or marked done (already handed out).
+
+    Settings:
+        SHARED_FRONTIER_PATH: Path to the frontier database (required)
+        SHARED_FRONTIER_WORKER_ID: Lease owner id (default: host name and pid)
+        SHARED_FRONTIER_BATCH_SIZE: Requests leased at a time (default 16)
+        SHARED_FRONTIER_LEASE_SECONDS: Lease duration (default 600)
+        SHARED_FRONTIER_MAX_ATTEMPTS: Leases before a request is given up (default 3)
+    """
+
+    def __init__(self, frontier, fingerprinter, batch_size=16, stats=None, crawler=None):
+        self.frontier = frontier
+        self.fingerprinter = fingerprinter
+        self.batch_size = batch_size
+        self.stats = stats
+        self.crawler = crawler
+        self.spider = None
+        self.buffer = deque()
+        self.local = deque()
+        self.in_flight = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        frontier = SharedFrontier(
+            settings.get('SHARED_FRONTIER_PATH'),
+            worker_id=settings.get('SHARED_FRONTIER_WORKER_ID'),
+            lease_seconds=settings.getfloat('SHARED_FRONTIER_LEASE_SECONDS', 600),
+            max_attempts=settings.getint('SHARED_FRONTIER_MAX_ATTEMPTS', 3)
+        )
+        scheduler = cls(frontier, crawler.request_fingerprinter,
+                        batch_size=settings.getint('SHARED_FRONTIER_BATCH_SIZE', 16),
+                        stats=crawler.stats, crawler=crawler)
+        crawler.signals.connect(scheduler.request_left_downloader, signal=signals.request_left_downloader)
+        return scheduler
+
+    def open(self, spider):
+        self.spider = spider
+        self.frontier.reset_if_finished()
+        logger.info(f"Shared frontier {self.frontier.db_path} opened by worker {self.frontier.worker_id}: "
+                    f"{self.frontier.counts()}")
+
+    def close(self, reason):
+        # Buffered requests go back to the queue; handed-out ones were handled
+        self.frontier.release(fingerprint for fingerprint, _ in self.buffer)
+        self.frontier.complete(self.in_flight)
+        self.buffer.clear()
+        self.in_flight.clear()
+        if reason == "finished" and not self.local and not self.frontier.has_pending():
+            self.frontier.mark_finished()
+        counts = self.frontier.counts()
+        if self.stats is not None:
+            for name, count in counts.items():
+                self.stats.set_value(f'vibe/frontier/{name}', count)
+        logger.info(f"Shared frontier closed ({reason}): {counts}")
+        self.frontier.close()
+
+    def __len__(self):
+        return len(self.buffer) + len(self.local)
+
+    def has_pending_requests(self):
+        return bool(self.buffer or self.local) or self.frontier.has_pending()
+
+    def enqueue_request(self, request):
+        fingerprint = self.fingerprinter.fingerprint(request).hex()
+        if request.meta.get('vibe_frontier_fp') == fingerprint:
+            # A retry of a request this worker leased
+            self.local.append(request)
+            return True
+
+        request.meta['vibe_frontier_fp'] = fingerprint
+        serialized = pickle.dumps(request.to_dict(spider=self.spider), protocol=4)
+        if not self.frontier.add(fingerprint, request.url, serialized, priority=request.priority):
+            if self.stats is not None:
+                self.stats.inc_value('dupefilter/filtered')
+            return False
+        if self.stats is not None:
+            self.stats.inc_value('vibe/frontier/requests_enqueued')
+        return True
+
+    def next_request(self):
+        if self.local:
+            return self.local.popleft()
+        if not self.buffer:
+            self.buffer.extend(self.frontier.lease(self.batch_size))
+            if not self.buffer:
+                return None
+            if self.stats is not None:
+                self.stats.inc_value('vibe/frontier/requests_leased', len(self.buffer))
+
+        fingerprint, serialized = self.buffer.popleft()
+        self.in_flight.add(fingerprint)
+        return request_from_dict(pickle.loads(serialized), spider=self.spider)
+
+    def request_left_downloader(self, request, spider):
+        """Report a leased request done once its download finished or failed."""
+        fingerprint = request.meta.get('vibe_frontier_fp')
+        if fingerprint in self.in_flight:
+            self.in_flight.discard(fingerprint)
+            self.frontier.complete([fingerprint])
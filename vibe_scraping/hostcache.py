@@ -0,0 +1,316 @@
+"""
+Per-host caches shared by the crawls on a host, for vibe-scraping.
+
+A crawl has to fetch robots.txt and resolve the name of every host before
+its first request to the host can go out. :class:`HostCache` keeps both
+results in a SQLite database (WAL mode) that every crawl process on the host
+opens, by default ``~/.cache/vibe-scraping/hostcache.db``:
+
+- robots.txt bodies, for as long as the response's Cache-Control or Expires
+  headers allow and at most ROBOTS_CACHE_SECONDS, used by
+  :class:`CachedRobotsTxtMiddleware` in place of Scrapy's
+  ``RobotsTxtMiddleware``. The body is stored rather than the parser, which
+  cannot be serialized; rebuilding a parser is cheap next to a fetch.
+- resolved host addresses, for DNS_CACHE_SECONDS, used by
+  :class:`PersistentCachingResolver` in place of Scrapy's caching resolver.
+
+Both also keep what they found in memory, so the crawls of a long-lived
+process (see :mod:`vibe_scraping.daemon`) read the database once per host.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Scrapy is only needed for the middleware and resolver classes
+try:
+    from scrapy.downloadermiddlewares.robotstxt import RobotsTxtMiddleware
+    from scrapy.resolver import CachingThreadedResolver
+    from scrapy.settings import default_settings
+    from scrapy.utils.httpobj import urlparse_cached
+    from twisted.internet import defer
+    SCRAPY_AVAILABLE = True
+    # Scrapy 2.13 renamed the setting of the reactor's resolver
+    RESOLVER_SETTING = 'TWISTED_DNS_RESOLVER' if hasattr(default_settings, 'TWISTED_DNS_RESOLVER') else 'DNS_RESOLVER'
+except ImportError:
+    RobotsTxtMiddleware = object
+    CachingThreadedResolver = object
+    SCRAPY_AVAILABLE = False
+    RESOLVER_SETTING = 'DNS_RESOLVER'
+
+HOST_CACHE_FILENAME = "hostcache.db"
+
+# Longest time a fetched robots.txt is reused, whatever its cache headers say
+ROBOTS_CACHE_SECONDS = 24 * 3600
+
+# Time a resolved address is reused (the system resolver does not report TTLs)
+DNS_CACHE_SECONDS = 600
+
+_MAX_AGE_RE = re.compile(r"max-age\s*=\s*(\d+)", re.IGNORECASE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS robots (
+    netloc TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    fetched REAL NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dns (
+    name TEXT PRIMARY KEY,
+    address TEXT NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Open caches by database path; a process opens each database once
+_caches = {}
+_caches_lock = threading.Lock()
+
+# netloc -> (expiry time, robots.txt body), for the crawls of this process
+_robots_bodies = {}
+
+# host name -> (expiry time, address), for the crawls of this process
+_addresses = {}
+
+
+def default_host_cache_path():
+    """Return the path of the host cache shared by the crawls of this user."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'vibe-scraping', HOST_CACHE_FILENAME)
+
+
+def open_host_cache(db_path):
+    """
+    Return the HostCache of a database, opening it the first time.
+
+    Returns:
+        HostCache, or None if db_path is None or the database cannot be opened
+    """
+    if not db_path:
+        return None
+    db_path = os.path.abspath(db_path)
+    with _caches_lock:
+        if db_path not in _caches:
+            try:
+                _caches[db_path] = HostCache(db_path)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"Could not open the host cache {db_path}: {e}")
+                _caches[db_path] = None
+        return _caches[db_path]
+
+
+def robots_ttl(response, max_seconds=ROBOTS_CACHE_SECONDS):
+    """
+    Return the number of seconds a robots.txt response may be reused.
+
+    Follows Cache-Control (no-store, no-cache, max-age) and Expires, up to
+    max_seconds. Server errors are not cached, so the next crawl asks again.
+    """
+    if response.status >= 500:
+        return 0
+    cache_control = (response.headers.get('Cache-Control') or b'').decode('latin-1')
+    if 'no-store' in cache_control.lower() or 'no-cache' in cache_control.lower():
+        return 0
+    match = _MAX_AGE_RE.search(cache_control)
+    if match:
+        return min(int(match.group(1)), max_seconds)
+    expires = response.headers.get('Expires')
+    if expires:
+        try:
+            expires_at = parsedate_to_datetime(expires.decode('latin-1')).timestamp()
+            date = response.headers.get('Date')
+            now = parsedate_to_datetime(date.decode('latin-1')).timestamp() if date else time.time()
+        except (TypeError, ValueError, IndexError):
+            # An invalid Expires means already expired
+            return 0
+        return max(0, min(int(expires_at - now), max_seconds))
+    return max_seconds
+
+
+class HostCache:
+    """SQLite store of robots.txt bodies and resolved addresses, shared by processes."""
+
+    def __init__(self, db_path):
+        """
+        Open (or create) a host cache.
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = str(db_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        # Autocommit mode: every write is its own short transaction. The
+        # connection is used by the reactor thread of whichever thread runs it
+        self.conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def get_robots(self, netloc):
+        """
+        Return a cached robots.txt.
+
+        Returns:
+            Tuple of (expiry time, body), or None if it is not cached or expired
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT expires, body FROM robots WHERE netloc = ? AND expires > ?",
+                                    (netloc, time.time())).fetchone()
+        return (row[0], bytes(row[1])) if row else None
+
+    def put_robots(self, netloc, body, ttl):
+        """Cache a robots.txt body for ttl seconds."""
+        now = time.time()
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO robots (netloc, body, fetched, expires) VALUES (?, ?, ?, ?)",
+                              (netloc, body, now, now + ttl))
+
+    def dns_entries(self):
+        """Return {host name: (expiry time, address)} of the unexpired addresses."""
+        with self._lock:
+            rows = self.conn.execute("SELECT name, expires, address FROM dns WHERE expires > ?",
+                                     (time.time(),)).fetchall()
+        return {name: (expires, address) for name, expires, address in rows}
+
+    def put_address(self, name, address, ttl):
+        """Cache the address of a host name for ttl seconds."""
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO dns (name, address, expires) VALUES (?, ?, ?)",
+                              (name, address, time.time() + ttl))
+
+    def prune(self):
+        """Delete expired entries."""
+        now = time.time()
+        with self._lock:
+            self.conn.execute("DELETE FROM robots WHERE expires <= ?", (now,))
+            self.conn.execute("DELETE FROM dns WHERE expires <= ?", (now,))
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class CachedRobotsTxtMiddleware(RobotsTxtMiddleware):
+    """
+    RobotsTxtMiddleware that reuses robots.txt files fetched by earlier crawls.
+
+    Bodies are kept in memory for the crawls of this process and, with the
+    HOST_CACHE_PATH setting, in the host cache for every crawl on the host,
+    for as long as their cache headers allow (see robots_ttl). Each crawl
+    builds its own parser from them, so no parser holds on to the spider of a
+    finished crawl.
+
+    Works with the synchronous parent of Scrapy 2.12 and earlier, whose
+    methods also take the spider, and the async one of Scrapy 2.13+: the
+    overrides pass their extra arguments on and return whatever the parent
+    returns (a parser, Deferred or coroutine).
+
+    Settings:
+        HOST_CACHE_PATH: Host cache database (None keeps the bodies in memory only)
+        ROBOTS_CACHE_SECONDS: Longest time a body is reused (default ROBOTS_CACHE_SECONDS)
+    """
+
+    def __init__(self, crawler):
+        super().__init__(crawler)
+        self.stats = crawler.stats
+        self.host_cache = open_host_cache(crawler.settings.get('HOST_CACHE_PATH'))
+        self.max_seconds = crawler.settings.getint('ROBOTS_CACHE_SECONDS', ROBOTS_CACHE_SECONDS)
+
+    def _cached_body(self, netloc):
+        cached = _robots_bodies.get(netloc)
+        if cached is not None and cached[0] > time.time():
+            return cached[1]
+        if self.host_cache is not None:
+            try:
+                cached = self.host_cache.get_robots(netloc)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read the host cache: {e}")
+                cached = None
+            if cached is not None:
+                _robots_bodies[netloc] = cached
+                self.stats.inc_value('vibe/robotstxt/host_cache_hits')
+                return cached[1]
+        return None
+
+    def robot_parser(self, request, *args):
+        # args is (spider,) before Scrapy 2.13
+        netloc = urlparse_cached(request).netloc
+        if netloc not in self._parsers:
+            body = self._cached_body(netloc)
+            if body is not None:
+                self._parsers[netloc] = self._parserimpl.from_crawler(self.crawler, body)
+                self.stats.inc_value('vibe/robotstxt/cache_hits')
+        return super().robot_parser(request, *args)
+
+    def _parse_robots(self, response, netloc, *args):
+        # args is (spider,) before Scrapy 2.13 and (request,) since
+        ttl = robots_ttl(response, self.max_seconds)
+        if ttl > 0:
+            _robots_bodies[netloc] = (time.time() + ttl, response.body)
+            if self.host_cache is not None:
+                try:
+                    self.host_cache.put_robots(netloc, response.body, ttl)
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not write the host cache: {e}")
+        return super()._parse_robots(response, netloc, *args)
+
+
+class PersistentCachingResolver(CachingThreadedResolver):
+    """
+    Scrapy's caching DNS resolver, with the addresses kept in the host cache.
+
+    A run starts with the addresses earlier runs resolved in the last
+    DNS_CACHE_SECONDS, so its first requests do not wait for DNS. Addresses
+    expire after DNS_CACHE_SECONDS, also in long-lived processes.
+
+    Settings:
+        HOST_CACHE_PATH: Host cache database (None keeps the addresses in memory only)
+        DNS_CACHE_SECONDS: Time an address is reused (default DNS_CACHE_SECONDS)
+    """
+
+    def __init__(self, reactor, cache_size, timeout, host_cache=None, ttl=DNS_CACHE_SECONDS):
+        super().__init__(reactor, cache_size, timeout)
+        self.host_cache = host_cache
+        self.ttl = ttl
+        if host_cache is not None:
+            try:
+                host_cache.prune()
+                _addresses.update(host_cache.dns_entries())
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read the host cache: {e}")
+
+    @classmethod
+    def from_crawler(cls, crawler, reactor):
+        settings = crawler.settings
+        enabled = settings.getbool('DNSCACHE_ENABLED')
+        return cls(reactor, settings.getint('DNSCACHE_SIZE') if enabled else 0, settings.getfloat('DNS_TIMEOUT'),
+                   host_cache=open_host_cache(settings.get('HOST_CACHE_PATH')) if enabled else None,
+                   ttl=settings.getint('DNS_CACHE_SECONDS', DNS_CACHE_SECONDS) if enabled else 0)
+
+    def getHostByName(self, name, timeout=()):
+        cached = _addresses.get(name)
+        if cached is not None and cached[0] > time.time():
+            return defer.succeed(cached[1])
+        # Skip Scrapy's cache, whose entries never expire
+        d = super(CachingThreadedResolver, self).getHostByName(name, (self.timeout,))
+        if self.ttl > 0:
+            d.addCallback(self._cache_address, name)
+        return d
+
+    def _cache_address(self, address, name):
+        _addresses[name] = (time.time() + self.ttl, address)
+        if self.host_cache is not None:
+            try:
+                self.host_cache.put_address(name, address, self.ttl)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not write the host cache: {e}")
+        return address
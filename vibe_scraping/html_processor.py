@@ -12,35 +12,103 @@ from collections import Counter
 import logging
 from typing import Callable, Dict, List, Any, Optional
 
+from vibe_scraping.journal import load_crawl_metadata
+from vibe_scraping.crawl_index import open_crawl_index
+from vibe_scraping.page_store import DirectoryPageStore, decode_body, open_page_store
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class HTMLProcessor:
     """Processor for extracting and processing text from crawled HTML files."""
     
-    def __init__(self, crawl_data_path="./data/crawl_data"):
+    def __init__(self, crawl_data_path="./data/crawl_data", skip_unchanged=True):
         """
         Initialize the processor.
         
+        Only the pages of the last crawl run are processed; the crawl index of
+        an incremental crawl also holds the pages of earlier runs.
+        
         Args:
             crawl_data_path: Path to the directory containing crawled data and metadata.json
+            skip_unchanged: Skip pages an incremental crawl found unchanged (HTTP 304);
+                they were processed with the run that fetched them
         """
         self.crawl_data_path = Path(crawl_data_path)
+        self.skip_unchanged = skip_unchanged
         self.metadata_path = self.crawl_data_path / "metadata.json"
         self.metadata = None
         self.results = {}
+        self.page_store = None
+        # Text extracted per content hash, so identical bodies are parsed once
+        self._text_cache = {}
         
     def load_metadata(self):
-        """Load the metadata.json file."""
-        if not self.metadata_path.exists():
+        """Load the metadata.json file and/or the crawl journal."""
+        logger.info(f"Loading metadata from {self.crawl_data_path}")
+        metadata = load_crawl_metadata(self.crawl_data_path)
+        if metadata is None:
             raise FileNotFoundError(f"Metadata file not found at {self.metadata_path}")
         
-        logger.info(f"Loading metadata from {self.metadata_path}")
-        with open(self.metadata_path, 'r', encoding='utf-8') as f:
-            self.metadata = json.load(f)
-        
+        self.metadata = metadata
         return self.metadata
     
+    def iter_crawled_pages(self, urls=None):
+        """
+        Iterate over crawled pages as (url, hash_value) pairs.
+        
+        Uses the SQLite crawl index when the crawl directory has one, so pages
+        are streamed in constant memory; falls back to metadata.json otherwise.
+        Only pages of the last crawl run are included.
+        
+        Args:
+            urls: URLs to look up (if None, iterates over all crawled pages)
+            
+        Yields:
+            Tuples of (url, hash_value); hash_value is None if the page has no hash
+        """
+        index = open_crawl_index(self.crawl_data_path)
+        if index is not None:
+            try:
+                if urls is None:
+                    last_run = index.last_run()
+                    for page in index.iter_pages(run_id=last_run["id"] if last_run else None):
+                        if not (self.skip_unchanged and page["not_modified"]):
+                            yield page["url"], page["hash"]
+                else:
+                    # Only include URLs that exist in our crawled data
+                    for url in urls:
+                        page = index.get_page(url)
+                        if page:
+                            yield url, page["hash"]
+            finally:
+                index.close()
+            return
+        
+        if not self.metadata:
+            self.load_metadata()
+        
+        crawled_urls = self.metadata.get("crawled_urls", {})
+        for url in (crawled_urls if urls is None else urls):
+            if url in crawled_urls:
+                if self.skip_unchanged and crawled_urls[url].get("not_modified"):
+                    continue
+                yield url, crawled_urls[url].get("hash")
+    
+    def count_crawled_pages(self):
+        """Return the number of pages of the last crawl run without loading metadata.json if an index exists."""
+        index = open_crawl_index(self.crawl_data_path)
+        if index is not None:
+            try:
+                last_run = index.last_run()
+                return index.count_pages(run_id=last_run["id"] if last_run else None)
+            finally:
+                index.close()
+        
+        if not self.metadata:
+            self.load_metadata()
+        return len(self.metadata.get("crawled_urls", {}))
+    
     def extract_text_from_html(self, html_content):
         """
         Extract readable text from HTML content.
@@ -65,40 +133,45 @@ class HTMLProcessor:
         
         return text
     
-    def get_page_content(self, url, hash_value):
+    def get_page_content(self, url, hash_value, parse=True):
         """
         Get raw HTML content and metadata for a page.
         
         Args:
             url: The URL of the page
             hash_value: The hash directory name containing the page data
+            parse: Whether to build the BeautifulSoup tree ("soup" is None otherwise)
             
         Returns:
             Dictionary with page content and metadata
         """
-        page_dir = self.crawl_data_path / hash_value
-        html_path = page_dir / "page.html"
-        page_metadata_path = page_dir / "metadata.json"
-        
-        if not html_path.exists():
-            logger.warning(f"HTML file not found for {url} at {html_path}")
+        page = self._read_page(hash_value)
+        if page is None:
+            logger.warning(f"HTML file not found for {url} at {self.crawl_data_path / hash_value}")
             return None
         
-        # Load page metadata
-        with open(page_metadata_path, 'r', encoding='utf-8') as f:
-            page_metadata = json.load(f)
-        
-        # Load HTML
-        with open(html_path, 'r', encoding='utf-8', errors='replace') as f:
-            html_content = f.read()
+        # Decode with the encoding detected at crawl time
+        body, page_metadata = page
+        html_content = decode_body(body, page_metadata.get("encoding"))
         
         return {
             "url": url,
             "html_content": html_content,
             "metadata": page_metadata,
-            "soup": BeautifulSoup(html_content, 'html.parser')
+            "soup": BeautifulSoup(html_content, 'html.parser') if parse else None
         }
     
+    def _read_page(self, hash_value):
+        """Read a page body and its metadata from the segment or directory layout."""
+        if self.page_store is None:
+            self.page_store = open_page_store(self.crawl_data_path)
+        
+        page = self.page_store.read_page(hash_value)
+        if page is None and not isinstance(self.page_store, DirectoryPageStore):
+            # Pages from earlier directory-layout crawls may live next to the segments
+            page = DirectoryPageStore(self.crawl_data_path).read_page(hash_value)
+        return page
+    
     def process_page(self, url, hash_value):
         """
         Process a single page from the crawl data using the default processor.
@@ -110,12 +183,23 @@ class HTMLProcessor:
         Returns:
             Dictionary with processing results for the page
         """
-        page_data = self.get_page_content(url, hash_value)
-        if not page_data:
+        page = self._read_page(hash_value)
+        if page is None:
+            logger.warning(f"HTML file not found for {url} at {self.crawl_data_path / hash_value}")
             return None
-        
-        # Extract text
-        text = self.extract_text_from_html(page_data["html_content"])
+        body, page_metadata = page
+        
+        # Extract text, reusing the fields extracted at crawl time (--extract-fields)
+        # or the result for bodies already seen under another URL
+        extracted = page_metadata.get("extracted") or {}
+        content_hash = page_metadata.get("content_hash")
+        text = extracted.get("text")
+        if text is None and content_hash:
+            text = self._text_cache.get(content_hash)
+        if text is None:
+            text = self.extract_text_from_html(decode_body(body, page_metadata.get("encoding")))
+            if content_hash:
+                self._text_cache[content_hash] = text
         
         # Basic processing
         word_count = len(text.split())
@@ -127,50 +211,53 @@ class HTMLProcessor:
             "text_length": len(text),
             "word_count": word_count,
             "char_count": char_count,
-            "crawl_depth": page_data["metadata"].get("depth", 0),
+            "crawl_depth": page_metadata.get("depth", 0),
             "extracted_text": text
         }
+        for field in ("title", "description", "canonical", "published", "og"):
+            if field in extracted:
+                result[field] = extracted[field]
         
         return result
     
-    def apply_custom_processor(self, processor_func: Callable, urls: Optional[List[str]] = None) -> Dict[str, Any]:
+    def apply_custom_processor(self, processor_func: Callable, urls: Optional[List[str]] = None,
+                               skip_duplicates: bool = False) -> Dict[str, Any]:
         """
         Apply a custom processor function to selected URLs or all URLs.
         
         Args:
             processor_func: A function that takes (url, html_content, soup, metadata) and returns a result
             urls: List of URLs to process (if None, processes all URLs)
+            skip_duplicates: Reuse the result of the first URL with an identical body
+                instead of calling processor_func again
             
         Returns:
             Dictionary mapping URLs to their processing results
         """
-        if not self.metadata:
-            self.load_metadata()
-        
-        crawled_urls = self.metadata.get("crawled_urls", {})
-        if urls is None:
-            urls_to_process = list(crawled_urls.keys())
-        else:
-            # Filter to only include URLs that exist in our crawled data
-            urls_to_process = [url for url in urls if url in crawled_urls]
-        
-        total_urls = len(urls_to_process)
+        total_urls = self.count_crawled_pages() if urls is None else len(urls)
         logger.info(f"Starting custom processing of {total_urls} URLs")
         
         results = {}
-        for i, url in enumerate(urls_to_process):
+        results_by_content = {}
+        for i, (url, hash_value) in enumerate(self.iter_crawled_pages(urls)):
             if i % 10 == 0:
                 logger.info(f"Processing URL {i+1}/{total_urls}")
             
-            hash_value = crawled_urls[url].get("hash")
             if not hash_value:
                 logger.warning(f"No hash found for URL: {url}")
                 continue
             
-            page_data = self.get_page_content(url, hash_value)
+            page_data = self.get_page_content(url, hash_value, parse=not skip_duplicates)
             if not page_data:
                 continue
             
+            content_hash = page_data["metadata"].get("content_hash")
+            if skip_duplicates:
+                if content_hash in results_by_content:
+                    results[url] = results_by_content[content_hash]
+                    continue
+                page_data["soup"] = BeautifulSoup(page_data["html_content"], 'html.parser')
+            
             try:
                 # Apply the custom processor function
                 result = processor_func(
@@ -180,6 +267,8 @@ class HTMLProcessor:
                     metadata=page_data["metadata"]
                 )
                 results[url] = result
+                if skip_duplicates and content_hash:
+                    results_by_content[content_hash] = result
             except Exception as e:
                 logger.error(f"Error processing URL {url}: {str(e)}")
                 continue
@@ -201,7 +290,7 @@ class HTMLProcessor:
         # Default statistics if results have standard fields
         stats = {
             "total_pages_processed": len(self.results),
-            "crawl_date": self.metadata.get("last_crawl", "Unknown") if self.metadata else "Unknown"
+            "crawl_date": self._get_crawl_date()
         }
         
         # Try to extract common fields if they exist in results
@@ -219,6 +308,21 @@ class HTMLProcessor:
         
         return stats
     
+    def _get_crawl_date(self):
+        """Return the date of the last crawl from the metadata or the crawl index."""
+        if self.metadata:
+            return self.metadata.get("last_crawl", "Unknown")
+        
+        index = open_crawl_index(self.crawl_data_path)
+        if index is not None:
+            try:
+                run = index.last_run()
+            finally:
+                index.close()
+            if run and run.get("end_time"):
+                return run["end_time"]
+        return "Unknown"
+    
     def save_results(self, output_path="./process_results.json"):
         """
         Save processing results to a JSON file.
@@ -245,7 +349,8 @@ class HTMLProcessor:
 
 def process_html_content(crawl_data_path="./data/crawl_data", 
                          output_path="./data/process/process_results.json",
-                         processor_func=None):
+                         processor_func=None,
+                         skip_unchanged=True):
     """
     Convenience function to process crawled data.
     
@@ -253,24 +358,21 @@ def process_html_content(crawl_data_path="./data/crawl_data",
         crawl_data_path: Path to the crawled data directory
         output_path: Path to save the processing results
         processor_func: Custom processor function (if None, uses default processor)
+        skip_unchanged: Skip pages an incremental crawl found unchanged (HTTP 304);
+            pass False to process every page of the last run
         
     Returns:
         Dictionary with processing statistics
     """
-    processor = HTMLProcessor(crawl_data_path)
-    processor.load_metadata()
+    processor = HTMLProcessor(crawl_data_path, skip_unchanged=skip_unchanged)
     
     if processor_func:
         # Apply custom processor
         processor.apply_custom_processor(processor_func)
     else:
-        # Use default processor
-        metadata = processor.metadata
-        crawled_urls = metadata.get("crawled_urls", {})
-        
+        # Use default processor, streaming pages from the crawl index if available
         results = {}
-        for url, data in crawled_urls.items():
-            hash_value = data.get("hash")
+        for url, hash_value in processor.iter_crawled_pages():
             if not hash_value:
                 continue
                 
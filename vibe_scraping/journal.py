@@ -0,0 +1,164 @@
+"""
+Append-only crawl journal for vibe-scraping.
+
+The spider appends one JSON line per crawled page to ``crawl_journal.jsonl``
+instead of rewriting the whole ``metadata.json`` after every page. When the
+crawl closes the journal is compacted into the usual ``metadata.json`` layout.
+Readers use :func:`load_crawl_metadata`, which understands both formats and
+also recovers pages from a journal left behind by an interrupted crawl.
+"""
+
+import os
+import json
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+METADATA_FILENAME = "metadata.json"
+JOURNAL_FILENAME = "crawl_journal.jsonl"
+
+
+class CrawlJournal:
+    """Line-delimited journal with one entry per crawled page."""
+
+    def __init__(self, save_path):
+        """
+        Initialize the journal.
+
+        Args:
+            save_path: Crawl output directory holding the journal and metadata.json
+        """
+        self.save_path = save_path
+        self.path = os.path.join(save_path, JOURNAL_FILENAME)
+        self.metadata_file = os.path.join(save_path, METADATA_FILENAME)
+        self._file = None
+
+    def append(self, url, entry):
+        """
+        Append a page entry to the journal.
+
+        Args:
+            url: URL of the crawled page
+            entry: Dictionary with the page's crawled_urls entry
+        """
+        if self._file is None:
+            needs_newline = False
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                # Terminate a truncated last line left by an interrupted crawl
+                with open(self.path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    needs_newline = f.read(1) != b"\n"
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if needs_newline:
+                self._file.write("\n")
+
+        record = dict(entry)
+        record["url"] = url
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # Flush to the OS so a killed process loses at most the current line
+        self._file.flush()
+
+    def sync(self):
+        """Force journal lines written so far to disk."""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """Close the journal file handle."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def compact(self, metadata):
+        """
+        Write the full metadata to metadata.json and drop the journal.
+
+        The metadata file is replaced atomically, so readers never observe a
+        partially written file.
+
+        Args:
+            metadata: Complete metadata dictionary (including crawled_urls)
+        """
+        self.close()
+
+        tmp_file = self.metadata_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_file, self.metadata_file)
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def remove(self):
+        """Delete both the journal and the compacted metadata file."""
+        self.close()
+        for path in (self.path, self.metadata_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def read_journal(journal_path):
+    """
+    Iterate over the entries of a crawl journal.
+
+    A truncated trailing line (from a crawl killed mid-write) is skipped.
+
+    Args:
+        journal_path: Path to a crawl_journal.jsonl file
+
+    Yields:
+        Tuples of (url, entry)
+    """
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"Skipping malformed journal line {line_number} in {journal_path}")
+                continue
+            url = record.pop("url", None)
+            if url:
+                yield url, record
+
+
+def load_crawl_metadata(crawl_data_path):
+    """
+    Load crawl metadata from metadata.json, the crawl journal, or both.
+
+    Entries in the journal are newer than the compacted metadata and take
+    precedence over it.
+
+    Args:
+        crawl_data_path: Path to the crawl data directory
+
+    Returns:
+        Metadata dictionary, or None if neither file exists
+    """
+    metadata_file = os.path.join(crawl_data_path, METADATA_FILENAME)
+    journal_file = os.path.join(crawl_data_path, JOURNAL_FILENAME)
+
+    if not os.path.exists(metadata_file) and not os.path.exists(journal_file):
+        return None
+
+    metadata = {}
+    if os.path.exists(metadata_file):
+        with open(metadata_file, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+
+    metadata.setdefault("last_crawl", None)
+    metadata.setdefault("crawled_urls", {})
+    metadata.setdefault("start_urls", [])
+
+    if os.path.exists(journal_file):
+        crawled_urls = metadata["crawled_urls"]
+        for url, entry in read_journal(journal_file):
+            crawled_urls[url] = entry
+            metadata["last_crawl"] = entry.get("last_visit", metadata["last_crawl"])
+
+    metadata["pages_crawled"] = len(metadata["crawled_urls"])
+    return metadata
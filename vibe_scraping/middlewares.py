@@ -0,0 +1,300 @@
+"""
+Scrapy downloader middlewares for vibe-scraping.
+"""
+
+import time
+import logging
+
+from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured, StopDownload
+from twisted.internet.defer import CancelledError
+
+try:
+    from scrapy.exceptions import DownloadCancelledError
+except ImportError:
+    # Older Scrapy versions pass the CancelledError itself
+    DownloadCancelledError = CancelledError
+
+from vibe_scraping.throttle import ThrottleController
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Media types saved as pages
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+# Largest body downloaded per media type ('*': any other allowed type)
+DEFAULT_MAX_BODY_SIZES = {'*': 10 * 1024 * 1024}
+
+
+class ConditionalRequestMiddleware:
+    """
+    Turn requests for previously crawled pages into conditional GETs.
+
+    The spider's ``validators`` dictionary (url -> (etag, last_modified), loaded
+    from the crawl index of earlier runs) supplies the If-None-Match and
+    If-Modified-Since headers. A server that answers 304 Not Modified sends no
+    body, and the spider records the page as unchanged.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_request(self, request, spider=None):
+        validators = getattr(self.crawler.spider, 'validators', None)
+        if not validators or request.method != 'GET' or request.meta.get('dont_conditional_get'):
+            return None
+
+        # Pages are indexed by their canonical URL; requests keep the link's URL
+        canonicalizer = getattr(self.crawler.spider, 'canonicalizer', None)
+        entry = validators.get(canonicalizer.canonicalize(request.url) if canonicalizer else request.url)
+        if entry is None:
+            return None
+
+        etag, last_modified = entry
+        if etag:
+            request.headers.setdefault('If-None-Match', etag)
+        if last_modified:
+            request.headers.setdefault('If-Modified-Since', last_modified)
+        self.stats.inc_value('vibe/conditional_get/requests')
+        return None
+
+    def process_response(self, request, response, spider=None):
+        if response.status == 304:
+            self.stats.inc_value('vibe/conditional_get/not_modified')
+        return response
+
+
+class AdaptiveThrottleMiddleware:
+    """
+    Adjust each host's concurrency and download delay from its responses.
+
+    Scrapy keeps one downloader slot per host; this middleware feeds every
+    response, error and 429/503 into a ThrottleController and writes the
+    resulting concurrency and delay back into the host's slot. Sits after
+    RetryMiddleware (closer to the downloader) so it sees every attempt.
+
+    Settings:
+        ADAPTIVE_THROTTLE_ENABLED: Enable the middleware (default False)
+        ADAPTIVE_THROTTLE_START_CONCURRENCY: Concurrency of new hosts (default 4)
+        ADAPTIVE_THROTTLE_MIN_CONCURRENCY / _MAX_CONCURRENCY: Concurrency floor and ceiling (1 / 16)
+        ADAPTIVE_THROTTLE_MIN_DELAY / _MAX_DELAY: Delay floor and ceiling in seconds (0 / 60)
+        ADAPTIVE_THROTTLE_LATENCY_FACTOR: Latency multiple of the baseline treated as congestion (3)
+        ADAPTIVE_THROTTLE_ERROR_THRESHOLD: Error rate that triggers a backoff (0.2)
+        ADAPTIVE_THROTTLE_HOST_LIMITS: Per-domain overrides of the floors and ceilings
+        ADAPTIVE_THROTTLE_STATE_PATH: JSON file the host state is kept in between runs
+    """
+
+    BACKOFF_STATUSES = (429, 503)
+
+    def __init__(self, crawler, controller):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.controller = controller
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_THROTTLE_ENABLED'):
+            raise NotConfigured
+        controller = ThrottleController(
+            start_concurrency=settings.getint('ADAPTIVE_THROTTLE_START_CONCURRENCY', 4),
+            start_delay=settings.getfloat('DOWNLOAD_DELAY', 0.0),
+            min_concurrency=settings.getint('ADAPTIVE_THROTTLE_MIN_CONCURRENCY', 1),
+            max_concurrency=settings.getint('ADAPTIVE_THROTTLE_MAX_CONCURRENCY', 16),
+            min_delay=settings.getfloat('ADAPTIVE_THROTTLE_MIN_DELAY', 0.0),
+            max_delay=settings.getfloat('ADAPTIVE_THROTTLE_MAX_DELAY', 60.0),
+            latency_factor=settings.getfloat('ADAPTIVE_THROTTLE_LATENCY_FACTOR', 3.0),
+            error_threshold=settings.getfloat('ADAPTIVE_THROTTLE_ERROR_THRESHOLD', 0.2),
+            host_limits=settings.getdict('ADAPTIVE_THROTTLE_HOST_LIMITS'),
+            state_path=settings.get('ADAPTIVE_THROTTLE_STATE_PATH')
+        )
+        middleware = cls(crawler, controller)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(middleware.request_reached_downloader, signal=signals.request_reached_downloader)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.controller.load()
+        # The spider reports the per-host summary in its crawl stats
+        spider.throttle_controller = self.controller
+
+    def spider_closed(self, spider, reason):
+        try:
+            self.controller.save()
+        except OSError as e:
+            logger.warning(f"Could not save throttle state: {e}")
+
+    def _slot(self, request):
+        key = request.meta.get('download_slot')
+        slot = self.crawler.engine.downloader.slots.get(key) if key is not None else None
+        return key, slot
+
+    def _apply(self, request, host):
+        _, slot = self._slot(request)
+        if slot is not None:
+            slot.concurrency = host.concurrency
+            slot.delay = host.delay
+
+    def request_reached_downloader(self, request, spider=None):
+        # New (or garbage-collected and recreated) slots start at the downloader defaults
+        key = request.meta.get('download_slot')
+        if key is not None:
+            self._apply(request, self.controller.host(key))
+        request.meta['vibe_throttle_sent'] = time.monotonic()
+
+    def process_response(self, request, response, spider=None):
+        key = request.meta.get('download_slot')
+        if key is None:
+            return response
+        host = self.controller.host(key)
+        sent_at = request.meta.get('vibe_throttle_sent', float('-inf'))
+        now = time.monotonic()
+
+        if response.status in self.BACKOFF_STATUSES:
+            changed = host.on_backoff(sent_at, now, retry_after=self._retry_after(response))
+            self.stats.inc_value('vibe/throttle/backoffs')
+        elif response.status >= 500:
+            changed = host.on_error(sent_at, now)
+        else:
+            changed = host.on_success(request.meta.get('download_latency'), sent_at, now)
+
+        if changed:
+            self._apply(request, host)
+            logger.debug(f"Throttle {key}: concurrency {host.concurrency}, delay {host.delay:.2f}s")
+        return response
+
+    def process_exception(self, request, exception, spider=None):
+        key = request.meta.get('download_slot')
+        if key is None or isinstance(exception, IgnoreRequest):
+            return None
+        host = self.controller.host(key)
+        if host.on_error(request.meta.get('vibe_throttle_sent', float('-inf')), time.monotonic()):
+            self._apply(request, host)
+        self.stats.inc_value('vibe/throttle/errors')
+        return None
+
+    @staticmethod
+    def _retry_after(response):
+        """Return the Retry-After header in seconds (delta form only), or None."""
+        value = response.headers.get('Retry-After')
+        try:
+            return float(value.decode('latin-1')) if value else None
+        except ValueError:
+            return None
+
+
+class ContentGateMiddleware:
+    """
+    Stop downloading responses that are not pages, or too large, once their headers arrive.
+
+    The headers_received signal shows the Content-Type and Content-Length
+    before the body is downloaded. A response whose media type is not allowed,
+    or whose announced length is over the limit for its type, is dropped
+    there; bodies of unknown length are capped with the request's
+    download_maxsize. Dropped responses never reach the spider. Each skipped
+    URL is recorded with its reason, and the bytes not downloaded are counted
+    where the length was announced.
+
+    robots.txt, sitemap and feed requests, and requests with the
+    ``dont_gate`` meta key, are not gated.
+
+    Settings:
+        CONTENT_GATE_ENABLED: Enable the middleware (default False)
+        CONTENT_GATE_TYPES: Media types that are downloaded (default HTML_CONTENT_TYPES);
+            responses without a Content-Type are downloaded
+        CONTENT_GATE_MAX_SIZES: Largest body in bytes per media type, '*' for the
+            others (default DEFAULT_MAX_BODY_SIZES)
+    """
+
+    def __init__(self, crawler, content_types=HTML_CONTENT_TYPES, max_sizes=None):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.content_types = frozenset(content_type.lower() for content_type in content_types)
+        self.max_sizes = {content_type.lower(): size
+                          for content_type, size in (max_sizes or DEFAULT_MAX_BODY_SIZES).items()}
+        # url -> {'reason', 'content_type', 'content_length'}
+        self.skipped = {}
+        self.bytes_saved = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('CONTENT_GATE_ENABLED'):
+            raise NotConfigured
+        middleware = cls(crawler,
+                         content_types=settings.getlist('CONTENT_GATE_TYPES') or HTML_CONTENT_TYPES,
+                         max_sizes=settings.getdict('CONTENT_GATE_MAX_SIZES') or DEFAULT_MAX_BODY_SIZES)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.headers_received, signal=signals.headers_received)
+        return middleware
+
+    def spider_opened(self, spider):
+        # The spider reports the skipped URLs and the summary in its metadata
+        spider.content_gate = self
+
+    @staticmethod
+    def _exempt(request):
+        meta = request.meta
+        return bool(meta.get('dont_gate') or meta.get('dont_obey_robotstxt') or meta.get('vibe_seed_document'))
+
+    def headers_received(self, headers, body_length, request, spider=None):
+        if self._exempt(request):
+            return
+        value = headers.get('Content-Type')
+        content_type = value.decode('latin-1').split(';', 1)[0].strip().lower() if value else None
+        # Twisted passes a marker object when the length was not announced
+        length = body_length if isinstance(body_length, int) else None
+
+        if content_type and content_type not in self.content_types:
+            self._skip(request, 'content_type', content_type, length)
+            raise StopDownload(fail=True)
+
+        max_size = self.max_sizes.get(content_type, self.max_sizes.get('*'))
+        if not max_size:
+            return
+        if length is not None and length > max_size:
+            self._skip(request, 'too_large', content_type, length)
+            raise StopDownload(fail=True)
+        # Scrapy cancels the download once the body passes the limit
+        request.meta['download_maxsize'] = max_size
+        request.meta['vibe_gate_content_type'] = content_type
+
+    def process_exception(self, request, exception, spider=None):
+        if isinstance(exception, StopDownload) and request.url in self.skipped:
+            raise IgnoreRequest(f"Skipped {request.url}: {self.skipped[request.url]['reason']}")
+        if isinstance(exception, (CancelledError, DownloadCancelledError)) and 'vibe_gate_content_type' in request.meta:
+            # A body of unknown length passed download_maxsize
+            self._skip(request, 'too_large', request.meta['vibe_gate_content_type'], None)
+            raise IgnoreRequest(f"Skipped {request.url}: too_large")
+        return None
+
+    def _skip(self, request, reason, content_type, length):
+        self.skipped[request.url] = {
+            'reason': reason,
+            'content_type': content_type,
+            'content_length': length,
+        }
+        self.stats.inc_value(f'vibe/content_gate/{reason}')
+        if length:
+            self.bytes_saved += length
+            self.stats.inc_value('vibe/content_gate/bytes_saved', length)
+        logger.info(f"Skipped {request.url}: {reason} ({content_type}, "
+                    f"{length if length is not None else 'unknown'} bytes)")
+
+    def summary(self):
+        """Return the number of skipped responses per reason and the bytes not downloaded."""
+        reasons = {}
+        for entry in self.skipped.values():
+            reasons[entry['reason']] = reasons.get(entry['reason'], 0) + 1
+        return {
+            'skipped': len(self.skipped),
+            'reasons': reasons,
+            'bytes_saved': self.bytes_saved,
+        }
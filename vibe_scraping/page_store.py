@@ -0,0 +1,515 @@
+"""
+Page storage backends for vibe-scraping.
+
+Two layouts are supported:
+
+- ``directory`` (default): one ``<md5(url)>/page.html`` plus ``metadata.json``
+  per crawled page.
+- ``segments``: pages are appended to rolling segment files under
+  ``segments/`` with an append-only offset index, which keeps the file and
+  inode count small for large crawls and allows fast sequential scans.
+
+Fields extracted at crawl time (``page_metadata["extracted"]``) are written
+to ``extracted.json`` next to the page in the directory layout and kept in
+the record header in the segment layout; reads return them under the same
+key.
+
+Both layouts can also store bodies by content hash, so identical HTML served
+under many URLs is kept once (``deduplicate=True``); in the directory layout
+shared bodies live under ``blobs/``.
+
+Both layouts can compress page bodies (see :mod:`vibe_scraping.compression`);
+the codec is recorded in the page metadata and bodies are decompressed
+transparently on read. Use :func:`open_page_store` to read pages from either
+layout.
+"""
+
+import os
+import json
+import codecs
+import shutil
+import struct
+import hashlib
+import logging
+
+from vibe_scraping.compression import (
+    FILE_EXTENSIONS, check_codec, codec_from_filename, compress, decompress
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SEGMENTS_DIRNAME = "segments"
+BLOBS_DIRNAME = "blobs"
+SEGMENT_INDEX_FILENAME = "index.jsonl"
+EXTRACTED_FILENAME = "extracted.json"
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024  # 64MB
+
+# Record layout: magic, header length (uint32), body length (uint64), header JSON, body
+_RECORD_MAGIC = b"VPG1"
+_RECORD_PREFIX = struct.Struct(">4sIQ")
+
+
+def url_to_hash(url):
+    """Return the storage hash used for a URL."""
+    return hashlib.md5(url.encode()).hexdigest()
+
+
+def hash_content(body):
+    """Return the content hash used to deduplicate page bodies."""
+    return hashlib.sha1(body).hexdigest()
+
+
+# Byte order marks take precedence over any declared encoding
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+
+def decode_body(body, encoding=None):
+    """
+    Decode a stored page body to text.
+
+    Args:
+        body: Raw page bytes as received from the server
+        encoding: Encoding detected at crawl time (from the page metadata);
+            UTF-8 is assumed if it is missing or unknown
+
+    Returns:
+        Decoded text; undecodable bytes are replaced
+    """
+    for bom, bom_encoding in _BOMS:
+        if body.startswith(bom):
+            return body[len(bom):].decode(bom_encoding, errors='replace')
+
+    try:
+        return body.decode(encoding or 'utf-8', errors='replace')
+    except LookupError:
+        logger.warning(f"Unknown encoding {encoding}, decoding as UTF-8")
+        return body.decode('utf-8', errors='replace')
+
+
+class DirectoryPageStore:
+    """One directory per page, named after the MD5 hash of its URL."""
+
+    layout = "directory"
+
+    def __init__(self, save_path, compression="none", deduplicate=False):
+        """
+        Initialize the directory store.
+
+        Args:
+            save_path: Crawl output directory
+            compression: Codec for page bodies written by this store
+            deduplicate: Store each distinct body once under blobs/ and point pages at it
+        """
+        self.save_path = str(save_path)
+        self.compression = check_codec(compression)
+        self.deduplicate = deduplicate
+        self._unsynced = []
+
+    def write_page(self, url_hash, body, page_metadata):
+        """
+        Store a page.
+
+        Args:
+            url_hash: Storage hash of the page URL
+            body: Page body as bytes
+            page_metadata: Dictionary with the page's metadata
+        """
+        page_dir = os.path.join(self.save_path, url_hash)
+        os.makedirs(page_dir, exist_ok=True)
+
+        page_metadata["codec"] = self.compression
+        if "content_hash" not in page_metadata:
+            page_metadata["content_hash"] = hash_content(body)
+
+        if self.deduplicate:
+            self._write_blob(body, page_metadata)
+        else:
+            html_path = os.path.join(page_dir, "page.html" + FILE_EXTENSIONS[self.compression])
+            with open(html_path, 'wb') as f:
+                f.write(compress(body, self.compression))
+            self._unsynced.append(html_path)
+
+        extracted = page_metadata.pop("extracted", None)
+        if extracted is not None:
+            extracted_path = os.path.join(page_dir, EXTRACTED_FILENAME)
+            with open(extracted_path, 'w', encoding='utf-8') as f:
+                json.dump(extracted, f, indent=2, ensure_ascii=False)
+            self._unsynced.append(extracted_path)
+
+        metadata_path = os.path.join(page_dir, "metadata.json")
+        with open(metadata_path, 'w', encoding='utf-8') as f:
+            json.dump(page_metadata, f, indent=2)
+
+        self._unsynced.append(metadata_path)
+
+    def _write_blob(self, body, page_metadata):
+        """Write a body to its content-addressed blob unless it is already stored."""
+        content_hash = page_metadata["content_hash"]
+        # The blob path is stored with "/" so it doubles as an object key on upload
+        blob = f"{BLOBS_DIRNAME}/{content_hash[:2]}/{content_hash}.html{FILE_EXTENSIONS[self.compression]}"
+        page_metadata["blob"] = blob
+
+        blob_path = os.path.join(self.save_path, *blob.split("/"))
+        if os.path.exists(blob_path):
+            return
+
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        # Write under a temporary name so a partial blob is never taken as stored
+        tmp_path = blob_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(compress(body, self.compression))
+        os.replace(tmp_path, blob_path)
+        self._unsynced.append(blob_path)
+
+    def read_page(self, url_hash):
+        """
+        Read a stored page.
+
+        Returns:
+            Tuple of (body bytes, page metadata), or None if the page is not stored
+        """
+        page_dir = os.path.join(self.save_path, url_hash)
+        page_metadata = {}
+        metadata_path = os.path.join(page_dir, "metadata.json")
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                page_metadata = json.load(f)
+        extracted_path = os.path.join(page_dir, EXTRACTED_FILENAME)
+        if os.path.exists(extracted_path):
+            with open(extracted_path, 'r', encoding='utf-8') as f:
+                page_metadata["extracted"] = json.load(f)
+
+        if page_metadata.get("blob"):
+            html_path = os.path.join(self.save_path, *page_metadata["blob"].split("/"))
+            codec = codec_from_filename(html_path)
+            if not os.path.exists(html_path):
+                return None
+        else:
+            html_path, codec = self._find_body(page_dir, page_metadata.get("codec"))
+            if html_path is None:
+                return None
+
+        with open(html_path, 'rb') as f:
+            body = decompress(f.read(), codec)
+
+        return body, page_metadata
+
+    @staticmethod
+    def _find_body(page_dir, preferred_codec=None):
+        """Return the path and codec of the page body, preferring the codec in the page metadata."""
+        codecs = list(FILE_EXTENSIONS)
+        if preferred_codec in FILE_EXTENSIONS:
+            codecs.insert(0, preferred_codec)
+        for codec in codecs:
+            extension = FILE_EXTENSIONS[codec]
+            html_path = os.path.join(page_dir, "page.html" + extension)
+            if os.path.exists(html_path):
+                return html_path, codec
+        return None, None
+
+    def get(self, url):
+        """Read a stored page by URL."""
+        return self.read_page(url_to_hash(url))
+
+    def scan(self):
+        """
+        Iterate over all stored pages.
+
+        Yields:
+            Tuples of (body bytes, page metadata)
+        """
+        for entry in os.scandir(self.save_path):
+            if entry.is_dir() and entry.name != BLOBS_DIRNAME:
+                page = self.read_page(entry.name)
+                if page:
+                    yield page
+
+    def sync(self):
+        """Force the files written since the last sync to disk."""
+        unsynced, self._unsynced = self._unsynced, []
+        for path in unsynced:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def close(self):
+        """Nothing to release for the directory layout."""
+
+    def remove(self):
+        """The directory layout keeps existing page directories on a fresh crawl."""
+
+
+class SegmentPageStore:
+    """Pages appended to rolling, length-prefixed segment files with an offset index."""
+
+    layout = "segments"
+
+    def __init__(self, save_path, compression="none", segment_size=DEFAULT_SEGMENT_SIZE,
+                 deduplicate=False):
+        """
+        Initialize the segment store.
+
+        Args:
+            save_path: Crawl output directory; segments are kept in save_path/segments
+            compression: Codec for page bodies written by this store
+            segment_size: Size in bytes after which a new segment file is started
+            deduplicate: Write a body only once; later pages with the same content
+                hash get an empty record that refers to the first one
+        """
+        self.save_path = str(save_path)
+        self.compression = check_codec(compression)
+        self.deduplicate = deduplicate
+        self.segment_dir = os.path.join(self.save_path, SEGMENTS_DIRNAME)
+        self.index_path = os.path.join(self.segment_dir, SEGMENT_INDEX_FILENAME)
+        self.segment_size = segment_size
+
+        self._offsets = None
+        self._content_offsets = None
+        self._segment_file = None
+        self._segment_name = None
+        self._index_file = None
+
+    @staticmethod
+    def _segment_filename(number):
+        return f"segment-{number:05d}.vpg"
+
+    def _segment_names(self):
+        if not os.path.isdir(self.segment_dir):
+            return []
+        return sorted(name for name in os.listdir(self.segment_dir) if name.endswith(".vpg"))
+
+    def _open_for_append(self):
+        """Open the newest segment (or a new one once it is full) for appending."""
+        os.makedirs(self.segment_dir, exist_ok=True)
+
+        names = self._segment_names()
+        if names and os.path.getsize(os.path.join(self.segment_dir, names[-1])) < self.segment_size:
+            name = names[-1]
+        else:
+            name = self._segment_filename(len(names))
+
+        self._segment_name = name
+        self._segment_file = open(os.path.join(self.segment_dir, name), 'ab')
+        if self._index_file is None:
+            self._index_file = open(self.index_path, 'a', encoding='utf-8')
+
+    def write_page(self, url_hash, body, page_metadata):
+        """
+        Append a page to the current segment.
+
+        Args:
+            url_hash: Storage hash of the page URL
+            body: Page body as bytes
+            page_metadata: Dictionary with the page's metadata
+        """
+        if self._segment_file is None or self._segment_file.tell() >= self.segment_size:
+            if self._segment_file is not None:
+                self._segment_file.close()
+            self._open_for_append()
+
+        if self.deduplicate and self._offsets is None:
+            self._load_offsets()
+
+        page_metadata["codec"] = self.compression
+        if "content_hash" not in page_metadata:
+            page_metadata["content_hash"] = hash_content(body)
+        content_hash = page_metadata["content_hash"]
+        deduplicated = self.deduplicate and content_hash in self._content_offsets
+        if deduplicated:
+            page_metadata["deduplicated"] = True
+            body = b""
+        else:
+            page_metadata.pop("deduplicated", None)
+            body = compress(body, self.compression)
+        header = json.dumps(page_metadata, ensure_ascii=False).encode('utf-8')
+        offset = self._segment_file.tell()
+        self._segment_file.write(_RECORD_PREFIX.pack(_RECORD_MAGIC, len(header), len(body)))
+        self._segment_file.write(header)
+        self._segment_file.write(body)
+        self._segment_file.flush()
+
+        # The index line is written after the record so it never points at missing data
+        location = {"hash": url_hash, "url": page_metadata.get("url"),
+                    "segment": self._segment_name, "offset": offset,
+                    "content_hash": content_hash}
+        if deduplicated:
+            location["deduplicated"] = True
+        self._index_file.write(json.dumps(location) + "\n")
+        self._index_file.flush()
+
+        if self._offsets is not None:
+            self._offsets[url_hash] = (self._segment_name, offset)
+            if not deduplicated:
+                self._content_offsets.setdefault(content_hash, (self._segment_name, offset))
+
+    def _load_offsets(self):
+        """Load the offset index; later entries for the same hash win."""
+        offsets = {}
+        content_offsets = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        location = json.loads(line)
+                    except ValueError:
+                        continue
+                    offsets[location["hash"]] = (location["segment"], location["offset"])
+                    if location.get("content_hash") and not location.get("deduplicated"):
+                        content_offsets.setdefault(location["content_hash"],
+                                                   (location["segment"], location["offset"]))
+        self._offsets = offsets
+        self._content_offsets = content_offsets
+
+    @staticmethod
+    def _read_record(f):
+        """Read one record from an open segment file, or None at the end of the segment."""
+        prefix = f.read(_RECORD_PREFIX.size)
+        if len(prefix) < _RECORD_PREFIX.size:
+            return None
+
+        magic, header_length, body_length = _RECORD_PREFIX.unpack(prefix)
+        if magic != _RECORD_MAGIC:
+            raise ValueError(f"Corrupt segment record at offset {f.tell() - _RECORD_PREFIX.size}")
+
+        header = f.read(header_length)
+        body = f.read(body_length)
+        if len(header) < header_length or len(body) < body_length:
+            # Truncated record from an interrupted crawl
+            return None
+
+        page_metadata = json.loads(header.decode('utf-8'))
+        return decompress(body, page_metadata.get("codec", "none")), page_metadata
+
+    def read_page(self, url_hash):
+        """
+        Read a stored page by its URL hash.
+
+        Returns:
+            Tuple of (body bytes, page metadata), or None if the page is not stored
+        """
+        if self._offsets is None:
+            self._load_offsets()
+
+        location = self._offsets.get(url_hash)
+        if location is None:
+            return None
+
+        record = self._read_at(location)
+        if record is not None and record[1].get("deduplicated"):
+            record = self._resolve_duplicate(record[1])
+        return record
+
+    def _read_at(self, location):
+        segment_name, offset = location
+        if self._segment_file is not None:
+            self._segment_file.flush()
+        with open(os.path.join(self.segment_dir, segment_name), 'rb') as f:
+            f.seek(offset)
+            return self._read_record(f)
+
+    def _resolve_duplicate(self, page_metadata):
+        """Return (body, page_metadata) for a deduplicated record, reading the shared body."""
+        if self._content_offsets is None:
+            self._load_offsets()
+        location = self._content_offsets.get(page_metadata.get("content_hash"))
+        original = self._read_at(location) if location is not None else None
+        if original is None:
+            return None
+        return original[0], page_metadata
+
+    def get(self, url):
+        """Read a stored page by URL."""
+        return self.read_page(url_to_hash(url))
+
+    def scan(self):
+        """
+        Iterate sequentially over every record in every segment.
+
+        Pages that were stored more than once appear once per write.
+        Deduplicated records are yielded with the body they share.
+
+        Yields:
+            Tuples of (body bytes, page metadata)
+        """
+        for name in self._segment_names():
+            with open(os.path.join(self.segment_dir, name), 'rb') as f:
+                while True:
+                    record = self._read_record(f)
+                    if record is None:
+                        break
+                    if record[1].get("deduplicated"):
+                        record = self._resolve_duplicate(record[1])
+                        if record is None:
+                            continue
+                    yield record
+
+    def sync(self):
+        """Force the current segment and the offset index to disk."""
+        for handle in (self._segment_file, self._index_file):
+            if handle is not None:
+                handle.flush()
+                os.fsync(handle.fileno())
+
+    def close(self):
+        """Close open segment and index files."""
+        for handle in (self._segment_file, self._index_file):
+            if handle is not None:
+                handle.close()
+        self._segment_file = None
+        self._index_file = None
+
+    def remove(self):
+        """Delete all segments and the offset index."""
+        self.close()
+        self._offsets = None
+        self._content_offsets = None
+        if os.path.isdir(self.segment_dir):
+            shutil.rmtree(self.segment_dir)
+
+
+STORAGE_BACKENDS = {
+    DirectoryPageStore.layout: DirectoryPageStore,
+    SegmentPageStore.layout: SegmentPageStore,
+}
+
+
+def create_page_store(save_path, storage="directory", compression="none", deduplicate=False):
+    """
+    Create a page store for writing.
+
+    Args:
+        save_path: Crawl output directory
+        storage: Storage layout, 'directory' or 'segments'
+        compression: Codec for page bodies, 'none', 'gzip' or 'zstd'
+        deduplicate: Store identical bodies only once, keyed by content hash
+
+    Returns:
+        Page store instance
+    """
+    if storage not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {storage}. Choose from: {', '.join(STORAGE_BACKENDS)}")
+    return STORAGE_BACKENDS[storage](save_path, compression=compression, deduplicate=deduplicate)
+
+
+def open_page_store(crawl_data_path):
+    """
+    Open the page store of an existing crawl, detecting its layout.
+
+    Args:
+        crawl_data_path: Path to the crawl data directory
+
+    Returns:
+        SegmentPageStore if the crawl has segments, DirectoryPageStore otherwise
+    """
+    if os.path.isdir(os.path.join(str(crawl_data_path), SEGMENTS_DIRNAME)):
+        return SegmentPageStore(crawl_data_path)
+    return DirectoryPageStore(crawl_data_path)
@@ -0,0 +1,320 @@
+"""
+Multi-process crawling for vibe-scraping.
+
+A Twisted reactor runs on one core and cannot be restarted in the same
+process, so a crawl of many sites is limited to a single CPU. This module
+shards the start URLs by domain across worker processes, runs one
+:func:`crawl_with_scrapy` per shard (each with its own reactor) into its own
+output partition, and then merges the partitions into the usual layout of the
+output directory: one ``metadata.json``, one page store and one crawl index,
+with the statistics of all shards added up.
+
+Shards are assigned by the sorted list of domains, so the same site list
+always gives a domain the same shard, and its shard keeps the crawl index,
+validators and throttle state of earlier runs.
+"""
+
+import os
+import json
+import time
+import shutil
+import signal
+import logging
+import threading
+import multiprocessing
+from datetime import datetime
+from urllib.parse import urlparse
+
+from vibe_scraping.journal import CrawlJournal, load_crawl_metadata
+from vibe_scraping.crawl_index import CrawlIndex, INDEX_FILENAME
+from vibe_scraping.page_store import (
+    create_page_store, BLOBS_DIRNAME, SEGMENTS_DIRNAME, SEGMENT_INDEX_FILENAME
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Per-shard output partitions (under save_path) and crawl state (under state_path)
+SHARD_OUTPUT_DIRNAME = ".shards"
+SHARD_STATE_DIRNAME = "shards"
+
+# Statistics that describe a setting or a ratio rather than a count; merged
+# statistics take them from the first shard or recompute them
+_NON_ADDITIVE_STATS = frozenset(("max_depth", "max_pages", "max_distance", "dedup_ratio", "yield"))
+
+
+def shard_start_urls(start_urls, workers):
+    """
+    Split start URLs into at most `workers` shards, keeping each domain in one shard.
+
+    Args:
+        start_urls: List of start URLs
+        workers: Maximum number of shards
+
+    Returns:
+        List of non-empty lists of start URLs
+    """
+    by_domain = {}
+    for url in start_urls:
+        by_domain.setdefault(urlparse(url).netloc.lower(), []).append(url)
+
+    shards = [[] for _ in range(max(1, min(workers, len(by_domain))))]
+    for position, domain in enumerate(sorted(by_domain)):
+        shards[position % len(shards)].extend(by_domain[domain])
+    return [shard for shard in shards if shard]
+
+
+def _crawl_shard(crawl_args):
+    """Run one shard's crawl; executed in a fresh worker process."""
+    from vibe_scraping.scrapy_adapter import crawl_with_scrapy
+    return crawl_with_scrapy(**crawl_args)
+
+
+def _forward_shutdown(signum, frame):
+    """Pass SIGTERM on to the worker processes, which checkpoint and stop their crawls."""
+    logger.info("Received SIGTERM; stopping the worker processes")
+    for child in multiprocessing.active_children():
+        child.terminate()
+
+
+def merge_stats(summaries):
+    """
+    Add up the statistics of several crawls.
+
+    Counts are summed and nested sections merged; settings such as max_depth
+    are taken from the first crawl, and the dedup ratio and yield are
+    recomputed from the summed counts.
+
+    Args:
+        summaries: List of statistics dictionaries with the same layout
+
+    Returns:
+        Merged statistics dictionary
+    """
+    merged = {}
+    for summary in summaries:
+        for key, value in (summary or {}).items():
+            if isinstance(value, dict):
+                merged[key] = merge_stats([merged.get(key) or {}, value])
+            elif isinstance(value, (int, float)) and not isinstance(value, bool) \
+                    and key not in _NON_ADDITIVE_STATS:
+                merged[key] = merged.get(key, 0) + value
+            elif merged.get(key) is None:
+                merged[key] = value
+
+    if "dedup_ratio" in merged and "unique_bodies" in merged:
+        pages = merged["unique_bodies"] + merged["duplicate_bodies"]
+        merged["dedup_ratio"] = pages / merged["unique_bodies"] if merged["unique_bodies"] else 1.0
+    if "yield" in merged and "fetches" in merged:
+        merged["yield"] = merged["useful"] / merged["fetches"] if merged["fetches"] else 0.0
+    return merged
+
+
+def _move(src, dst):
+    """Move a file or directory, replacing whatever is at the destination."""
+    if os.path.isdir(dst) and not os.path.islink(dst):
+        shutil.rmtree(dst)
+    elif os.path.exists(dst):
+        os.remove(dst)
+    shutil.move(src, dst)
+
+
+def merge_page_stores(save_path, shard_paths, prefix=""):
+    """
+    Move the pages of each shard's output partition into save_path.
+
+    Page directories and blobs of the directory layout are moved as they are
+    (pages of a later shard replace those of an earlier one). Segments are
+    renamed with a prefix and the shard number, and their offset index lines
+    are appended to the index in save_path.
+
+    Args:
+        save_path: Merged crawl output directory
+        shard_paths: Output partitions, in shard order
+        prefix: Prefix for merged segment names, unique per run
+
+    Returns:
+        Number of pages moved
+    """
+    moved = 0
+    segment_dir = os.path.join(save_path, SEGMENTS_DIRNAME)
+    for shard_number, shard_path in enumerate(shard_paths):
+        if not os.path.isdir(shard_path):
+            continue
+
+        shard_segments = os.path.join(shard_path, SEGMENTS_DIRNAME)
+        if os.path.isdir(shard_segments):
+            os.makedirs(segment_dir, exist_ok=True)
+            names = {}
+            for name in sorted(os.listdir(shard_segments)):
+                if name.endswith(".vpg"):
+                    names[name] = f"{prefix}s{shard_number:02d}-{name}"
+                    _move(os.path.join(shard_segments, name), os.path.join(segment_dir, names[name]))
+
+            shard_index = os.path.join(shard_segments, SEGMENT_INDEX_FILENAME)
+            if os.path.exists(shard_index):
+                with open(shard_index, 'r', encoding='utf-8') as src, \
+                        open(os.path.join(segment_dir, SEGMENT_INDEX_FILENAME), 'a', encoding='utf-8') as dst:
+                    for line in src:
+                        try:
+                            location = json.loads(line)
+                        except ValueError:
+                            continue
+                        location["segment"] = names.get(location.get("segment"), location.get("segment"))
+                        dst.write(json.dumps(location) + "\n")
+                        moved += 1
+
+        shard_blobs = os.path.join(shard_path, BLOBS_DIRNAME)
+        if os.path.isdir(shard_blobs):
+            # Blobs are content-addressed, so an existing blob is the same body
+            for root, _, files in os.walk(shard_blobs):
+                target_dir = os.path.join(save_path, BLOBS_DIRNAME, os.path.relpath(root, shard_blobs))
+                os.makedirs(target_dir, exist_ok=True)
+                for name in files:
+                    if not name.endswith(".tmp") and not os.path.exists(os.path.join(target_dir, name)):
+                        shutil.move(os.path.join(root, name), os.path.join(target_dir, name))
+
+        for entry in os.scandir(shard_path):
+            if entry.is_dir() and os.path.exists(os.path.join(entry.path, "metadata.json")):
+                _move(entry.path, os.path.join(save_path, entry.name))
+                moved += 1
+    return moved
+
+
+def crawl_parallel(start_urls, save_path, workers, state_path=None, force_recrawl=True,
+                   storage="directory", compression="none", deduplicate_bodies=False,
+                   max_depth=5, max_pages=1000, **crawl_args):
+    """
+    Crawl the start URLs in parallel worker processes, sharded by domain.
+
+    Each shard crawls into ``save_path/.shards/NN`` with its crawl index and
+    throttle state in ``(state_path or save_path)/shards/NN``. When all shards
+    are done their pages are moved into save_path, their metadata is merged
+    into save_path/metadata.json, and the pages of their latest runs are merged
+    into the crawl index in ``state_path or save_path`` under one new run.
+
+    Args:
+        start_urls: List of start URLs
+        save_path: Merged crawl output directory
+        workers: Number of worker processes (at most one per domain is used)
+        state_path: Directory for the merged and per-shard crawl indexes (default: save_path)
+        force_recrawl: Discard the pages and metadata of previous runs
+        storage: Page storage layout, 'directory' or 'segments'
+        compression: Codec for stored page bodies
+        deduplicate_bodies: Store identical page bodies once per shard
+        max_depth: Maximum crawl depth
+        max_pages: Maximum number of pages over all shards, split in proportion
+            to the number of start URLs per shard
+        **crawl_args: Other keyword arguments of crawl_with_scrapy, passed to every shard
+
+    Returns:
+        Dictionary with the merged crawl statistics and a 'shards' list with
+        the statistics of each shard
+    """
+    shards = shard_start_urls(start_urls, workers)
+    state_dir = state_path or save_path
+    os.makedirs(save_path, exist_ok=True)
+    logger.info(f"Crawling {len(start_urls)} start URLs in {len(shards)} worker processes")
+
+    shard_jobs = []
+    for shard_number, urls in enumerate(shards):
+        shard_output = os.path.join(save_path, SHARD_OUTPUT_DIRNAME, f"{shard_number:02d}")
+        if os.path.isdir(shard_output) and not crawl_args.get("resume"):
+            # Left behind by an interrupted crawl or merge; a resumed crawl continues in it
+            shutil.rmtree(shard_output)
+        shard_jobs.append(dict(
+            crawl_args,
+            start_urls=urls,
+            save_path=shard_output,
+            state_path=os.path.join(state_dir, SHARD_STATE_DIRNAME, f"{shard_number:02d}"),
+            force_recrawl=force_recrawl,
+            storage=storage,
+            compression=compression,
+            deduplicate_bodies=deduplicate_bodies,
+            max_depth=max_depth,
+            max_pages=max(1, -(-max_pages * len(urls) // len(start_urls)))
+        ))
+
+    start_time = time.time()
+    # Each worker runs one shard and exits: a Twisted reactor cannot be restarted
+    context = multiprocessing.get_context("spawn")
+    in_main_thread = threading.current_thread() is threading.main_thread()
+    previous_handler = signal.signal(signal.SIGTERM, _forward_shutdown) if in_main_thread else None
+    try:
+        with context.Pool(processes=len(shard_jobs), maxtasksperchild=1) as pool:
+            results = pool.map(_crawl_shard, shard_jobs, chunksize=1)
+    finally:
+        if in_main_thread:
+            signal.signal(signal.SIGTERM, previous_handler)
+    duration = time.time() - start_time
+    results = [result if isinstance(result, dict) else {'pages_crawled': result or 0} for result in results]
+
+    # Merge the shards' pages and metadata into save_path; a resumed crawl adds
+    # to what its interrupted run merged
+    resumed = any(result.get('resumed') for result in results)
+    journal = CrawlJournal(save_path)
+    if force_recrawl and not resumed:
+        journal.remove()
+        create_page_store(save_path, storage).remove()
+    metadata = load_crawl_metadata(save_path) if not force_recrawl or resumed else None
+    metadata = metadata or {"crawled_urls": {}}
+
+    index_path = os.path.join(state_dir, INDEX_FILENAME)
+    if force_recrawl and not resumed and not (crawl_args.get("incremental") or crawl_args.get("revisit_budget") is not None
+                              or crawl_args.get("url_scorer") is not None):
+        CrawlIndex.remove(index_path)
+    index = CrawlIndex(index_path)
+    run_id = index.start_run(start_urls, max_depth=max_depth, max_pages=max_pages)
+
+    shard_outputs = [job["save_path"] for job in shard_jobs]
+    merge_page_stores(save_path, shard_outputs, prefix=f"r{run_id:05d}-")
+
+    for job in shard_jobs:
+        shard_metadata = load_crawl_metadata(job["save_path"]) or {}
+        metadata["crawled_urls"].update(shard_metadata.get("crawled_urls", {}))
+        shard_index = os.path.join(job["state_path"], INDEX_FILENAME)
+        if os.path.exists(shard_index):
+            index.merge_run(shard_index, run_id)
+
+    pages_crawled = sum(result.get('pages_crawled', 0) for result in results)
+    crawl_stats = merge_stats([{key: value for key, value in result.items()
+                                if isinstance(value, dict)} for result in results])
+    crawl_stats.update({
+        'pages_crawled': pages_crawled,
+        'start_time': start_time,
+        'end_time': start_time + duration,
+        'duration': duration,
+        'max_depth': max_depth,
+        'max_pages': max_pages,
+        'workers': len(shard_jobs),
+    })
+    metadata.update({
+        "last_crawl": datetime.now().isoformat(),
+        "pages_crawled": len(metadata["crawled_urls"]),
+        "start_urls": list(start_urls),
+        "crawl_stats": crawl_stats,
+    })
+    journal.compact(metadata)
+    index.finish_run(run_id, pages_crawled, stats=crawl_stats)
+    index.close()
+    shutil.rmtree(os.path.join(save_path, SHARD_OUTPUT_DIRNAME), ignore_errors=True)
+
+    logger.info(f"Parallel crawl finished: {pages_crawled} pages from {len(shard_jobs)} shards "
+                f"in {duration:.1f}s")
+
+    summary = dict(crawl_stats)
+    summary.update({
+        'pages_crawled': pages_crawled,
+        'start_urls': list(start_urls),
+        'max_depth': max_depth,
+        'max_pages': max_pages,
+        'save_path': save_path,
+        'workers': len(shard_jobs),
+        'resumed': resumed,
+        'interrupted': any(result.get('interrupted') for result in results),
+        'shards': [
+            {'start_urls': job['start_urls'], 'pages_crawled': result.get('pages_crawled', 0)}
+            for job, result in zip(shard_jobs, results)
+        ],
+    })
+    return summary
@@ -0,0 +1,177 @@
+"""
+Single-parse response handling for vibe-scraping.
+
+Scrapy builds the lxml tree of a text response the first time its selector is
+used and keeps it on the response, but every stage of the crawl still ran its
+own queries over it: the rule's link extractor, the saved href list, the
+near-duplicate text, the article check. :class:`ParsedResponse` wraps a
+response and computes each of these once from the one tree, together with
+the fields stored by crawl-time extraction: the title, meta tags and
+publish date of the page and its text. :class:`ParseTimings` adds up the
+time spent in each stage for the crawl statistics.
+"""
+
+import re
+import time
+import logging
+from contextlib import contextmanager
+
+from vibe_scraping.simhash import VISIBLE_TEXT_XPATH
+from vibe_scraping.scoring import looks_like_article
+from vibe_scraping.seeds import parse_lastmod
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Stages timed by ParseTimings, in the order a response goes through them
+PARSE_STAGES = ("tree", "hrefs", "text", "article", "head", "links")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Where pages state when they were published, most reliable first
+PUBLISHED_XPATHS = (
+    '//meta[@property="article:published_time"]/@content',
+    '//*[@itemprop="datePublished"]/@content',
+    '//*[@itemprop="datePublished"]/@datetime',
+    '//meta[translate(@name, "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")'
+    '="dc.date.issued" or @name="date" or @name="pubdate" or @name="publishdate"]/@content',
+    '//time[@pubdate]/@datetime',
+    '//article//time/@datetime',
+)
+_JSON_LD_PUBLISHED_RE = re.compile(r'"datePublished"\s*:\s*"([^"]+)"')
+
+
+class ParseTimings:
+    """Number of calls and total time per parse stage."""
+
+    def __init__(self):
+        self.totals = {}
+
+    @contextmanager
+    def measure(self, stage):
+        """Time a block of code as one call of a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            counts = self.totals.setdefault(stage, [0, 0.0])
+            counts[0] += 1
+            counts[1] += time.perf_counter() - start
+
+    def summary(self):
+        """Return {stage: {'calls', 'total_ms', 'avg_ms'}} for the stages that ran."""
+        return {
+            stage: {
+                'calls': self.totals[stage][0],
+                'total_ms': round(self.totals[stage][1] * 1000, 3),
+                'avg_ms': round(self.totals[stage][1] * 1000 / self.totals[stage][0], 3),
+            }
+            for stage in PARSE_STAGES if stage in self.totals
+        }
+
+
+class ParsedResponse:
+    """
+    Lazily computed, cached views of one text response's lxml tree.
+
+    Each view is computed on first use and timed as a stage of the given
+    ParseTimings; later uses return the cached value.
+    """
+
+    def __init__(self, response, timings=None):
+        """
+        Args:
+            response: A Scrapy TextResponse
+            timings: ParseTimings to add the stage times to (None: not timed)
+        """
+        self.response = response
+        self.timings = timings if timings is not None else ParseTimings()
+        self._selector = None
+        self._cache = {}
+        self._links = {}
+
+    @property
+    def selector(self):
+        """The response's selector; building it parses the body into the lxml tree."""
+        if self._selector is None:
+            with self.timings.measure("tree"):
+                self._selector = self.response.selector
+        return self._selector
+
+    def _cached(self, stage, compute):
+        if stage not in self._cache:
+            selector = self.selector
+            with self.timings.measure(stage):
+                self._cache[stage] = compute(selector)
+        return self._cache[stage]
+
+    def hrefs(self):
+        """Return the href of every <a> element, as written in the page."""
+        return self._cached("hrefs", lambda selector: selector.xpath('//a/@href').getall())
+
+    def text(self):
+        """Return the visible text of the body, with whitespace collapsed."""
+        return self._cached("text", lambda selector: _WHITESPACE_RE.sub(
+            " ", " ".join(selector.xpath(VISIBLE_TEXT_XPATH).getall())).strip())
+
+    def is_article(self):
+        """Return True if the page looks like an article (see scoring.looks_like_article)."""
+        return self._cached("article", looks_like_article)
+
+    def head(self):
+        """
+        Return the title and meta tags of the page.
+
+        Returns:
+            Dictionary with 'title', 'description', 'canonical', 'published'
+            (an ISO 8601 UTC date; each None when missing) and 'og', a
+            dictionary of the og:* properties
+        """
+        def read_head(selector):
+            def first(query):
+                value = selector.xpath(query).get()
+                value = _WHITESPACE_RE.sub(" ", value).strip() if value else ""
+                return value or None
+
+            og = {}
+            for meta in selector.xpath('//meta[starts-with(@property, "og:")]'):
+                name = meta.xpath('@property').get()[3:]
+                content = meta.xpath('@content').get()
+                if name and content and name not in og:
+                    og[name] = content.strip()
+            return {
+                'title': first('//title/text()'),
+                'description': first('//meta[translate(@name, "DESCRIPTION", "description")="description"]/@content'),
+                'canonical': first('//link[translate(@rel, "CANONICAL", "canonical")="canonical"]/@href'),
+                'published': _published(selector),
+                'og': og,
+            }
+        return self._cached("head", read_head)
+
+    def extracted(self):
+        """Return the fields stored by crawl-time extraction: the head fields and the text."""
+        return dict(self.head(), text=self.text())
+
+    def links(self, link_extractor):
+        """Return the links a rule's link extractor finds, extracting them once per extractor."""
+        key = id(link_extractor)
+        if key not in self._links:
+            # The extractor uses the response's selector; build it outside this stage's timing
+            self.selector
+            with self.timings.measure("links"):
+                self._links[key] = link_extractor.extract_links(self.response)
+        return self._links[key]
+
+
+def _published(selector):
+    """Return the publish date a page states, as an ISO 8601 UTC string, or None."""
+    candidates = [selector.xpath(query).get() for query in PUBLISHED_XPATHS]
+    for script in selector.xpath('//script[@type="application/ld+json"]/text()').getall():
+        match = _JSON_LD_PUBLISHED_RE.search(script)
+        if match:
+            candidates.append(match.group(1))
+    for value in candidates:
+        published = parse_lastmod(value)
+        if published is not None:
+            return published.isoformat()
+    return None
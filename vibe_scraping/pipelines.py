@@ -0,0 +1,359 @@
+"""
+Scrapy item pipelines for vibe-scraping.
+
+The spider yields page items carrying the raw body and metadata; the
+:class:`PageWriterPipeline` hands them to a dedicated writer thread so that
+disk I/O never runs on the Twisted reactor thread. The
+:class:`PageStreamPipeline` hands a record of each page to the consumer of a
+streamed crawl (see vibe_scraping.stream).
+"""
+
+import time
+import queue
+import logging
+import threading
+from collections import deque
+
+from twisted.internet import defer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Sentinel that tells the writer thread to exit
+_STOP = object()
+
+
+class BackgroundPageWriter:
+    """
+    Dedicated thread that persists crawled pages in batches.
+
+    Pages are queued in a bounded queue; the thread drains up to batch_size
+    pages at a time, writes each one to the page store, crawl journal and
+    crawl index, and issues one fsync per batch.
+    """
+
+    def __init__(self, page_store, journal=None, index=None, run_id=None,
+                 queue_size=256, batch_size=50, fsync=True, on_batch_written=None, stats=None):
+        """
+        Initialize the writer.
+
+        Args:
+            page_store: Page store that receives bodies and page metadata
+            journal: Optional CrawlJournal that receives crawled_urls entries
+            index: Optional CrawlIndex that receives crawled_urls entries
+            run_id: Crawl run id recorded in the index
+            queue_size: Maximum number of pages waiting to be written
+            batch_size: Maximum number of pages written per batch / fsync
+            fsync: Whether to fsync written files after each batch
+            on_batch_written: Callable invoked (from the writer thread) after each batch
+            stats: Counters to continue from (those of an interrupted run)
+        """
+        self.page_store = page_store
+        self.journal = journal
+        self.index = index
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.on_batch_written = on_batch_written
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stats = {
+            'pages_written': 0,
+            'batches_written': 0,
+            'write_errors': 0,
+            'write_latency_total_ms': 0.0,
+            'write_latency_max_ms': 0.0,
+            'queue_depth_max': 0,
+        }
+        self.stats.update({key: value for key, value in (stats or {}).items() if key in self.stats})
+        self._thread = threading.Thread(target=self._run, name="vibe-page-writer", daemon=True)
+        self._thread.start()
+
+    def submit_nowait(self, page):
+        """
+        Queue a page for writing without blocking.
+
+        Args:
+            page: Tuple of (queued_at, url, url_hash, body, page_metadata, url_entry),
+                where queued_at is a time.monotonic() timestamp and body is None
+                for pages that were not modified since the last crawl
+
+        Raises:
+            queue.Full: If the queue is at capacity
+        """
+        self.queue.put_nowait(page)
+        self.stats['queue_depth_max'] = max(self.stats['queue_depth_max'], self.queue.qsize())
+
+    def submit(self, page):
+        """Queue a page for writing, blocking while the queue is full."""
+        self.queue.put(page)
+
+    def queue_depth(self):
+        """Return the number of pages waiting to be written."""
+        return self.queue.qsize()
+
+    def close(self):
+        """Write all queued pages and stop the writer thread."""
+        self.queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if _STOP in batch:
+                batch.remove(_STOP)
+                stopping = True
+
+            self._write_batch(batch)
+            if self.on_batch_written is not None:
+                self.on_batch_written()
+
+    def _write_batch(self, batch):
+        if not batch:
+            return
+
+        for queued_at, url, url_hash, body, page_metadata, url_entry in batch:
+            try:
+                # Unchanged pages (HTTP 304) only update the journal and index
+                if body is not None:
+                    self.page_store.write_page(url_hash, body, page_metadata)
+                if self.journal is not None:
+                    self.journal.append(url, url_entry)
+                if self.index is not None:
+                    self.index.add_page(url, url_entry, run_id=self.run_id)
+            except Exception as e:
+                self.stats['write_errors'] += 1
+                logger.warning(f"Error writing page {url}: {str(e)}")
+                continue
+
+            latency_ms = (time.monotonic() - queued_at) * 1000
+            self.stats['pages_written'] += 1
+            self.stats['write_latency_total_ms'] += latency_ms
+            self.stats['write_latency_max_ms'] = max(self.stats['write_latency_max_ms'], latency_ms)
+
+        if self.fsync:
+            try:
+                self.page_store.sync()
+                if self.journal is not None:
+                    self.journal.sync()
+            except Exception as e:
+                logger.warning(f"Error syncing page writes: {str(e)}")
+
+        self.stats['batches_written'] += 1
+
+    def summary(self):
+        """Return writer statistics with the average write latency."""
+        stats = dict(self.stats)
+        written = stats.pop('write_latency_total_ms')
+        stats['write_latency_avg_ms'] = written / stats['pages_written'] if stats['pages_written'] else 0.0
+        stats['queue_depth'] = self.queue_depth()
+        return stats
+
+
+class PageWriterPipeline:
+    """
+    Item pipeline that persists page items off the reactor thread.
+
+    When the writer queue is full, process_item returns a Deferred that only
+    fires once the page has been queued, so Scrapy's scraper slot fills up and
+    the engine stops feeding new responses until the disk catches up.
+
+    Settings:
+        PAGE_WRITER_QUEUE_SIZE: Maximum pages waiting to be written (default 256)
+        PAGE_WRITER_BATCH_SIZE: Pages written per batch / fsync (default 50)
+        PAGE_WRITER_FSYNC: Whether to fsync after each batch (default True)
+    """
+
+    def __init__(self, crawler, queue_size=256, batch_size=50, fsync=True):
+        self.crawler = crawler
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.crawler_stats = crawler.stats
+        self.writer = None
+        self._waiting = deque()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            crawler,
+            queue_size=settings.getint('PAGE_WRITER_QUEUE_SIZE', 256),
+            batch_size=settings.getint('PAGE_WRITER_BATCH_SIZE', 50),
+            fsync=settings.getbool('PAGE_WRITER_FSYNC', True)
+        )
+
+    # The spider argument is only passed by Scrapy releases before 2.13; the
+    # spider comes from the crawler
+    def open_spider(self, spider=None):
+        # Imported here so the reactor Scrapy installed is the one we get
+        from twisted.internet import reactor
+
+        spider = self.crawler.spider
+        self.writer = BackgroundPageWriter(
+            spider.page_store,
+            journal=spider.journal,
+            index=spider.index,
+            run_id=spider.run_id,
+            queue_size=self.queue_size,
+            batch_size=self.batch_size,
+            fsync=self.fsync,
+            on_batch_written=lambda: reactor.callFromThread(self._release_waiting),
+            stats=getattr(spider, 'resume_writer_stats', None)
+        )
+        spider.page_writer = self.writer
+
+    def close_spider(self, spider=None):
+        # Queue anything still waiting for space, then drain the writer
+        while self._waiting:
+            d, page, item = self._waiting.popleft()
+            self.writer.submit(page)
+            d.callback(item)
+        self.writer.close()
+        self._record_stats()
+
+    def process_item(self, item, spider=None):
+        if "url_entry" not in item:
+            return item
+
+        # Drop the body from the item once it is handed to the writer
+        page = (time.monotonic(), item["url"], item["hash"], item.pop("body", None),
+                item.pop("page_metadata", None), item.pop("url_entry"))
+
+        if not self._waiting:
+            try:
+                self.writer.submit_nowait(page)
+                self._record_queue_depth()
+                return item
+            except queue.Full:
+                pass
+
+        # Backpressure: hold the item until the writer thread frees space
+        if self.crawler_stats is not None:
+            self.crawler_stats.inc_value('vibe/writer/backpressure_waits')
+        d = defer.Deferred()
+        self._waiting.append((d, page, item))
+        return d
+
+    def _release_waiting(self):
+        """Move waiting pages into the queue as space frees up (runs on the reactor thread)."""
+        while self._waiting:
+            d, page, item = self._waiting[0]
+            try:
+                self.writer.submit_nowait(page)
+            except queue.Full:
+                break
+            self._waiting.popleft()
+            d.callback(item)
+        self._record_queue_depth()
+
+    def _record_queue_depth(self):
+        if self.crawler_stats is not None:
+            self.crawler_stats.max_value('vibe/writer/queue_depth_max', self.writer.queue_depth())
+
+    def _record_stats(self):
+        summary = self.writer.summary()
+        self.crawler.spider.stats['writer'] = summary
+        if self.crawler_stats is not None:
+            for key, value in summary.items():
+                self.crawler_stats.set_value(f'vibe/writer/{key}', value)
+        logger.info(f"Page writer: {summary['pages_written']} pages in {summary['batches_written']} batches, "
+                    f"avg latency {summary['write_latency_avg_ms']:.1f} ms, "
+                    f"max queue depth {summary['queue_depth_max']}")
+
+
+def page_record(item):
+    """Build the streamed record of a page item (before PageWriterPipeline takes its body)."""
+    page_metadata = item.get("page_metadata") or {}
+    headers = item.get("headers")
+    return {
+        "url": item["url"],
+        "depth": item["depth"],
+        "status": item.get("status"),
+        "headers": {name.decode('latin-1'): b", ".join(values).decode('latin-1')
+                    for name, values in headers.items()} if headers is not None else {},
+        "body": item.get("body"),
+        "encoding": page_metadata.get("encoding"),
+        "links": item["links"],
+        "content_hash": item["url_entry"].get("content_hash"),
+        "is_article": bool(item["url_entry"].get("is_article")),
+        "not_modified": item.get("not_modified", False),
+        "crawl_time": page_metadata.get("crawl_time", item["url_entry"].get("last_visit")),
+    }
+
+
+class PageStreamPipeline:
+    """
+    Item pipeline that passes a record of every page to a PageStream consumer.
+
+    Runs before PageWriterPipeline, while the item still holds the body. When
+    the stream is full, process_item returns a Deferred that fires once the
+    consumer has made room, holding the crawl back like the page writer does.
+
+    The stream is the spider's ``page_stream`` attribute; the pipeline does
+    nothing for a spider without one.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.crawler_stats = crawler.stats
+        self.stream = None
+        self._waiting = deque()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def open_spider(self, spider=None):
+        from twisted.internet import reactor
+
+        self.stream = getattr(self.crawler.spider, 'page_stream', None)
+        if self.stream is None:
+            return
+        self.stream.crawler = self.crawler
+        self.stream.on_space = lambda: reactor.callFromThread(self._release_waiting)
+        if self.stream.cancelled:
+            # The consumer left before the crawl started
+            reactor.callLater(0, self.crawler.stop)
+
+    def close_spider(self, spider=None):
+        # Nobody is left to take the records still waiting
+        while self._waiting:
+            d, record, item = self._waiting.popleft()
+            d.callback(item)
+
+    def process_item(self, item, spider=None):
+        if self.stream is None or "url_entry" not in item:
+            return item
+
+        record = page_record(item)
+        if not self._waiting and self.stream.offer(record):
+            self._count('records')
+            return item
+
+        # Backpressure: hold the item until the consumer takes a record
+        self._count('backpressure_waits')
+        d = defer.Deferred()
+        self._waiting.append((d, record, item))
+        return d
+
+    def _release_waiting(self):
+        """Offer waiting records as the consumer makes room (runs on the reactor thread)."""
+        while self._waiting:
+            d, record, item = self._waiting[0]
+            if not self.stream.offer(record):
+                break
+            self._waiting.popleft()
+            self._count('records')
+            d.callback(item)
+
+    def _count(self, key):
+        if self.crawler_stats is not None:
+            self.crawler_stats.inc_value(f'vibe/stream/{key}')
@@ -0,0 +1,253 @@
+"""
+Best-first URL scoring for vibe-scraping.
+
+A :class:`URLScorer` gives each discovered link a score between 0 and 1 from
+its URL, anchor text, depth and the score of the page it was found on, blended
+with what earlier runs learned: the share of pages under the same URL
+template (``/news/{n}/{slug}.html``) that turned out to be articles. The
+spider turns the score into the Scrapy request priority, so with a page budget
+the most promising links are fetched first.
+
+:class:`ArticleURLScorer` is the built-in heuristic for news and blog sites;
+subclass :class:`URLScorer` and override :meth:`URLScorer.score_url` for
+other kinds of sites.
+"""
+
+import re
+import logging
+import importlib
+from urllib.parse import urlsplit, parse_qsl
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Scores map onto this many request priority levels (0 to PRIORITY_SCALE)
+PRIORITY_SCALE = 20
+
+# Paragraph words that make a page count as an article without other markup
+ARTICLE_MIN_WORDS = 150
+
+_DIGITS_RE = re.compile(r"\d+")
+_WORD_SPLIT_RE = re.compile(r"[-_+.]+")
+_DATE_PATH_RE = re.compile(r"/(19|20)\d{2}/(0?[1-9]|1[0-2])(/|$)")
+_ID_RE = re.compile(r"\d{4,}")
+
+# Path segments of listing, navigation and account pages
+_LISTING_SEGMENTS = frozenset((
+    "tag", "tags", "category", "categories", "archive", "archives", "author", "authors",
+    "page", "search", "login", "logout", "register", "signup", "account", "cart",
+    "feed", "rss", "print", "share", "comments", "calendar", "topics", "section",
+))
+_LISTING_PARAMS = frozenset(("page", "p", "sort", "order", "filter", "tag", "q", "s", "search", "replytocom"))
+_STATIC_EXTENSIONS = frozenset((
+    "jpg", "jpeg", "png", "gif", "svg", "webp", "ico", "css", "js", "pdf", "zip",
+    "gz", "mp3", "mp4", "avi", "mov", "woff", "woff2", "ttf", "xml", "json",
+))
+_NAVIGATION_ANCHORS = frozenset((
+    "next", "previous", "prev", "more", "older", "newer", "home", "back", "top",
+    "login", "sign in", "register", "share", "print", "»", "«", "›", "‹",
+))
+
+
+def url_template(url):
+    """
+    Return the template of a URL's path and query, used to group similar pages.
+
+    Digit runs become ``{n}``, slug-like segments (three or more words) become
+    ``{slug}`` and query values are dropped, so ``/news/2024/05/big-storm-hits-city-123``
+    and ``/news/2023/11/election-results-are-in-456`` share ``/news/{n}/{n}/{slug}``.
+    """
+    parts = urlsplit(url)
+    segments = []
+    for segment in parts.path.split("/"):
+        stem, dot, extension = segment.rpartition(".") if "." in segment else (segment, "", "")
+        if len([word for word in _WORD_SPLIT_RE.split(stem) if word]) >= 3:
+            stem = "{slug}"
+        else:
+            stem = _DIGITS_RE.sub("{n}", stem)
+        segments.append(stem + dot + extension)
+    template = "/".join(segments) or "/"
+    names = sorted({name for name, _ in parse_qsl(parts.query, keep_blank_values=True)})
+    if names:
+        template += "?" + "&".join(names)
+    return template
+
+
+def looks_like_article(response):
+    """
+    Guess whether a Scrapy text response is an article page.
+
+    Looks for an ``og:type`` of article, a schema.org Article type in JSON-LD,
+    or at least ARTICLE_MIN_WORDS words of paragraph text.
+    """
+    og_type = response.xpath('//meta[@property="og:type"]/@content').get()
+    if og_type and og_type.strip().lower() == "article":
+        return True
+    for script in response.xpath('//script[@type="application/ld+json"]/text()').getall():
+        if re.search(r'"@type"\s*:\s*\[?\s*"(?:(?:News|Blog|Scholarly|Tech)?Article|BlogPosting|Report)"', script):
+            return True
+    paragraphs = response.xpath('//p//text()[not(ancestor::script) and not(ancestor::style)]').getall()
+    return sum(len(text.split()) for text in paragraphs) >= ARTICLE_MIN_WORDS
+
+
+class URLScorer:
+    """
+    Base URL scorer: a neutral URL score blended with the parent page's score
+    and the article rate learned for the URL's template.
+    """
+
+    name = "neutral"
+
+    def __init__(self, template_stats=None, parent_weight=0.2, learned_weight=0.6, depth_penalty=0.02):
+        """
+        Initialize the scorer.
+
+        Args:
+            template_stats: Dictionary of (domain, template) -> (pages, articles)
+                from earlier runs (see CrawlIndex.load_template_stats)
+            parent_weight: Weight of the parent page's score
+            learned_weight: Maximum weight of the learned article rate, reached
+                as the template accumulates pages
+            depth_penalty: Score subtracted per level of depth
+        """
+        self.template_stats = template_stats or {}
+        self.parent_weight = parent_weight
+        self.learned_weight = learned_weight
+        self.depth_penalty = depth_penalty
+
+    def learn(self, template_stats):
+        """Replace the learned per-template statistics."""
+        self.template_stats = template_stats or {}
+
+    def score_url(self, url, anchor_text="", depth=1):
+        """
+        Score a URL on its own, between 0 and 1. Override in subclasses.
+
+        Args:
+            url: Absolute URL
+            anchor_text: Text of the link pointing to it
+            depth: Depth the page would be crawled at
+        """
+        return 0.5
+
+    def learned_rate(self, url):
+        """
+        Return (article rate, confidence) learned for the URL's template.
+
+        The rate is Laplace-smoothed; the confidence grows from 0 towards 1 with
+        the number of pages seen under the template.
+        """
+        key = (urlsplit(url).netloc.lower(), url_template(url))
+        pages, articles = self.template_stats.get(key, (0, 0))
+        if not pages:
+            return None, 0.0
+        return (articles + 1) / (pages + 2), pages / (pages + 5)
+
+    def score(self, url, anchor_text="", depth=1, parent_score=None):
+        """
+        Score a discovered link.
+
+        Args:
+            url: Absolute URL
+            anchor_text: Text of the link pointing to it
+            depth: Depth the page would be crawled at
+            parent_score: Score of the page the link was found on, if known
+
+        Returns:
+            Score between 0 and 1 (higher is fetched earlier)
+        """
+        score = self.score_url(url, anchor_text or "", depth)
+        if parent_score is not None:
+            score = (1 - self.parent_weight) * score + self.parent_weight * parent_score
+
+        rate, confidence = self.learned_rate(url)
+        if rate is not None:
+            weight = self.learned_weight * confidence
+            score = (1 - weight) * score + weight * rate
+
+        score -= self.depth_penalty * max(depth - 1, 0)
+        return min(max(score, 0.0), 1.0)
+
+    @staticmethod
+    def priority(score):
+        """Map a score to a Scrapy request priority."""
+        return int(round(score * PRIORITY_SCALE))
+
+
+class ArticleURLScorer(URLScorer):
+    """Heuristic scorer that favours article-shaped URLs over listings, navigation and static files."""
+
+    name = "article"
+
+    def score_url(self, url, anchor_text="", depth=1):
+        parts = urlsplit(url)
+        path = parts.path.lower()
+        segments = [segment for segment in path.split("/") if segment]
+        last = segments[-1] if segments else ""
+        stem, _, extension = last.rpartition(".") if "." in last else (last, "", "")
+
+        if extension in _STATIC_EXTENSIONS:
+            return 0.0
+
+        score = 0.4
+        if not segments:
+            # Home pages are hubs: worth a fetch, but not ahead of articles
+            score = 0.3
+        if _DATE_PATH_RE.search(path):
+            score += 0.2
+        if _ID_RE.search(last):
+            score += 0.15
+        if len([word for word in _WORD_SPLIT_RE.split(stem) if word and not word.isdigit()]) >= 3:
+            score += 0.25
+        if extension in ("html", "htm", "shtml", "php", "aspx"):
+            score += 0.05
+
+        if any(segment in _LISTING_SEGMENTS for segment in segments):
+            score -= 0.3
+        query_names = {name.lower() for name, _ in parse_qsl(parts.query, keep_blank_values=True)}
+        if query_names & _LISTING_PARAMS:
+            score -= 0.25
+
+        anchor = " ".join(anchor_text.split()).lower()
+        if anchor:
+            if anchor in _NAVIGATION_ANCHORS or anchor.isdigit():
+                score -= 0.2
+            elif len(anchor.split()) >= 4:
+                # Headlines make long anchors; menus short ones
+                score += 0.15
+
+        return min(max(score, 0.0), 1.0)
+
+
+SCORERS = {
+    URLScorer.name: URLScorer,
+    ArticleURLScorer.name: ArticleURLScorer,
+}
+
+
+def create_url_scorer(spec, template_stats=None):
+    """
+    Create a URL scorer.
+
+    Args:
+        spec: None (no scoring), a URLScorer instance, a built-in name
+            ('article', 'neutral') or a dotted path to a URLScorer subclass
+        template_stats: Learned per-template statistics for the scorer
+
+    Returns:
+        URLScorer instance, or None
+    """
+    if spec is None:
+        return None
+    if isinstance(spec, URLScorer):
+        scorer = spec
+    elif spec in SCORERS:
+        scorer = SCORERS[spec]()
+    elif isinstance(spec, str) and "." in spec:
+        module_name, _, class_name = spec.rpartition(".")
+        scorer = getattr(importlib.import_module(module_name), class_name)()
+    else:
+        raise ValueError(f"Unknown URL scorer: {spec!r} (use one of {', '.join(SCORERS)} or a dotted path)")
+    if template_stats is not None:
+        scorer.learn(template_stats)
+    return scorer
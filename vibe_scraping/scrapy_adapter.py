@@ -5,12 +5,27 @@ This module provides a Scrapy-based crawler implementation focused on deep web c
 """
 
 import os
-import json
+import hashlib
 import logging
 import time
-from datetime import datetime
-import hashlib
-from urllib.parse import urlparse, urldefrag
+import weakref
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urldefrag, urljoin, urlparse
+
+from vibe_scraping.journal import CrawlJournal, load_crawl_metadata
+from vibe_scraping.crawl_index import CrawlIndex, INDEX_FILENAME
+from vibe_scraping.page_store import create_page_store, hash_content, url_to_hash
+from vibe_scraping.simhash import SimHashIndex, text_fingerprint
+from vibe_scraping.canonicalize import URLCanonicalizer, request_canonicalizer
+from vibe_scraping.revisit import RevisitScheduler
+from vibe_scraping.scoring import create_url_scorer, url_template
+from vibe_scraping.throttle import THROTTLE_STATE_FILENAME
+from vibe_scraping.parsing import ParsedResponse, ParseTimings
+from vibe_scraping.traps import TrapDetector, FOLLOW, PRUNE
+from vibe_scraping.hostcache import RESOLVER_SETTING, default_host_cache_path
+from vibe_scraping.checkpoint import CHECKPOINT_DIRNAME, load_checkpoint, clear_job, is_resumable
+from vibe_scraping.seeds import (parse_seed_document, parse_lastmod, seed_priority, sitemap_urls_from_robots,
+                                 SITEMAP_INDEX, SEED_PRIORITY, RECENCY_BUCKETS)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,10 +34,13 @@ logger = logging.getLogger(__name__)
 # Import Scrapy-related modules
 try:
     import scrapy
-    from scrapy.crawler import CrawlerProcess
+    from scrapy.crawler import Crawler, CrawlerProcess
     from scrapy.spiders import CrawlSpider, Rule
     from scrapy.linkextractors import LinkExtractor
     from scrapy.exceptions import NotConfigured
+    from scrapy.http import HtmlResponse, TextResponse
+    from scrapy.link import Link
+    from vibe_scraping.middlewares import HTML_CONTENT_TYPES, DEFAULT_MAX_BODY_SIZES
     SCRAPY_AVAILABLE = True
 except ImportError:
     SCRAPY_AVAILABLE = False
@@ -35,6 +53,10 @@ if SCRAPY_AVAILABLE:
         
         name = "vibe_scraper"
         
+        # Counters saved in checkpoints and restored on resume
+        checkpoint_stats = ('dedup_stats', 'near_duplicate_stats', 'canonical_stats', 'conditional_get_stats',
+                            'seed_stats', 'yield_stats', 'template_yield', 'revisit_stats')
+        
         def __init__(self, *args, **kwargs):
             """Initialize the spider with custom parameters."""
             # Extract parameters from kwargs
@@ -45,29 +67,121 @@ if SCRAPY_AVAILABLE:
             self.respect_robots = kwargs.pop('respect_robots', True)
             self.save_path = kwargs.pop('save_path', 'crawled_data')
             self.force_recrawl = kwargs.pop('force_recrawl', True)
+            self.storage = kwargs.pop('storage', 'directory')
+            self.compression = kwargs.pop('compression', 'none')
+            self.deduplicate_bodies = kwargs.pop('deduplicate_bodies', False)
+            self.near_duplicate_distance = kwargs.pop('near_duplicate_distance', None)
+            self.skip_near_duplicate_links = kwargs.pop('skip_near_duplicate_links', False)
+            canonical_rules = kwargs.pop('canonical_rules', None)
+            self.canonicalizer = URLCanonicalizer(domain_rules=canonical_rules)
+            # The canonical form Scrapy's request fingerprint dedups links by
+            self.request_canonicalizer = request_canonicalizer(canonical_rules)
+            self.state_path = kwargs.pop('state_path', None) or self.save_path
+            self.incremental = kwargs.pop('incremental', False)
+            self.revisit_budget = kwargs.pop('revisit_budget', None)
+            self.discover_seeds = kwargs.pop('discover_seeds', False)
+            self.seed_urls = list(kwargs.pop('seed_urls', None) or [])
+            self.seed_max_age_days = kwargs.pop('seed_max_age_days', None)
+            self.url_scorer = create_url_scorer(kwargs.pop('url_scorer', None))
+            self.resume_checkpoint = kwargs.pop('resume_checkpoint', None)
+            self.page_stream = kwargs.pop('page_stream', None)
+            self.extract_fields = kwargs.pop('extract_fields', False)
+            trap_detection = kwargs.pop('trap_detection', True)
             
             # Setup the start URLs first - before accessing them in _load_metadata
             if self.start_url and self.start_url not in start_urls:
                 start_urls.append(self.start_url)
                 
-            self.start_urls = start_urls if start_urls else []
+            # Start URLs are tracked by their canonical form and requested as given
+            self.start_urls = []
+            self.start_request_urls = {}
+            for url in start_urls:
+                canonical_url = self.canonicalizer.canonicalize(url)
+                if canonical_url not in self.start_urls:
+                    self.start_urls.append(canonical_url)
+                    self.start_request_urls[canonical_url] = urldefrag(url)[0]
             
             # Create a save directory if it doesn't exist
             os.makedirs(self.save_path, exist_ok=True)
             
-            # Initialize metadata
+            # Initialize metadata and the append-only page journal
             self.metadata_file = os.path.join(self.save_path, "metadata.json")
+            self.journal = CrawlJournal(self.save_path)
             
-            # If forcing recrawl, delete the metadata file if it exists
-            if self.force_recrawl and os.path.exists(self.metadata_file):
-                logger.info(f"Force recrawl: removing existing metadata file {self.metadata_file}")
+            # The index can live outside save_path so it survives between runs
+            os.makedirs(self.state_path, exist_ok=True)
+            self.index_path = os.path.join(self.state_path, INDEX_FILENAME)
+            self.page_store = create_page_store(self.save_path, self.storage, self.compression,
+                                                deduplicate=self.deduplicate_bodies)
+            
+            # If forcing recrawl, delete the metadata file, journal, index and segments if they exist;
+            # incremental, revisit-scheduled and best-first crawls keep the index, which
+            # holds the validators, change history and page types of earlier runs, and
+            # the stored pages its entries (and the 304 entries of this run) point to
+            if self.force_recrawl and self.resume_checkpoint is None:
+                logger.info(f"Force recrawl: removing existing metadata in {self.save_path}")
                 try:
-                    os.remove(self.metadata_file)
+                    self.journal.remove()
+                    if not self.incremental and self.revisit_budget is None and self.url_scorer is None:
+                        CrawlIndex.remove(self.index_path)
+                        self.page_store.remove()
                 except Exception as e:
                     logger.warning(f"Failed to remove metadata file: {e}")
             
             self.metadata = self._load_metadata()
             
+            # Open the SQLite crawl index and record this run
+            self.index = CrawlIndex(self.index_path)
+            # A resumed crawl continues the run it was interrupted in
+            self.run_id = (self.resume_checkpoint or {}).get('run_id')
+            if self.run_id is None:
+                self.run_id = self.index.start_run(self.start_urls, max_depth=self.max_depth)
+            
+            # Validators from earlier runs; ConditionalRequestMiddleware sends them and
+            # 304 responses are passed to parse_item. The reader connection serves
+            # lookups on the reactor thread while the page writer uses self.index.
+            self.validators = {}
+            self.index_reader = None
+            if self.incremental:
+                self.validators = self.index.load_validators()
+                self.index_reader = CrawlIndex(self.index_path)
+                self.handle_httpstatus_list = [304]
+                logger.info(f"Incremental crawl: {len(self.validators)} pages have cache validators")
+            self.conditional_get_stats = {
+                'not_modified': 0,
+                'bytes_saved': 0
+            }
+            
+            # Revisit known pages by expected freshness gain instead of rediscovering them all
+            self.revisit_plan = []
+            self.revisit_skip = set()
+            self.revisit_stats = {}
+            if self.revisit_budget is not None:
+                self._plan_revisits()
+            
+            # Sitemap and feed dates of pages seeded by earlier runs; a seed whose
+            # date has not moved on is not fetched again
+            self.seed_lastmods = {}
+            if self.discover_seeds or self.seed_urls:
+                self.seed_lastmods = self.index.load_sitemap_lastmods()
+            self.seed_stats = {
+                'documents': 0,
+                'seeded': 0,
+                'unchanged': 0,
+                'too_old': 0
+            }
+            
+            # Best-first order: the scorer learns which URL templates held articles in earlier runs
+            if self.url_scorer is not None:
+                self.url_scorer.learn(self.index.load_template_stats())
+                logger.info(f"URL scorer '{self.url_scorer.name}': "
+                            f"{len(self.url_scorer.template_stats)} URL templates learned from earlier runs")
+            self.yield_stats = {
+                'fetches': 0,
+                'useful': 0
+            }
+            self.template_yield = {}
+            
             # Extract domains from start URLs
             self.base_domains = []
             self.base_scheme = 'https'  # Default
@@ -90,6 +204,7 @@ if SCRAPY_AVAILABLE:
                     callback='parse_item',
                     follow=True,
                     process_links='process_links',
+                    process_request='process_request',
                     cb_kwargs={'depth': 1}
                 )
             ]
@@ -109,19 +224,123 @@ if SCRAPY_AVAILABLE:
                 'max_depth': self.max_depth
             }
             
+            # First URL seen for each content hash in this run
+            self.content_hashes = {}
+            self.dedup_stats = {
+                'unique_bodies': 0,
+                'duplicate_bodies': 0,
+                'duplicate_bytes': 0
+            }
+            
+            # SimHash index of page text for near-duplicate detection (None disables it)
+            self.simhash_index = None
+            if self.near_duplicate_distance is not None:
+                self.simhash_index = SimHashIndex(max_distance=self.near_duplicate_distance)
+            self.near_duplicate_stats = {
+                'near_duplicates': 0,
+                'requests_skipped': 0
+            }
+            
+            # Prune and throttle links into crawler traps (None disables it)
+            self.trap_detector = None
+            if trap_detection:
+                self.trap_detector = TrapDetector(**(trap_detection if isinstance(trap_detection, dict) else {}))
+            
+            # One ParsedResponse per response in flight, shared by the rules' link
+            # extraction and parse_item; entries go away with their response
+            self.parse_timings = ParseTimings()
+            self.parsed_responses = weakref.WeakKeyDictionary()
+            
+            # Digests of distinct link URLs that the request fingerprint merges with another form
+            self._rewritten_urls = set()
+            self.canonical_stats = {
+                'links_rewritten': 0
+            }
+            
             # Make sure crawled_urls exists in metadata
             if "crawled_urls" not in self.metadata:
                 self.metadata["crawled_urls"] = {}
+            
+            # Pick up the counters of an interrupted run
+            self.start_requests_done = False
+            self.resume_crawled = set()
+            self.resume_writer_stats = None
+            if self.resume_checkpoint is not None:
+                self._restore_checkpoint(self.resume_checkpoint)
                 
             # Initialize CrawlSpider
             super(VibeCrawlSpider, self).__init__(*args, **kwargs)
         
+        def checkpoint_state(self):
+            """Return the state CheckpointExtension saves: the run, the start request progress and the counters."""
+            page_writer = getattr(self, 'page_writer', None)
+            return {
+                'run_id': self.run_id,
+                'pages_crawled': self.stats['pages_crawled'],
+                'start_requests_done': self.start_requests_done,
+                'stats': {name: getattr(self, name) for name in self.checkpoint_stats},
+                'writer': dict(page_writer.stats) if page_writer is not None else self.resume_writer_stats,
+                'traps': self.trap_detector.to_dict() if self.trap_detector is not None else None
+            }
+        
+        def _restore_checkpoint(self, checkpoint):
+            """Continue the counters of the interrupted run and find the pages it already fetched."""
+            for name, values in checkpoint.get('stats', {}).items():
+                target = getattr(self, name, None)
+                if name in self.checkpoint_stats and isinstance(target, dict) and isinstance(values, dict):
+                    target.update(values)
+            # The page writer is created when the spider opens and continues these counters
+            self.resume_writer_stats = checkpoint.get('writer')
+            if self.trap_detector is not None and checkpoint.get('traps'):
+                self.trap_detector.restore(checkpoint['traps'])
+            self.start_requests_done = checkpoint.get('start_requests_done', False)
+            if checkpoint.get('reason') is None:
+                # Killed before it could close: Scrapy's queue was discarded and the
+                # frontier is rebuilt from the index. Pages the index had not committed
+                # yet are in the journal, which is synced after every written batch.
+                run = next((run for run in self.index.iter_runs() if run["id"] == self.run_id), {})
+                started = run.get("start_time") or ""
+                self.resume_crawled = {page["url"] for page in self.index.iter_pages(run_id=self.run_id)}
+                for url, entry in self.metadata["crawled_urls"].items():
+                    if url not in self.resume_crawled and (entry.get("last_visit") or "") >= started:
+                        self.index.add_page(url, entry, run_id=self.run_id)
+                        self.resume_crawled.add(url)
+                self.index.flush()
+            # The index also holds the pages fetched after the last checkpoint
+            self.stats['pages_crawled'] = self.index.count_pages(run_id=self.run_id)
+            logger.info(f"Resuming crawl run {self.run_id}: {self.stats['pages_crawled']} pages already crawled")
+        
+        def _resume_requests(self):
+            """Rebuild the frontier of a killed crawl: the links of its stored pages that it had not fetched."""
+            reader = CrawlIndex(self.index_path)
+            queued = set()
+            try:
+                for page in reader.iter_pages(include_links=True, run_id=self.run_id):
+                    depth = (page["depth"] or 0) + 1
+                    if depth > self.max_depth:
+                        continue
+                    links = [Link(urljoin(page["url"], href)) for href in page["links"]
+                             if not href.startswith(('mailto:', 'tel:', 'fax:', 'javascript:'))]
+                    for url in (link.url for link in self.process_links(links)):
+                        key = self.canonicalizer.canonicalize(url)
+                        if key in self.resume_crawled or key in queued or key in self.revisit_skip:
+                            continue
+                        queued.add(key)
+                        priority = -depth
+                        if self.url_scorer is not None:
+                            priority = self.url_scorer.priority(self.url_scorer.score(url, depth=depth))
+                        yield scrapy.Request(url, priority=priority, cb_kwargs={'depth': depth},
+                                             meta={'depth': depth})
+            finally:
+                reader.close()
+            logger.info(f"Resume: rebuilt a frontier of {len(queued)} requests from the crawl index")
+        
         def _load_metadata(self):
-            """Load metadata from previous crawls if available."""
+            """Load metadata (and any uncompacted journal) from previous crawls if available."""
             try:
-                if os.path.exists(self.metadata_file):
-                    with open(self.metadata_file, 'r') as f:
-                        return json.load(f)
+                metadata = load_crawl_metadata(self.save_path)
+                if metadata is not None:
+                    return metadata
             except Exception as e:
                 logger.warning(f"Could not load metadata: {str(e)}")
             
@@ -150,17 +369,209 @@ if SCRAPY_AVAILABLE:
             self.metadata["crawl_stats"]["duration"] = self.stats.get('elapsed_time_seconds', 0)
             self.metadata["crawl_stats"]["max_depth"] = self.max_depth
             self.metadata["crawl_stats"]["max_pages"] = self.crawler.settings.getint('CLOSESPIDER_PAGECOUNT')
+            if 'writer' in self.stats:
+                self.metadata["crawl_stats"]["writer"] = self.stats['writer']
+            self.metadata["crawl_stats"]["dedup"] = self.dedup_summary()
+            self.metadata["crawl_stats"]["canonicalization"] = self.canonicalization_summary()
+            if self.revisit_budget is not None:
+                self.metadata["crawl_stats"]["revisit"] = self.revisit_stats
+            if self.discover_seeds or self.seed_urls:
+                self.metadata["crawl_stats"]["seeds"] = self.seed_stats
+            self.metadata["crawl_stats"]["yield"] = self.yield_summary()
+            self.metadata["crawl_stats"]["parse"] = self.parse_timings.summary()
+            if self.trap_detector is not None:
+                self.metadata["crawl_stats"]["traps"] = self.trap_detector.summary()
+            for stage, timing in self.metadata["crawl_stats"]["parse"].items():
+                self.crawler.stats.set_value(f'vibe/parse/{stage}_ms', timing['total_ms'])
+            throttle_controller = getattr(self, 'throttle_controller', None)
+            if throttle_controller is not None:
+                self.metadata["crawl_stats"]["throttle"] = throttle_controller.summary()
+            content_gate = getattr(self, 'content_gate', None)
+            if content_gate is not None:
+                self.metadata["crawl_stats"]["content_gate"] = content_gate.summary()
+                self.metadata["skipped_urls"] = content_gate.skipped
+            if self.crawler.settings.get('SHARED_FRONTIER_PATH'):
+                # Set by SharedFrontierScheduler when it closes, before this runs
+                self.metadata["crawl_stats"]["frontier"] = {
+                    name: self.crawler.stats.get_value(f'vibe/frontier/{name}', 0)
+                    for name in ('requests_enqueued', 'requests_leased', 'pending', 'leased', 'done', 'failed')
+                }
+            if self.incremental:
+                self.metadata["crawl_stats"]["conditional_get"] = dict(
+                    self.conditional_get_stats,
+                    requests=self.crawler.stats.get_value('vibe/conditional_get/requests', 0)
+                )
+            if self.simhash_index is not None:
+                self.metadata["crawl_stats"]["near_duplicates"] = dict(
+                    self.near_duplicate_stats,
+                    max_distance=self.near_duplicate_distance,
+                    fingerprints_indexed=len(self.simhash_index)
+                )
+            
+            # Compact the journal into metadata.json
+            self.journal.compact(self.metadata)
+        
+        def dedup_summary(self):
+            """Return body deduplication statistics for this run."""
+            summary = dict(self.dedup_stats)
+            pages = summary['unique_bodies'] + summary['duplicate_bodies']
+            summary['dedup_ratio'] = pages / summary['unique_bodies'] if summary['unique_bodies'] else 1.0
+            summary['bodies_stored_once'] = self.deduplicate_bodies
+            return summary
+        
+        def canonicalization_summary(self):
+            """Return URL canonicalization statistics for this run."""
+            # Each distinct rewritten URL is a variant that would otherwise have been fetched separately
+            return dict(self.canonical_stats, fetches_saved=len(self._rewritten_urls))
+        
+        def yield_summary(self):
+            """Return the useful pages (articles) per fetch of this run, overall and for the busiest URL templates."""
+            fetches = self.yield_stats['fetches']
+            templates = sorted(self.template_yield.items(), key=lambda item: item[1][0], reverse=True)[:10]
+            return {
+                'scorer': self.url_scorer.name if self.url_scorer is not None else 'breadth-first',
+                'fetches': fetches,
+                'useful': self.yield_stats['useful'],
+                'yield': self.yield_stats['useful'] / fetches if fetches else 0.0,
+                'templates': {template: {'fetches': counts[0], 'useful': counts[1]} for template, counts in templates}
+            }
+        
+        def _count_yield(self, url, template, is_article):
+            """Count a fetched page towards this run's yield."""
+            self.yield_stats['fetches'] += 1
+            key = f"{urlparse(url).netloc.lower()}{template}"
+            counts = self.template_yield.setdefault(key, [0, 0])
+            counts[0] += 1
+            if is_article:
+                self.yield_stats['useful'] += 1
+                counts[1] += 1
+                self.crawler.stats.inc_value('vibe/yield/useful')
+        
+        def _plan_revisits(self):
+            """Pick the known pages to revisit this run; the other known pages are skipped."""
+            scheduler = RevisitScheduler(self.index)
+            plan = [page for page in scheduler.plan(self.revisit_budget + len(self.start_urls))
+                    if page["url"] not in self.start_urls][:self.revisit_budget]
+            self.revisit_plan = plan
+            
+            planned = {page["url"] for page in plan}
+            self.revisit_skip = {page["url"] for page in self.index.iter_pages()
+                                 if page["url"] not in planned and page["url"] not in self.start_urls}
+            
+            self.revisit_stats = scheduler.summary(plan)
+            self.revisit_stats['requests_skipped'] = 0
+            logger.info(f"Revisit plan: {len(plan)} of {len(plan) + len(self.revisit_skip)} known pages, "
+                        f"{self.revisit_stats['expected_changes']:.1f} expected to have changed")
+        
+        def start_requests(self):
+            """Start URLs and seed documents first, then planned revisits in order of expected freshness gain."""
+            if self.resume_crawled:
+                yield from self._resume_requests()
+            if self.start_requests_done:
+                # The rest of the crawl is in the queue restored from JOBDIR (or rebuilt above)
+                return
+            for url in self.start_urls:
+                # A 304 has no body to find the advertised feeds in
+                yield scrapy.Request(self.start_request_urls.get(url, url), dont_filter=True,
+                                     meta={'dont_conditional_get': self.discover_seeds})
+            yield from self._seed_document_requests()
+            for rank, page in enumerate(self.revisit_plan):
+                priority = -1 - rank
+                if self.url_scorer is not None:
+                    priority = self.url_scorer.priority(self.url_scorer.score(page["url"], depth=page["depth"] or 0))
+                # Not dont_filter: links to the page found later are then deduplicated
+                yield scrapy.Request(page["url"], priority=priority,
+                                     cb_kwargs={'depth': page["depth"] or 0},
+                                     meta={'vibe_revisit_gain': page["gain"]})
+            self.start_requests_done = True
+        
+        async def start(self):
+            for request in self.start_requests():
+                yield request
+        
+        def parse_start_url(self, response, depth=0):
+            """Process the start URL (or a planned revisit or seeded page, at its depth)."""
+            item = self.parse_item(response, depth=depth)
+            if not self.discover_seeds or depth != 0 or not isinstance(response, TextResponse):
+                return item
             
-            # Save to file
-            with open(self.metadata_file, 'w') as f:
-                json.dump(self.metadata, f, indent=2)
+            # Feeds advertised by the start page
+            feeds = response.xpath(
+                '//link[contains(concat(" ", normalize-space(@rel), " "), " alternate ")]'
+                '[contains(@type, "rss") or contains(@type, "atom")]/@href'
+            ).getall()
+            results = [item] if item is not None else []
+            results.extend(self._seed_document_request(response.urljoin(href)) for href in feeds)
+            return results
+        
+        def _seed_document_request(self, url):
+            """Build a request for a sitemap or feed, fetched ahead of every page."""
+            return scrapy.Request(url, callback=self._parse_seed_document,
+                                  priority=SEED_PRIORITY + RECENCY_BUCKETS + 1,
+                                  meta={'vibe_seed_document': True})
         
-        def parse_start_url(self, response):
-            """Process the start URL."""
-            return self.parse_item(response, depth=0)
+        def _seed_document_requests(self):
+            """Requests for robots.txt and the default sitemap of each start domain, and the given seed URLs."""
+            if self.discover_seeds:
+                for url in self.start_urls:
+                    parsed_url = urlparse(url)
+                    root = f"{parsed_url.scheme}://{parsed_url.netloc}"
+                    yield scrapy.Request(f"{root}/robots.txt", callback=self._parse_robots,
+                                         priority=SEED_PRIORITY + RECENCY_BUCKETS + 1,
+                                         meta={'vibe_seed_document': True})
+                    yield self._seed_document_request(f"{root}/sitemap.xml")
+            for url in self.seed_urls:
+                yield self._seed_document_request(url)
+        
+        def _parse_robots(self, response):
+            """Queue the sitemaps listed in robots.txt."""
+            response.meta['depth'] = 0
+            text = response.body.decode('utf-8', errors='replace')
+            for url in sitemap_urls_from_robots(text, response.url):
+                yield self._seed_document_request(url)
+        
+        def _parse_seed_document(self, response):
+            """Seed the pages listed in a sitemap or feed, newest first, and follow sitemap indexes."""
+            # Seed documents sit outside the link graph: DepthMiddleware puts
+            # what they list at depth 1, like links from the start page
+            response.meta['depth'] = 0
+            
+            kind, entries = parse_seed_document(response.body, response.url)
+            if kind is None:
+                logger.info(f"Not a sitemap or feed: {response.url}")
+                return
+            self.seed_stats['documents'] += 1
+            logger.info(f"Seed document {response.url}: {len(entries)} entries ({kind})")
+            
+            now = datetime.now(timezone.utc)
+            cutoff = None
+            if self.seed_max_age_days is not None:
+                cutoff = now - timedelta(days=self.seed_max_age_days)
+            
+            for url, lastmod in entries:
+                if cutoff is not None and lastmod is not None and lastmod < cutoff:
+                    self.seed_stats['too_old'] += 1
+                    continue
+                if kind == SITEMAP_INDEX:
+                    yield self._seed_document_request(url)
+                    continue
+                
+                canonical_url = self.canonicalizer.canonicalize(url)
+                stored = parse_lastmod(self.seed_lastmods.get(canonical_url))
+                if (lastmod is not None and stored is not None and lastmod <= stored) or \
+                   (lastmod is None and canonical_url in self.revisit_skip):
+                    self.seed_stats['unchanged'] += 1
+                    self.crawler.stats.inc_value('vibe/seeds/unchanged')
+                    continue
+                
+                self.seed_stats['seeded'] += 1
+                self.crawler.stats.inc_value('vibe/seeds/seeded')
+                yield scrapy.Request(urldefrag(url)[0], priority=seed_priority(lastmod, now), cb_kwargs={'depth': 1},
+                                     meta={'vibe_seed': {'source': kind,
+                                                         'lastmod': lastmod.isoformat() if lastmod else None}})
         
         def process_links(self, links):
-            """Process links to normalize URLs and apply depth limiting."""
+            """Drop fragments and links into crawler traps, and count the links canonicalization merges."""
             processed_links = []
             
             for link in links:
@@ -170,12 +581,25 @@ if SCRAPY_AVAILABLE:
                     continue
                 
                 try:
-                    # Normalize the URL
-                    url = urldefrag(link.url)[0]  # Remove fragments
+                    # The link is requested as written, less its fragment; the
+                    # request fingerprint dedups it by its canonical form
+                    url = urldefrag(link.url)[0]
+                    canonical_url = self.canonicalizer.canonicalize(url)
+                    if canonical_url != url:
+                        self.canonical_stats['links_rewritten'] += 1
+                    if self.request_canonicalizer.canonicalize(url) != url:
+                        digest = hashlib.md5(url.encode()).digest()[:8]
+                        if digest not in self._rewritten_urls:
+                            self._rewritten_urls.add(digest)
+                            self.crawler.stats.inc_value('vibe/canonicalize/fetches_saved')
                     
-                    # Remove trailing slashes for consistency
-                    if url.endswith('/'):
-                        url = url[:-1]
+                    # Leave out links into calendars, filters and other endless URL spaces
+                    if self.trap_detector is not None:
+                        decision = self.trap_detector.check(canonical_url)
+                        if decision != FOLLOW:
+                            self.crawler.stats.inc_value('vibe/traps/links_pruned' if decision == PRUNE
+                                                         else 'vibe/traps/links_throttled')
+                            continue
                     
                     # Update the link
                     link.url = url
@@ -185,29 +609,183 @@ if SCRAPY_AVAILABLE:
             
             return processed_links
         
+        def process_request(self, request, response):
+            """Drop links found on near-duplicate pages, pages fetched before a resume and known pages left out of the revisit plan."""
+            if self.skip_near_duplicate_links and response.meta.get('vibe_near_duplicate_of'):
+                self.near_duplicate_stats['requests_skipped'] += 1
+                self.crawler.stats.inc_value('vibe/near_duplicates/requests_skipped')
+                return None
+            url = self.canonicalizer.canonicalize(request.url)
+            if url in self.resume_crawled:
+                # Fetched before the crawl was interrupted
+                return None
+            if url in self.revisit_skip:
+                # Seen in an earlier run and not expected to have changed enough to be worth a fetch
+                self.revisit_stats['requests_skipped'] += 1
+                self.crawler.stats.inc_value('vibe/revisit/skipped')
+                return None
+            if self.url_scorer is not None:
+                score = self.url_scorer.score(request.url, anchor_text=request.meta.get('link_text', ''),
+                                              depth=response.meta.get('depth', 0) + 1,
+                                              parent_score=response.meta.get('vibe_score'))
+                request.priority = self.url_scorer.priority(score)
+                request.meta['vibe_score'] = score
+            return request
+        
+        def _find_near_duplicate(self, response, url):
+            """Fingerprint the page text and return (fingerprint, near-duplicate URL or None)."""
+            fingerprint = text_fingerprint(self.parsed(response).text())
+            if fingerprint is None:
+                return None, None
+            
+            match = self.simhash_index.find(fingerprint)
+            if match is not None and match[0] != url:
+                return fingerprint, match[0]
+            if match is None:
+                # Only distinct pages are indexed, so each cluster keeps its first page
+                self.simhash_index.add(fingerprint, url)
+            return fingerprint, None
+        
+        def parsed(self, response):
+            """Return the ParsedResponse of a text response, creating it on first use."""
+            parsed = self.parsed_responses.get(response)
+            if parsed is None:
+                parsed = self.parsed_responses[response] = ParsedResponse(response, self.parse_timings)
+            return parsed
+        
+        def _requests_to_follow(self, response):
+            """
+            Follow the links of a page, extracted from its ParsedResponse, and the
+            stored links of unchanged pages, which arrive without a body.
+            """
+            stored_links = response.meta.get('vibe_stored_links')
+            if response.status != 304 or stored_links is None:
+                # As CrawlSpider._requests_to_follow, with each extractor's links cached
+                if not isinstance(response, HtmlResponse):
+                    return
+                parsed = self.parsed(response)
+                seen = set()
+                for rule_index, rule in enumerate(self._rules):
+                    links = [link for link in parsed.links(rule.link_extractor) if link not in seen]
+                    for link in rule.process_links(links):
+                        seen.add(link)
+                        yield rule.process_request(self._build_request(rule_index, link), response)
+                return
+            
+            links = [Link(response.urljoin(href)) for href in stored_links
+                     if not href.startswith(('mailto:', 'tel:', 'fax:', 'javascript:'))]
+            for rule_index, rule in enumerate(self._rules):
+                for link in rule.process_links(links):
+                    yield rule.process_request(self._build_request(rule_index, link), response)
+        
+        def _parse_not_modified(self, response, url, depth):
+            """Record a page the server reported as unchanged (HTTP 304) without rewriting it."""
+            previous = self.index_reader.get_page(url) if self.index_reader else None
+            if previous is None:
+                logger.warning(f"Got 304 for {url} but it is not in the crawl index")
+                return None
+            
+            links = self.index_reader.get_links(url)
+            response.meta['vibe_stored_links'] = links
+            logger.info(f"Not modified [{self.stats['pages_crawled'] + 1}]: {url} (depth {depth})")
+            
+            etag, last_modified = self.validators.get(url, (None, None))
+            seed = response.meta.get('vibe_seed') or {}
+            url_entry = {
+                "last_visit": datetime.now().isoformat(),
+                "depth": depth,
+                "hash": previous["hash"],
+                "links": links,
+                "html_length": previous["html_length"],
+                "content_hash": previous["content_hash"],
+                "etag": self._header(response, 'ETag') or etag,
+                "last_modified": self._header(response, 'Last-Modified') or last_modified,
+                "not_modified": True,
+                "sitemap_lastmod": seed.get('lastmod') or previous["sitemap_lastmod"],
+                "url_template": previous["url_template"] or url_template(url),
+                "is_article": previous["is_article"]
+            }
+            self.metadata["crawled_urls"][url] = url_entry
+            
+            self.stats['pages_crawled'] += 1
+            self._count_yield(url, url_entry["url_template"], previous["is_article"])
+            self.conditional_get_stats['not_modified'] += 1
+            self.conditional_get_stats['bytes_saved'] += previous["html_length"] or 0
+            
+            # No body: the pipeline only updates the journal and index
+            return {
+                "url": url,
+                "depth": depth,
+                "links": links,
+                "html_length": previous["html_length"],
+                "hash": previous["hash"],
+                "not_modified": True,
+                "status": response.status,
+                "headers": response.headers,
+                "url_entry": url_entry
+            }
+        
+        @staticmethod
+        def _header(response, name):
+            value = response.headers.get(name)
+            return value.decode('latin-1') if value else None
+        
         def parse_item(self, response, depth=1):
             """Parse a crawled page and save its data."""
             # Check depth
             if depth > self.max_depth:
                 return
             
-            url = response.url
+            # Redirects can land on a non-canonical URL
+            url = self.canonicalizer.canonicalize(response.url)
+            
+            if response.status == 304:
+                return self._parse_not_modified(response, url, depth)
             logger.info(f"Crawling [{self.stats['pages_crawled'] + 1}]: {url} (depth {depth})")
             
-            # Extract content
-            html_content = response.body.decode('utf-8', errors='replace')
+            # Keep the original bytes; Scrapy detects the encoding from the
+            # BOM, Content-Type header and <meta> tags and decodes lazily
+            body = response.body
+            is_text = isinstance(response, TextResponse)
+            encoding = response.encoding if is_text else None
+            
+            # Create a hash of the URL for the storage key
+            url_hash = url_to_hash(url)
+            
+            # Hash the body so identical pages under different URLs can share storage
+            content_hash = hash_content(body)
+            duplicate_of = self.content_hashes.get(content_hash)
+            if duplicate_of is None:
+                self.content_hashes[content_hash] = url
+                self.dedup_stats['unique_bodies'] += 1
+            elif duplicate_of != url:
+                self.dedup_stats['duplicate_bodies'] += 1
+                self.dedup_stats['duplicate_bytes'] += len(body)
+                self.crawler.stats.inc_value('vibe/dedup/duplicate_bodies')
+            
+            # Extract links (only text responses can be parsed); the tree is shared
+            # with the rules' link extraction and the steps below
+            parsed = self.parsed(response) if is_text else None
+            links = parsed.hrefs() if is_text else []
             
-            # Create a hash of the URL for the file path
-            url_hash = hashlib.md5(url.encode()).hexdigest()
-            page_dir = os.path.join(self.save_path, url_hash)
-            os.makedirs(page_dir, exist_ok=True)
+            # Flag pages whose text is nearly identical to a page seen earlier
+            fingerprint = near_duplicate_of = None
+            if self.simhash_index is not None and is_text:
+                fingerprint, near_duplicate_of = self._find_near_duplicate(response, url)
+                if near_duplicate_of is not None:
+                    response.meta['vibe_near_duplicate_of'] = near_duplicate_of
+                    self.near_duplicate_stats['near_duplicates'] += 1
+                    self.crawler.stats.inc_value('vibe/near_duplicates/pages')
             
-            # Save the HTML content
-            with open(os.path.join(page_dir, "page.html"), 'w', encoding='utf-8') as f:
-                f.write(html_content)
+            # Articles are the useful pages the URL scorer learns to find
+            template = url_template(url)
+            is_article = is_text and parsed.is_article()
             
-            # Extract links
-            links = [link for link in response.css('a::attr(href)').getall()]
+            # Templates whose pages stop bringing new content are throttled or pruned
+            if self.trap_detector is not None:
+                new_content = (duplicate_of in (None, url) and near_duplicate_of is None
+                               and (not is_text or self.trap_detector.is_new_text(parsed.text())))
+                self.trap_detector.record_fetch(url, new_content)
             
             # Save page metadata
             page_metadata = {
@@ -215,51 +793,98 @@ if SCRAPY_AVAILABLE:
                 "crawl_time": datetime.now().isoformat(),
                 "depth": depth,
                 "links": links,
-                "html_length": len(html_content)
+                "html_length": len(body),
+                "encoding": encoding,
+                "content_hash": content_hash,
+                "is_article": is_article
             }
-            
-            with open(os.path.join(page_dir, "metadata.json"), 'w', encoding='utf-8') as f:
-                json.dump(page_metadata, f, indent=2)
+            if self.extract_fields and is_text:
+                # Written to extracted.json while the tree is at hand, so processing
+                # does not parse the page again
+                page_metadata["extracted"] = parsed.extracted()
+            if duplicate_of is not None and duplicate_of != url:
+                page_metadata["duplicate_of"] = duplicate_of
+            if fingerprint is not None:
+                page_metadata["simhash"] = f"{fingerprint:016x}"
+            if near_duplicate_of is not None:
+                page_metadata["near_duplicate_of"] = near_duplicate_of
+            seed = response.meta.get('vibe_seed')
+            if seed is not None:
+                page_metadata["seed_source"] = seed['source']
+                page_metadata["sitemap_lastmod"] = seed['lastmod']
             
             # Update global metadata
-            self.metadata["crawled_urls"][url] = {
+            url_entry = {
                 "last_visit": datetime.now().isoformat(),
                 "depth": depth,
                 "hash": url_hash,
                 "links": links,
-                "html_length": len(html_content)
+                "html_length": len(body),
+                "content_hash": content_hash,
+                "url_template": template,
+                "is_article": int(is_article)
             }
+            if near_duplicate_of is not None:
+                url_entry["near_duplicate_of"] = near_duplicate_of
             
-            # Save metadata after each page
-            try:
-                self._update_metadata()
-            except Exception as e:
-                logger.warning(f"Error updating metadata: {str(e)}")
+            # Cache validators for conditional requests in later runs
+            etag = self._header(response, 'ETag')
+            last_modified = self._header(response, 'Last-Modified')
+            if etag:
+                url_entry["etag"] = etag
+            if last_modified:
+                url_entry["last_modified"] = last_modified
+            if seed is not None and seed['lastmod']:
+                url_entry["sitemap_lastmod"] = seed['lastmod']
+            self.metadata["crawled_urls"][url] = url_entry
             
             # Update the statistics
             self.stats['pages_crawled'] += 1
+            self._count_yield(url, template, is_article)
             
             # Check if we need to follow links at this depth
             if depth < self.max_depth:
                 # The CrawlSpider will handle following links based on the rules
                 pass
             
-            # Return item for the pipeline
+            # Return item for the pipeline; PageWriterPipeline writes the body,
+            # page metadata, journal entry and index row off the reactor thread
             return {
                 "url": url,
                 "depth": depth,
                 "links": links,
-                "html_length": len(html_content)
+                "html_length": len(body),
+                "hash": url_hash,
+                "body": body,
+                "status": response.status,
+                "headers": response.headers,
+                "page_metadata": page_metadata,
+                "url_entry": url_entry
             }
             
         def closed(self, reason):
             """Called when the crawler is closed."""
-            # Update and save the metadata one last time
+            # Compact the journal into metadata.json (the page writer has drained by now)
             try:
                 self._update_metadata()
                 logger.info(f"Crawl finished, processed {self.stats['pages_crawled']} pages")
+                dedup = self.metadata["crawl_stats"]["dedup"]
+                logger.info(f"Body dedup: {dedup['unique_bodies']} unique, {dedup['duplicate_bodies']} duplicate "
+                            f"(ratio {dedup['dedup_ratio']:.2f}, {dedup['duplicate_bytes']} bytes)")
             except Exception as e:
                 logger.error(f"Error saving final metadata: {str(e)}")
+            
+            self.page_store.close()
+            
+            # Commit the remaining pages and close the run in the index
+            try:
+                if self.index_reader is not None:
+                    self.index_reader.close()
+                self.index.finish_run(self.run_id, self.stats['pages_crawled'],
+                                      stats=self.metadata.get("crawl_stats"))
+                self.index.close()
+            except Exception as e:
+                logger.error(f"Error finalizing crawl index: {str(e)}")
 
 
 def crawl_with_scrapy(
@@ -277,7 +902,32 @@ def crawl_with_scrapy(
     generate_graph=False,
     graph_type=None,
     enable_caching=False,
-    force_recrawl=True
+    force_recrawl=True,
+    storage="directory",
+    compression="none",
+    deduplicate_bodies=False,
+    near_duplicate_distance=None,
+    skip_near_duplicate_links=False,
+    canonical_rules=None,
+    state_path=None,
+    incremental=False,
+    revisit_budget=None,
+    discover_seeds=False,
+    seed_urls=None,
+    seed_max_age_days=None,
+    url_scorer=None,
+    adaptive_throttle=False,
+    throttle_limits=None,
+    shared_frontier=None,
+    resume=False,
+    checkpoint_interval=60,
+    runner=None,
+    page_stream=None,
+    extract_fields=False,
+    content_types=None,
+    max_body_sizes=None,
+    host_cache=True,
+    trap_detection=True
 ):
     """
     Crawl a website using Scrapy.
@@ -297,10 +947,72 @@ def crawl_with_scrapy(
         generate_graph: Not used in this version
         graph_type: Not used in this version
         enable_caching: Whether to enable HTTP caching (default: False)
-        force_recrawl: Force recrawling pages even if they have been visited before
+        force_recrawl: Discard the metadata, index and HTTP cache of previous runs
+            (requests are still deduplicated within the run)
+        storage: Page storage layout, 'directory' (one directory per page) or
+            'segments' (pages packed into rolling segment files)
+        compression: Codec for stored page bodies, 'none', 'gzip' or 'zstd'
+        deduplicate_bodies: Store identical page bodies once, keyed by content hash
+        near_duplicate_distance: Flag pages whose text SimHash is within this many
+            bits of an earlier page (None disables near-duplicate detection)
+        skip_near_duplicate_links: Don't follow links found on near-duplicate pages
+        canonical_rules: Per-domain URL canonicalization rules, e.g.
+            {"example.com": {"drop": ["ref"]}} (see vibe_scraping.canonicalize)
+        state_path: Directory for the crawl index (default: save_path); keep it
+            outside save_path when save_path is removed between runs
+        incremental: Send conditional requests (If-None-Match / If-Modified-Since)
+            using validators from earlier runs; unchanged pages are not rewritten
+        revisit_budget: Revisit at most this many known pages, chosen by expected
+            freshness gain from their change history; other known pages are skipped
+            and new pages are always fetched (None revisits everything it finds)
+        discover_seeds: Seed the frontier from the sitemaps in robots.txt, /sitemap.xml
+            and the RSS/Atom feeds the start pages advertise; listed pages are
+            fetched before link discovery, newest first
+        seed_urls: Extra sitemap, sitemap index or feed URLs to seed from
+        seed_max_age_days: Ignore seed entries dated more than this many days ago
+        url_scorer: Fetch the most promising links first instead of breadth-first:
+            'article' (built-in heuristic for article-shaped URLs), a URLScorer
+            instance or a dotted path to a URLScorer subclass (see vibe_scraping.scoring)
+        adaptive_throttle: Adjust each host's concurrency and delay from its latency,
+            errors and 429/503 responses instead of the fixed limits; the state is
+            kept in state_path and the next crawl starts from it
+        throttle_limits: Per-domain floors and ceilings for the adaptive throttle, e.g.
+            {"example.com": {"max_concurrency": 2, "min_delay": 1.0}}
+        shared_frontier: Path to a frontier database shared with other crawler processes
+            working on the same crawl (see vibe_scraping.frontier); URLs are leased
+            from it and fetched by one process only. Each process needs its own
+            save_path and state_path
+        resume: Continue the crawl interrupted last time (from the checkpoint in
+            state_path/job) instead of starting over; a crawl that finished or
+            has no checkpoint starts afresh
+        checkpoint_interval: Seconds between checkpoints of the crawl's progress
+        runner: CrawlerRunner of a running reactor (see vibe_scraping.daemon); the
+            crawl is scheduled on it and shares its connection pool and robots.txt
+            cache with the runner's other crawls, instead of running in a
+            CrawlerProcess that blocks until it finishes
+        page_stream: PageStream to pass a record of every page to as it is parsed
+            (see vibe_scraping.stream); the consumer's pace holds the crawl back
+        extract_fields: Extract each page's visible text, title, meta description,
+            canonical link, og:* tags and publish date from the tree the crawl
+            parsed anyway and store them next to the page (extracted.json), so
+            HTMLProcessor does not parse the page again
+        content_types: Media types to download (default: text/html and
+            application/xhtml+xml); other responses are dropped as soon as their
+            headers arrive. An empty list downloads every type
+        max_body_sizes: Largest body in bytes per media type, '*' for the others
+            (default: 10 MB); larger responses are dropped or cut off
+        host_cache: Reuse the robots.txt files and DNS results of earlier crawls on
+            this host, kept in a database shared by all of them: True for the
+            default location (~/.cache/vibe-scraping/hostcache.db), a database
+            path, or False to fetch and resolve everything afresh
+        trap_detection: Prune and throttle links into crawler traps (calendars,
+            faceted filters, endless pagination): True for the default limits, a
+            dictionary of TrapDetector arguments to tune them (see
+            vibe_scraping.traps), or False to follow every link
         
     Returns:
-        Dictionary with crawl statistics or int with pages crawled count
+        Dictionary with crawl statistics or int with pages crawled count, or a
+        Deferred firing with it when a runner is given
     """
     # Check if Scrapy is available
     if not SCRAPY_AVAILABLE:
@@ -326,9 +1038,27 @@ def crawl_with_scrapy(
     if not os.path.exists(save_path):
         os.makedirs(save_path)
     
+    # Every crawl keeps a resumable job (Scrapy's JOBDIR plus a checkpoint) in
+    # the state directory; a new crawl discards the previous one's
+    jobdir = os.path.join(state_path or save_path, CHECKPOINT_DIRNAME)
+    checkpoint = load_checkpoint(jobdir) if resume else None
+    if checkpoint is not None and not is_resumable(checkpoint):
+        logger.info(f"The last crawl ended ({checkpoint.get('reason')}); starting a new one")
+        checkpoint = None
+    if checkpoint is None:
+        clear_job(jobdir)
+    elif checkpoint.get('reason') is None:
+        # Scrapy only writes its queue state on a clean close
+        logger.warning(f"The last crawl was killed; discarding its request queue and rebuilding "
+                       f"the frontier from the crawl index")
+        clear_job(jobdir, keep_checkpoint=True)
+    else:
+        logger.info(f"Resuming the crawl stopped by {checkpoint['reason']} "
+                    f"({checkpoint.get('pages_crawled', 0)} pages crawled)")
+    
     # If force_recrawl, clear Scrapy's HTTP cache if it exists
     httpcache_dir = os.path.join(save_path, "httpcache")
-    if force_recrawl and os.path.exists(httpcache_dir):
+    if force_recrawl and checkpoint is None and os.path.exists(httpcache_dir):
         logger.info(f"Force recrawl: clearing HTTP cache directory {httpcache_dir}")
         try:
             import shutil
@@ -341,9 +1071,11 @@ def crawl_with_scrapy(
         'USER_AGENT': user_agent or 'vibe-scraper (+https://github.com/l0rtk/vibe-scraping)',
         'ROBOTSTXT_OBEY': respect_robots_txt,
         'DOWNLOAD_DELAY': delay,
-        'CLOSESPIDER_PAGECOUNT': max_pages,
+        # A resumed crawl only has what is left of the page budget
+        'CLOSESPIDER_PAGECOUNT': max(max_pages - (checkpoint or {}).get('pages_crawled', 0), 1),
         'DEPTH_LIMIT': max_depth,
-        'DEPTH_PRIORITY': 1,
+        # Breadth-first unless a URL scorer sets the priorities (depth is one of its inputs)
+        'DEPTH_PRIORITY': 1 if url_scorer is None else 0,
         'SCHEDULER_DISK_QUEUE': 'scrapy.squeues.PickleFifoDiskQueue',
         'SCHEDULER_MEMORY_QUEUE': 'scrapy.squeues.FifoMemoryQueue',
         'COOKIES_ENABLED': True,
@@ -357,48 +1089,149 @@ def crawl_with_scrapy(
         'CONCURRENT_REQUESTS_PER_DOMAIN': 8,
         'RETRY_ENABLED': True,
         'RETRY_TIMES': 3,
-        'RETRY_HTTP_CODES': [500, 502, 503, 504, 408],
-        # Use BaseDupeFilter with force_recrawl to avoid skipping URLs
-        'DUPEFILTER_CLASS': 'scrapy.dupefilters.BaseDupeFilter' if force_recrawl else 'scrapy.dupefilters.RFPDupeFilter',
+        'RETRY_HTTP_CODES': [500, 502, 503, 504, 408, 429],
+        # Deduplicate requests within the run in a memory-bounded Bloom filter;
+        # force_recrawl only discards what previous runs stored
+        'DUPEFILTER_CLASS': 'vibe_scraping.dupefilter.BloomDupeFilter',
+        'BLOOM_DUPEFILTER_CAPACITY': max(max_pages * 20, 100000),
+        'BLOOM_DUPEFILTER_ERROR_RATE': 0.001,
+        # Fingerprint requests by their canonical URL
+        'REQUEST_FINGERPRINTER_CLASS': 'vibe_scraping.canonicalize.CanonicalRequestFingerprinter',
+        'URL_CANONICAL_RULES': canonical_rules or {},
+        # Persist pages on a background writer thread instead of the reactor
+        'ITEM_PIPELINES': {'vibe_scraping.pipelines.PageWriterPipeline': 300},
+        'PAGE_WRITER_QUEUE_SIZE': 256,
+        'PAGE_WRITER_BATCH_SIZE': 50,
+        'PAGE_WRITER_FSYNC': True,
+        'JOBDIR': jobdir,
+        'EXTENSIONS': {'vibe_scraping.checkpoint.CheckpointExtension': 500},
+        'CHECKPOINT_INTERVAL': checkpoint_interval,
+        'DOWNLOADER_MIDDLEWARES': {
+            'vibe_scraping.middlewares.ConditionalRequestMiddleware': 560,
+            # After RetryMiddleware (550) so every attempt is seen
+            'vibe_scraping.middlewares.AdaptiveThrottleMiddleware': 580,
+            # Closest to the downloader so it sees dropped downloads first
+            'vibe_scraping.middlewares.ContentGateMiddleware': 590,
+        },
+        # Drop non-HTML and oversized responses once their headers arrive
+        'CONTENT_GATE_ENABLED': content_types != [],
+        'CONTENT_GATE_TYPES': list(content_types or HTML_CONTENT_TYPES),
+        'CONTENT_GATE_MAX_SIZES': max_body_sizes or DEFAULT_MAX_BODY_SIZES,
     }
     
+    # Take robots.txt files and addresses from the cache shared by the crawls on
+    # this host, so the first requests to a known host go out without waiting
+    host_cache_path = default_host_cache_path() if host_cache is True else host_cache or None
+    settings['DOWNLOADER_MIDDLEWARES'].update({
+        'scrapy.downloadermiddlewares.robotstxt.RobotsTxtMiddleware': None,
+        'vibe_scraping.hostcache.CachedRobotsTxtMiddleware': 100,
+    })
+    if host_cache_path:
+        settings['HOST_CACHE_PATH'] = host_cache_path
+        settings[RESOLVER_SETTING] = 'vibe_scraping.hostcache.PersistentCachingResolver'
+    
+    # Per-host AIMD throttling replaces the fixed per-domain limits; the global
+    # limit only caps the sum over hosts
+    if adaptive_throttle:
+        settings.update({
+            'ADAPTIVE_THROTTLE_ENABLED': True,
+            'ADAPTIVE_THROTTLE_STATE_PATH': os.path.join(state_path or save_path, THROTTLE_STATE_FILENAME),
+            'ADAPTIVE_THROTTLE_HOST_LIMITS': throttle_limits or {},
+            'CONCURRENT_REQUESTS': 64,
+        })
+    
+    # Queue and deduplicate requests in the frontier shared with the other workers
+    if shared_frontier:
+        settings.update({
+            'SCHEDULER': 'vibe_scraping.frontier.SharedFrontierScheduler',
+            'SHARED_FRONTIER_PATH': shared_frontier,
+        })
+    
+    # Hand page records to the stream's consumer before the writer takes the body
+    if page_stream is not None:
+        settings['ITEM_PIPELINES'] = dict(settings['ITEM_PIPELINES'], **{
+            'vibe_scraping.pipelines.PageStreamPipeline': 200,
+        })
+    
+    # Crawls on a daemon's runner share its connection pool
+    if runner is not None:
+        settings['DOWNLOAD_HANDLERS'] = {scheme: 'vibe_scraping.daemon.SharedPoolDownloadHandler'
+                                         for scheme in ('http', 'https')}
+    
     # Update with additional settings if provided
     if additional_settings:
         settings.update(additional_settings)
     
-    # Create a crawler process
-    process = CrawlerProcess(settings)
-    
-    # Start the crawler
-    process.crawl(
-        VibeCrawlSpider,
+    spider_kwargs = dict(
         start_url=start_url,
         start_urls=urls,
         max_depth=max_depth,
         follow_subdomains=follow_external_links,
         respect_robots=respect_robots_txt,
         save_path=save_path,
-        force_recrawl=force_recrawl
+        force_recrawl=force_recrawl,
+        storage=storage,
+        compression=compression,
+        deduplicate_bodies=deduplicate_bodies,
+        near_duplicate_distance=near_duplicate_distance,
+        skip_near_duplicate_links=skip_near_duplicate_links,
+        canonical_rules=canonical_rules,
+        state_path=state_path,
+        incremental=incremental,
+        revisit_budget=revisit_budget,
+        discover_seeds=discover_seeds,
+        seed_urls=seed_urls,
+        seed_max_age_days=seed_max_age_days,
+        url_scorer=url_scorer,
+        resume_checkpoint=checkpoint,
+        page_stream=page_stream,
+        extract_fields=extract_fields,
+        trap_detection=trap_detection
     )
     
-    # Run the crawler and wait until it finishes
-    process.start()
-    
-    # Load the metadata file to get statistics
-    metadata_file = os.path.join(save_path, "metadata.json")
-    try:
-        with open(metadata_file, 'r') as f:
-            metadata = json.load(f)
+    def crawl_summary(_=None):
+        """Read the statistics of the finished crawl from its metadata."""
+        final_checkpoint = load_checkpoint(jobdir)
         
-        # Return a dictionary with crawl statistics
-        return {
-            'pages_crawled': metadata.get('pages_crawled', 0),
-            'start_urls': urls,
-            'max_depth': max_depth,
-            'max_pages': max_pages,
-            'save_path': save_path
-        }
-    except Exception as e:
-        logger.error(f"Error loading metadata: {str(e)}")
-        # Fallback to returning just the count or 0 if it couldn't be determined
-        return metadata.get('pages_crawled', 0) if 'metadata' in locals() else 0 
\ No newline at end of file
+        # Load the metadata file (or the journal, if compaction failed) to get statistics
+        try:
+            metadata = load_crawl_metadata(save_path)
+            if metadata is None:
+                raise FileNotFoundError(f"No metadata found in {save_path}")
+            
+            # Return a dictionary with crawl statistics
+            return {
+                'pages_crawled': metadata.get('pages_crawled', 0),
+                'start_urls': urls,
+                'max_depth': max_depth,
+                'max_pages': max_pages,
+                'save_path': save_path,
+                'dedup': metadata.get('crawl_stats', {}).get('dedup', {}),
+                'near_duplicates': metadata.get('crawl_stats', {}).get('near_duplicates', {}),
+                'canonicalization': metadata.get('crawl_stats', {}).get('canonicalization', {}),
+                'conditional_get': metadata.get('crawl_stats', {}).get('conditional_get', {}),
+                'revisit': metadata.get('crawl_stats', {}).get('revisit', {}),
+                'seeds': metadata.get('crawl_stats', {}).get('seeds', {}),
+                'yield': metadata.get('crawl_stats', {}).get('yield', {}),
+                'throttle': metadata.get('crawl_stats', {}).get('throttle', {}),
+                'frontier': metadata.get('crawl_stats', {}).get('frontier', {}),
+                'content_gate': metadata.get('crawl_stats', {}).get('content_gate', {}),
+                'traps': metadata.get('crawl_stats', {}).get('traps', {}),
+                'resumed': checkpoint is not None,
+                'interrupted': final_checkpoint is not None and is_resumable(final_checkpoint)
+            }
+        except Exception as e:
+            logger.error(f"Error loading metadata: {str(e)}")
+            # Fallback to returning just the count or 0 if it couldn't be determined
+            return metadata.get('pages_crawled', 0) if 'metadata' in locals() else 0
+    
+    # Daemon mode: schedule the crawl on the runner's reactor, which keeps running
+    if runner is not None:
+        crawler = Crawler(VibeCrawlSpider, settings)
+        return runner.crawl(crawler, **spider_kwargs).addCallback(crawl_summary)
+    
+    # Create a crawler process, run the crawler and wait until it finishes
+    process = CrawlerProcess(settings)
+    process.crawl(VibeCrawlSpider, **spider_kwargs)
+    process.start()
+    return crawl_summary() 
\ No newline at end of file
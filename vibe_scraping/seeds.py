@@ -0,0 +1,229 @@
+"""
+Sitemap and feed seeding for vibe-scraping.
+
+Parsers for the documents sites publish to announce their pages: the
+``Sitemap:`` lines of robots.txt, XML sitemaps and sitemap index files (plain
+or gzipped), and RSS 1.0/2.0 and Atom feeds. Each yields the listed URLs with
+their last-modified dates, which the spider uses to seed its frontier ahead of
+link discovery, newest first.
+"""
+
+import gzip
+import logging
+from io import BytesIO
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urljoin
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# lxml ships with Scrapy; without it no seed documents can be parsed
+try:
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+    logger.warning("lxml is not installed. Install with: pip install lxml")
+
+# Document kinds returned by parse_seed_document
+URLSET = "urlset"
+SITEMAP_INDEX = "sitemapindex"
+FEED = "feed"
+
+# Largest decompressed sitemap accepted (the sitemap protocol allows 50 MB)
+MAX_SITEMAP_SIZE = 50 * 1024 * 1024
+
+# Request priority of seeded pages; recent pages get up to RECENCY_BUCKETS more
+SEED_PRIORITY = 100
+RECENCY_BUCKETS = 16
+
+FEED_CONTENT_TYPES = ("application/rss+xml", "application/atom+xml", "application/rdf+xml")
+
+
+def parse_lastmod(value):
+    """
+    Parse a sitemap or feed date.
+
+    Accepts W3C datetimes (sitemaps, Atom, Dublin Core) and RFC 822 dates (RSS).
+
+    Args:
+        value: Date string
+
+    Returns:
+        Timezone-aware UTC datetime, or None if the value cannot be parsed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith(("Z", "z")) else value)
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return None
+        if parsed is None:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def seed_priority(lastmod, now=None):
+    """
+    Return the request priority of a seeded page.
+
+    Pages are bucketed by the log2 of their age in hours, so the newest pages
+    go first while the scheduler only keeps a handful of priority queues.
+    Undated pages get the base SEED_PRIORITY.
+
+    Args:
+        lastmod: Last-modified datetime of the page, or None
+        now: Reference time (default: the current time)
+    """
+    if lastmod is None:
+        return SEED_PRIORITY
+    now = now or datetime.now(timezone.utc)
+    age_hours = max(0, int((now - lastmod).total_seconds() // 3600))
+    return SEED_PRIORITY + RECENCY_BUCKETS - min(age_hours.bit_length(), RECENCY_BUCKETS)
+
+
+def sitemap_urls_from_robots(text, base_url=None):
+    """
+    Return the sitemap URLs listed in a robots.txt file.
+
+    Args:
+        text: robots.txt content
+        base_url: URL of the robots.txt file, used to resolve relative entries
+    """
+    urls = []
+    for line in text.splitlines():
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "sitemap" and value.strip():
+            url = value.split("#", 1)[0].strip()
+            urls.append(urljoin(base_url, url) if base_url else url)
+    return urls
+
+
+def maybe_gunzip(body, max_size=MAX_SITEMAP_SIZE):
+    """
+    Decompress a gzipped body (e.g. sitemap.xml.gz); other bodies are returned unchanged.
+
+    Raises:
+        ValueError: If the decompressed body exceeds max_size or is corrupt
+    """
+    if body[:2] != b"\x1f\x8b":
+        return body
+    try:
+        with gzip.GzipFile(fileobj=BytesIO(body)) as f:
+            data = f.read(max_size + 1)
+    except (OSError, EOFError) as e:
+        raise ValueError(f"Corrupt gzip data: {e}")
+    if len(data) > max_size:
+        raise ValueError(f"Decompressed document is larger than {max_size} bytes")
+    return data
+
+
+def _local(tag):
+    """Return an element tag without its namespace."""
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+def _child_text(element, *names):
+    """Return the stripped text of the first child with one of the given local names."""
+    for name in names:
+        for child in element:
+            if _local(child.tag) == name and child.text and child.text.strip():
+                return child.text.strip()
+    return None
+
+
+def _sitemap_entries(root):
+    for entry in root:
+        if _local(entry.tag) not in ("url", "sitemap"):
+            continue
+        loc = _child_text(entry, "loc")
+        if not loc:
+            continue
+        lastmod = _child_text(entry, "lastmod")
+        if lastmod is None:
+            # Google News sitemaps date entries in a nested <news:news> element
+            for child in entry:
+                if _local(child.tag) == "news":
+                    lastmod = _child_text(child, "publication_date")
+        yield loc, parse_lastmod(lastmod)
+
+
+def _rss_entries(root):
+    for item in root.iter():
+        if _local(item.tag) != "item":
+            continue
+        link = _child_text(item, "link")
+        if not link:
+            for child in item:
+                if _local(child.tag) == "guid" and child.get("isPermaLink", "true") == "true":
+                    link = (child.text or "").strip() or None
+        if link:
+            yield link, parse_lastmod(_child_text(item, "pubDate", "date", "updated"))
+
+
+def _atom_entries(root):
+    for entry in root:
+        if _local(entry.tag) != "entry":
+            continue
+        link = None
+        for child in entry:
+            if _local(child.tag) == "link" and child.get("rel", "alternate") == "alternate" and child.get("href"):
+                link = child.get("href")
+                break
+        if link:
+            yield link, parse_lastmod(_child_text(entry, "updated", "published"))
+
+
+def parse_seed_document(body, base_url=None):
+    """
+    Parse a sitemap, sitemap index or RSS/Atom feed.
+
+    Args:
+        body: Document bytes, optionally gzipped
+        base_url: URL of the document, used to resolve relative links
+
+    Returns:
+        Tuple of (kind, entries) where kind is URLSET, SITEMAP_INDEX or FEED
+        (None if the document is not recognized) and entries is a list of
+        (url, lastmod) tuples with lastmod a UTC datetime or None
+    """
+    if not LXML_AVAILABLE:
+        raise ImportError("lxml is not installed")
+
+    try:
+        body = maybe_gunzip(body)
+    except ValueError as e:
+        logger.warning(f"Skipping seed document {base_url}: {e}")
+        return None, []
+
+    # Never resolve entities or fetch external resources from untrusted XML
+    parser = etree.XMLParser(recover=True, remove_comments=True, resolve_entities=False, no_network=True)
+    try:
+        root = etree.fromstring(body.strip(), parser=parser)
+    except etree.XMLSyntaxError:
+        root = None
+    if root is None:
+        return None, []
+
+    root_tag = _local(root.tag)
+    if root_tag == "urlset":
+        kind, entries = URLSET, _sitemap_entries(root)
+    elif root_tag == "sitemapindex":
+        kind, entries = SITEMAP_INDEX, _sitemap_entries(root)
+    elif root_tag in ("rss", "RDF"):
+        kind, entries = FEED, _rss_entries(root)
+    elif root_tag == "feed":
+        kind, entries = FEED, _atom_entries(root)
+    else:
+        return None, []
+
+    if base_url:
+        return kind, [(urljoin(base_url, url), lastmod) for url, lastmod in entries]
+    return kind, list(entries)
@@ -0,0 +1,170 @@
+"""
+SimHash near-duplicate detection for vibe-scraping.
+
+Pages are fingerprinted with a 64-bit SimHash over word shingles of their
+visible text. :class:`SimHashIndex` finds a previously seen fingerprint within
+a small Hamming distance without comparing against every page: the
+fingerprint is split into ``max_distance + 1`` bands, and by the pigeonhole
+principle any fingerprint within the distance matches at least one band
+exactly, so each lookup only inspects the pages sharing a band.
+"""
+
+import re
+import hashlib
+import logging
+from collections import deque
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 4
+
+# Text nodes a reader would see; scripts, styles and templates are skipped
+VISIBLE_TEXT_XPATH = ("//body//text()[not(ancestor::script) and not(ancestor::style) "
+                      "and not(ancestor::noscript) and not(ancestor::template)]")
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def visible_text(response):
+    """Return the visible text of a Scrapy text response."""
+    return " ".join(response.xpath(VISIBLE_TEXT_XPATH).getall())
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """
+    Split text into overlapping word shingles.
+
+    Args:
+        text: Text to split
+        size: Number of words per shingle
+
+    Returns:
+        List of shingle strings (a single shingle for texts shorter than size)
+    """
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(features, bits=FINGERPRINT_BITS):
+    """
+    Compute the SimHash fingerprint of a collection of features.
+
+    Args:
+        features: Iterable of feature strings (e.g. shingles)
+        bits: Fingerprint size in bits (at most 64)
+
+    Returns:
+        Fingerprint as an int, or None if there are no features
+    """
+    hashes = [_feature_hash(feature) for feature in features]
+    if not hashes:
+        return None
+
+    # A bit is set when more than half of the feature hashes have it set
+    half = len(hashes) / 2
+    fingerprint = 0
+    for bit in range(bits):
+        if sum((h >> bit) & 1 for h in hashes) > half:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def text_fingerprint(text, shingle_size=SHINGLE_SIZE):
+    """Return the SimHash fingerprint of a text, or None if it has no words."""
+    return simhash(shingles(text, shingle_size))
+
+
+def hamming_distance(a, b):
+    """Return the number of differing bits between two fingerprints."""
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+    """
+    Bounded index of SimHash fingerprints with Hamming-distance lookup.
+
+    Once capacity fingerprints are stored, the oldest ones are evicted, so
+    memory stays constant on arbitrarily large crawls.
+    """
+
+    def __init__(self, max_distance=3, capacity=200000, bits=FINGERPRINT_BITS):
+        """
+        Initialize the index.
+
+        Args:
+            max_distance: Largest Hamming distance counted as a near-duplicate
+            capacity: Maximum number of fingerprints kept
+            bits: Fingerprint size in bits
+        """
+        self.max_distance = max_distance
+        self.capacity = capacity
+        self.bits = bits
+
+        # max_distance + 1 bands, as even as possible
+        band_count = max_distance + 1
+        band_width, extra = divmod(bits, band_count)
+        self._bands = []
+        shift = 0
+        for band in range(band_count):
+            width = band_width + (1 if band < extra else 0)
+            self._bands.append((shift, (1 << width) - 1))
+            shift += width
+
+        self._tables = [{} for _ in self._bands]
+        self._entries = deque()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _band_keys(self, fingerprint):
+        return [(fingerprint >> shift) & mask for shift, mask in self._bands]
+
+    def find(self, fingerprint):
+        """
+        Find a stored page whose fingerprint is within max_distance.
+
+        Returns:
+            Tuple of (key, distance) for the closest match, or None
+        """
+        best = None
+        for table, band_key in zip(self._tables, self._band_keys(fingerprint)):
+            for candidate, key in table.get(band_key, ()):
+                distance = hamming_distance(fingerprint, candidate)
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (key, distance)
+                    if distance == 0:
+                        return best
+        return best
+
+    def add(self, fingerprint, key):
+        """
+        Store a fingerprint, evicting the oldest one if the index is full.
+
+        Args:
+            fingerprint: SimHash fingerprint
+            key: Value returned by find for matching fingerprints (e.g. the URL)
+        """
+        if len(self._entries) >= self.capacity:
+            self._remove(*self._entries.popleft())
+
+        entry = (fingerprint, key)
+        for table, band_key in zip(self._tables, self._band_keys(fingerprint)):
+            table.setdefault(band_key, []).append(entry)
+        self._entries.append(entry)
+
+    def _remove(self, fingerprint, key):
+        for table, band_key in zip(self._tables, self._band_keys(fingerprint)):
+            bucket = table.get(band_key)
+            if not bucket:
+                continue
+            bucket.remove((fingerprint, key))
+            if not bucket:
+                del table[band_key]
@@ -0,0 +1,163 @@
+"""
+Streaming crawl results for vibe-scraping.
+
+:func:`stream_crawl` yields a record for every page as soon as the spider has
+parsed it, while the crawl goes on, so pages can be processed while their
+body is still in memory instead of being read back from the output directory
+once the crawl is over. The pages are still written to the output directory
+and crawl index as usual.
+
+The crawl runs on the reactor of a :class:`~vibe_scraping.daemon.CrawlDaemon`
+started on a background thread the first time a stream is opened (a reactor
+cannot be restarted, so later streams in the process reuse it).
+:class:`~vibe_scraping.pipelines.PageStreamPipeline` passes records through a
+bounded :class:`PageStream`; when the consumer falls behind, the crawl is held
+back, as it is for a slow disk.
+"""
+
+import logging
+import threading
+from collections import deque
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# The daemon whose background reactor runs streamed crawls
+_daemon = None
+_daemon_lock = threading.Lock()
+
+
+class PageStream:
+    """
+    Bounded hand-off of page records from the crawl to a consumer thread.
+
+    The crawl side (the reactor thread) offers records without blocking; the
+    consumer iterates the stream and calls on_space after taking each record,
+    so the crawl can offer the records it held back.
+    """
+
+    def __init__(self, maxsize=64):
+        """
+        Args:
+            maxsize: Records held for the consumer before the crawl is held back
+        """
+        self.maxsize = maxsize
+        self.crawler = None
+        self.on_space = None
+        self.finished = False
+        self.cancelled = False
+        self.summary = None
+        self.error = None
+        self._records = deque()
+        self._condition = threading.Condition()
+
+    def offer(self, record):
+        """
+        Add a record unless the stream is full.
+
+        Returns:
+            False if the stream is full (records of a cancelled stream are dropped)
+        """
+        with self._condition:
+            if self.cancelled:
+                return True
+            if len(self._records) >= self.maxsize:
+                return False
+            self._records.append(record)
+            self._condition.notify()
+            return True
+
+    def finish(self, summary=None, error=None):
+        """Mark the crawl as finished; the consumer stops once it has taken the remaining records."""
+        with self._condition:
+            self.finished = True
+            self.summary = summary
+            self.error = error
+            self._condition.notify_all()
+
+    def cancel(self):
+        """Drop the remaining records and any the crawl offers from now on."""
+        with self._condition:
+            self.cancelled = True
+            self._records.clear()
+        if self.on_space is not None:
+            self.on_space()
+
+    def wait_finished(self, timeout=None):
+        """Wait until the crawl has finished; returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.finished, timeout)
+
+    def __iter__(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._records or self.finished)
+                if not self._records:
+                    break
+                record = self._records.popleft()
+            if self.on_space is not None:
+                self.on_space()
+            yield record
+        if self.error is not None:
+            raise self.error
+
+
+def _background_daemon():
+    """Return the daemon of the streamed crawls, starting its reactor thread the first time."""
+    global _daemon
+    with _daemon_lock:
+        if _daemon is None:
+            from vibe_scraping.daemon import CrawlDaemon
+            _daemon = CrawlDaemon()
+            _daemon.start_in_thread()
+        return _daemon
+
+
+def stream_crawl(buffer_size=64, **crawl_args):
+    """
+    Crawl and yield a record for every page as it is fetched.
+
+    Each record is a dictionary with the page's url, depth, status, headers,
+    body (bytes, None for an unchanged page answered with 304), encoding,
+    links, content_hash, is_article, not_modified and crawl_time.
+
+    Leaving the loop early stops the crawl gracefully (it can be resumed with
+    resume=True). Must not be called on the reactor thread.
+
+    Args:
+        buffer_size: Records held for the consumer before the crawl is held back
+        **crawl_args: Keyword arguments of crawl_with_scrapy
+
+    Yields:
+        Page record dictionaries, in the order the pages were parsed
+
+    Returns:
+        The crawl statistics of crawl_with_scrapy (the value of StopIteration)
+    """
+    # The daemon installs the reactor Scrapy expects; import it only afterwards
+    daemon = _background_daemon()
+    from twisted.internet import reactor
+
+    stream = PageStream(buffer_size)
+
+    def start():
+        try:
+            crawl = daemon.crawl(page_stream=stream, **crawl_args)
+        except Exception as e:
+            stream.finish(error=e)
+            return
+        crawl.addCallbacks(lambda summary: stream.finish(summary),
+                           lambda failure: stream.finish(error=failure.value))
+
+    reactor.callFromThread(start)
+    try:
+        yield from stream
+    finally:
+        if not stream.finished:
+            # The consumer stopped early: stop the crawl and let it close cleanly
+            logger.info("Page stream closed; stopping its crawl")
+            stream.cancel()
+            if stream.crawler is not None:
+                reactor.callFromThread(stream.crawler.stop)
+            stream.wait_finished()
+    return stream.summary
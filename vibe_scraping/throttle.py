@@ -0,0 +1,262 @@
+"""
+Per-host adaptive throttling for vibe-scraping.
+
+:class:`ThrottleController` keeps a :class:`HostThrottle` per download slot
+(host) and adjusts its concurrency and download delay AIMD-style:
+
+- every window of clean, fast responses (as many as the current concurrency)
+  adds one concurrent request and shortens the delay;
+- a 429 or 503, a Retry-After header, or an error rate above the threshold
+  halves the concurrency and doubles the delay;
+- latency well above the host's baseline takes one request off the concurrency.
+
+Each decrease only reacts to requests sent after the previous one, so a burst
+of failures from requests already in flight counts once. Hosts stay within
+per-host floors and ceilings. The last known good concurrency and delay of
+each host are saved to a JSON file, and the next run starts from them.
+"""
+
+import os
+import json
+import logging
+from datetime import datetime
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATE_FILENAME = "throttle_state.json"
+
+# Smoothing factors of the latency and error rate moving averages
+LATENCY_SMOOTHING = 0.2
+ERROR_SMOOTHING = 0.1
+
+# Latency below this is never treated as congestion, however low the baseline
+MIN_SLOW_LATENCY = 0.5
+
+# Delay used for the first backoff of a host that had none
+MIN_BACKOFF_DELAY = 0.25
+
+
+class HostThrottle:
+    """Concurrency, delay and observed health of one host."""
+
+    def __init__(self, concurrency, delay, min_concurrency=1, max_concurrency=16,
+                 min_delay=0.0, max_delay=60.0, latency_factor=3.0, error_threshold=0.2):
+        """
+        Initialize the host state.
+
+        Args:
+            concurrency: Starting number of concurrent requests
+            delay: Starting delay between requests in seconds
+            min_concurrency, max_concurrency: Concurrency floor and ceiling
+            min_delay, max_delay: Delay floor and ceiling in seconds
+            latency_factor: Latency above this multiple of the baseline counts as congestion
+            error_threshold: Error rate (moving average) that triggers a backoff
+        """
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.latency_factor = latency_factor
+        self.error_threshold = error_threshold
+
+        self.concurrency = min(max(int(concurrency), min_concurrency), max_concurrency)
+        self.delay = min(max(float(delay), min_delay), max_delay)
+        self.good_concurrency = self.concurrency
+        self.good_delay = self.delay
+
+        self.latency = None
+        self.baseline = None
+        self.error_rate = 0.0
+        self.successes = 0
+        self.last_decrease = float("-inf")
+        self.backoffs = 0
+
+    def _decrease(self, now, retry_after=None):
+        self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+        self.delay = min(self.max_delay, max(self.delay * 2, MIN_BACKOFF_DELAY, retry_after or 0))
+        self.last_decrease = now
+        self.successes = 0
+        self.backoffs += 1
+        # The rate that led here is no longer known to be good
+        self.good_concurrency = min(self.good_concurrency, self.concurrency)
+        self.good_delay = max(self.good_delay, self.delay)
+
+    def on_success(self, latency, sent_at, now):
+        """
+        Record a successful response.
+
+        Args:
+            latency: Download latency in seconds (None if unknown)
+            sent_at: Time the request was sent
+            now: Current time (same clock as sent_at)
+
+        Returns:
+            True if the concurrency or delay changed
+        """
+        self.error_rate *= 1 - ERROR_SMOOTHING
+        if latency is not None:
+            self.latency = latency if self.latency is None else \
+                (1 - LATENCY_SMOOTHING) * self.latency + LATENCY_SMOOTHING * latency
+            self.baseline = latency if self.baseline is None else min(self.baseline, latency)
+
+            # Queueing at the origin shows up as latency before it shows up as errors
+            slow = self.latency > max(self.latency_factor * self.baseline, MIN_SLOW_LATENCY)
+            if slow and sent_at >= self.last_decrease and self.concurrency > self.min_concurrency:
+                self.concurrency -= 1
+                self.last_decrease = now
+                self.successes = 0
+                return True
+            if slow:
+                return False
+
+        self.successes += 1
+        if self.successes < self.concurrency:
+            return False
+
+        # A full window of clean responses: remember what worked, then probe higher
+        self.successes = 0
+        self.good_concurrency = self.concurrency
+        self.good_delay = self.delay
+        concurrency = min(self.max_concurrency, self.concurrency + 1)
+        delay = max(self.min_delay, self.delay * 0.75 if self.delay > 0.01 else self.min_delay)
+        changed = (concurrency, delay) != (self.concurrency, self.delay)
+        self.concurrency, self.delay = concurrency, delay
+        return changed
+
+    def on_backoff(self, sent_at, now, retry_after=None):
+        """
+        Record a 429/503 response asking the crawler to slow down.
+
+        Returns:
+            True if the concurrency or delay changed
+        """
+        if sent_at < self.last_decrease:
+            # Sent before the last decrease took effect
+            if retry_after and retry_after > self.delay:
+                self.delay = min(self.max_delay, retry_after)
+                return True
+            return False
+        self._decrease(now, retry_after)
+        return True
+
+    def on_error(self, sent_at, now):
+        """
+        Record a failed request (timeout, connection error or 5xx).
+
+        Returns:
+            True if the concurrency or delay changed
+        """
+        self.error_rate = (1 - ERROR_SMOOTHING) * self.error_rate + ERROR_SMOOTHING
+        if self.error_rate < self.error_threshold or sent_at < self.last_decrease:
+            return False
+        self._decrease(now)
+        return True
+
+    def to_dict(self):
+        """Return the state saved between runs."""
+        return {
+            "concurrency": self.good_concurrency,
+            "delay": round(self.good_delay, 3),
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "baseline": round(self.baseline, 3) if self.baseline is not None else None,
+            "updated": datetime.now().isoformat()
+        }
+
+
+class ThrottleController:
+    """Adaptive per-host concurrency and delay, persisted between runs."""
+
+    def __init__(self, start_concurrency=4, start_delay=0.0, min_concurrency=1, max_concurrency=16,
+                 min_delay=0.0, max_delay=60.0, latency_factor=3.0, error_threshold=0.2,
+                 host_limits=None, state_path=None):
+        """
+        Initialize the controller.
+
+        Args:
+            start_concurrency: Concurrency of hosts without saved state
+            start_delay: Delay of hosts without saved state
+            min_concurrency, max_concurrency: Default concurrency floor and ceiling
+            min_delay, max_delay: Default delay floor and ceiling in seconds
+            latency_factor: Latency above this multiple of a host's baseline counts as congestion
+            error_threshold: Error rate that triggers a backoff
+            host_limits: Dictionary of domain -> {"min_concurrency", "max_concurrency",
+                "min_delay", "max_delay"} overriding the defaults (subdomains match
+                their parent's limits)
+            state_path: JSON file the host state is loaded from and saved to
+        """
+        self.start_concurrency = start_concurrency
+        self.start_delay = start_delay
+        self.defaults = {
+            "min_concurrency": min_concurrency,
+            "max_concurrency": max_concurrency,
+            "min_delay": min_delay,
+            "max_delay": max_delay,
+        }
+        self.latency_factor = latency_factor
+        self.error_threshold = error_threshold
+        self.host_limits = {domain.lower().lstrip("."): limits for domain, limits in (host_limits or {}).items()}
+        self.state_path = state_path
+        self.saved = {}
+        self.hosts = {}
+
+    def load(self):
+        """Load the saved host state, if any."""
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self.saved = json.load(f)
+            logger.info(f"Loaded throttle state for {len(self.saved)} hosts from {self.state_path}")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load throttle state from {self.state_path}: {e}")
+
+    def save(self):
+        """Save the last known good state of every host seen in this or earlier runs."""
+        if not self.state_path:
+            return
+        state = dict(self.saved)
+        state.update({key: host.to_dict() for key, host in self.hosts.items()})
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def _limits_for(self, key):
+        parts = (key or "").lower().split(".")
+        for i in range(len(parts)):
+            limits = self.host_limits.get(".".join(parts[i:]))
+            if limits is not None:
+                return dict(self.defaults, **limits)
+        return self.defaults
+
+    def host(self, key):
+        """Return the throttle state of a download slot, starting from the saved state."""
+        host = self.hosts.get(key)
+        if host is None:
+            saved = self.saved.get(key, {})
+            host = HostThrottle(
+                saved.get("concurrency", self.start_concurrency),
+                saved.get("delay", self.start_delay),
+                latency_factor=self.latency_factor,
+                error_threshold=self.error_threshold,
+                **self._limits_for(key)
+            )
+            if saved.get("baseline"):
+                host.baseline = saved["baseline"]
+            self.hosts[key] = host
+        return host
+
+    def summary(self, limit=10):
+        """Return the state of the busiest hosts of this run."""
+        hosts = sorted(self.hosts.items(), key=lambda item: item[1].concurrency, reverse=True)[:limit]
+        return {
+            key: {
+                "concurrency": host.concurrency,
+                "delay": round(host.delay, 3),
+                "latency": round(host.latency, 3) if host.latency is not None else None,
+                "backoffs": host.backoffs
+            }
+            for key, host in hosts
+        }
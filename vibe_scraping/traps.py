@@ -0,0 +1,305 @@
+"""
+Crawler trap detection for vibe-scraping.
+
+Calendars, faceted filters and endless ``?page=N`` links generate URLs
+without end, and a crawl that follows them spends its page budget on pages
+with nothing new on them. :class:`TrapDetector` checks every link the spider
+is about to follow:
+
+- links whose path is too deep, or repeats a segment (``/a/b/a/b/a``), are
+  pruned;
+- a query parameter of a URL template that has taken too many distinct
+  values (filters, session ids) accepts no new ones;
+- a URL template (see :func:`vibe_scraping.scoring.url_template`) whose
+  recent fetches mostly brought no new content is throttled: only a sample
+  of its links is followed, so it can recover if its pages turn out new
+  again. A template whose links fan out past a limit is held to a higher
+  bar, but one whose pages keep being new (every article of a news site
+  shares a template) is never throttled for its size alone;
+- a template whose recent fetches brought almost no new content is pruned.
+
+A fetched page counts as new content unless its body, near-duplicate
+fingerprint or visible text was seen earlier in the crawl. Every decision is
+counted, and the templates that were throttled or pruned are reported in the
+crawl statistics. The detector's state is saved in crawl checkpoints (see
+:meth:`TrapDetector.to_dict`), so a resumed crawl keeps its pruned templates.
+"""
+
+import base64
+import hashlib
+import logging
+from collections import deque
+from urllib.parse import parse_qsl, urlsplit
+
+from vibe_scraping.scoring import url_template
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Template states
+NORMAL = "normal"
+THROTTLED = "throttled"
+PRUNED = "pruned"
+
+# Link decisions
+FOLLOW = "follow"
+THROTTLE = "throttle"
+PRUNE = "prune"
+
+
+def _digest(value):
+    return hashlib.md5(value.encode('utf-8')).digest()[:8]
+
+
+def _pack(digests):
+    """Encode a set of digests as one base64 string."""
+    return base64.b64encode(b"".join(sorted(digests))).decode('ascii')
+
+
+def _unpack(packed):
+    data = base64.b64decode(packed)
+    return {data[i:i + 8] for i in range(0, len(data), 8)}
+
+
+class TemplateState:
+    """Links, fetches and state of one URL template."""
+
+    __slots__ = ('urls', 'saturated', 'params', 'recent', 'fetches', 'new', 'state', 'reason')
+
+    def __init__(self, window):
+        self.urls = set()
+        self.saturated = False
+        # Query parameter name -> digests of its distinct values
+        self.params = {}
+        # Whether each of the last `window` fetches brought new content
+        self.recent = deque(maxlen=window)
+        self.fetches = 0
+        self.new = 0
+        self.state = NORMAL
+        self.reason = None
+
+    def to_dict(self):
+        """Return the state saved in crawl checkpoints."""
+        return {
+            'urls': _pack(self.urls),
+            'saturated': self.saturated,
+            'params': {name: _pack(values) for name, values in self.params.items()},
+            'recent': "".join("1" if new else "0" for new in self.recent),
+            'fetches': self.fetches,
+            'new': self.new,
+            'state': self.state,
+            'reason': self.reason,
+        }
+
+    def restore(self, saved):
+        """Load the state returned by to_dict."""
+        self.urls = _unpack(saved.get('urls', ""))
+        self.saturated = saved.get('saturated', False)
+        self.params = {name: _unpack(values) for name, values in saved.get('params', {}).items()}
+        self.recent.extend(flag == "1" for flag in saved.get('recent', ""))
+        self.fetches = saved.get('fetches', 0)
+        self.new = saved.get('new', 0)
+        self.state = saved.get('state', NORMAL)
+        self.reason = saved.get('reason')
+
+
+class TrapDetector:
+    """
+    Decide which links to follow from their URL shape and their template's yield.
+
+    Example:
+        detector = TrapDetector(max_template_urls=500)
+        if detector.check(url) == FOLLOW:
+            ...
+        detector.record_fetch(url, new_content=True)
+    """
+
+    def __init__(self, max_path_depth=12, max_segment_repeats=2, max_param_values=100,
+                 max_template_urls=1000, window=50, min_fetches=20, throttle_ratio=0.2,
+                 fan_out_ratio=0.5, prune_ratio=0.05, throttle_sample=4):
+        """
+        Args:
+            max_path_depth: Prune links with more path segments than this
+            max_segment_repeats: Prune links whose path repeats a segment more often than this
+            max_param_values: Distinct values a query parameter of a template takes
+                before links with new values are pruned
+            max_template_urls: Distinct links of a template after which it is throttled
+                if its yield is below fan_out_ratio
+            window: Number of a template's latest fetches its yield is measured over
+            min_fetches: Fetches of a template before its yield is judged
+            throttle_ratio: Throttle a template when fewer of its recent fetches
+                than this brought new content
+            fan_out_ratio: Throttle a template past max_template_urls links when
+                fewer of its recent fetches than this brought new content
+            prune_ratio: Prune a template when fewer of its recent fetches than this
+                brought new content
+            throttle_sample: A throttled template follows one in this many of its links
+        """
+        self.max_path_depth = max_path_depth
+        self.max_segment_repeats = max_segment_repeats
+        self.max_param_values = max_param_values
+        self.max_template_urls = max_template_urls
+        self.window = window
+        self.min_fetches = min(min_fetches, window)
+        self.throttle_ratio = throttle_ratio
+        self.fan_out_ratio = max(fan_out_ratio, throttle_ratio)
+        self.prune_ratio = prune_ratio
+        self.throttle_sample = max(1, throttle_sample)
+
+        self.templates = {}
+        self._seen_texts = set()
+        self.stats = {
+            'links_checked': 0,
+            'links_followed': 0,
+            'links_throttled': 0,
+            'links_pruned': 0,
+            'reasons': {},
+        }
+
+    @staticmethod
+    def template_key(url):
+        """Return the key a URL's template is tracked under: its host and url_template."""
+        return f"{urlsplit(url).netloc.lower()}{url_template(url)}"
+
+    def _template(self, key):
+        template = self.templates.get(key)
+        if template is None:
+            template = self.templates[key] = TemplateState(self.window)
+        return template
+
+    def _count(self, decision, reason=None):
+        self.stats['links_followed' if decision == FOLLOW else
+                   'links_throttled' if decision == THROTTLE else 'links_pruned'] += 1
+        if reason is not None:
+            self.stats['reasons'][reason] = self.stats['reasons'].get(reason, 0) + 1
+        return decision
+
+    def _set_state(self, key, template, state, reason):
+        if template.state != state:
+            template.state = state
+            template.reason = reason
+            logger.info(f"Trap detector: {state} {key} ({reason}; {template.new} new of "
+                        f"{template.fetches} fetched, {len(template.urls)} links)")
+
+    def check(self, url):
+        """
+        Decide whether to follow a link.
+
+        Returns:
+            FOLLOW, THROTTLE (left out by a throttled template's sampling) or PRUNE
+        """
+        self.stats['links_checked'] += 1
+        parts = urlsplit(url)
+
+        segments = [segment for segment in parts.path.split("/") if segment]
+        if len(segments) > self.max_path_depth:
+            return self._count(PRUNE, 'path_depth')
+        if segments and max(segments.count(segment) for segment in set(segments)) > self.max_segment_repeats:
+            return self._count(PRUNE, 'repeating_segments')
+
+        key = self.template_key(url)
+        template = self._template(key)
+        if template.state == PRUNED:
+            return self._count(PRUNE, template.reason)
+
+        for name, value in parse_qsl(parts.query, keep_blank_values=True):
+            values = template.params.setdefault(name, set())
+            digest = _digest(value)
+            if digest not in values:
+                if len(values) >= self.max_param_values:
+                    return self._count(PRUNE, 'param_cardinality')
+                values.add(digest)
+
+        # Links are counted once; a template past the limit stops keeping them
+        if not template.saturated:
+            template.urls.add(_digest(url))
+            if len(template.urls) > self.max_template_urls:
+                template.saturated = True
+                self._judge(key, template)
+
+        if template.state == THROTTLED and int.from_bytes(_digest(url), 'big') % self.throttle_sample:
+            return self._count(THROTTLE, template.reason)
+        return self._count(FOLLOW)
+
+    def is_new_text(self, text):
+        """Return True the first time a page text is seen."""
+        digest = _digest(text)
+        if digest in self._seen_texts:
+            return False
+        self._seen_texts.add(digest)
+        return True
+
+    def record_fetch(self, url, new_content):
+        """
+        Count a fetched page towards its template's yield and update the template's state.
+
+        Args:
+            url: URL of the page
+            new_content: Whether the page brought content not seen earlier in the crawl
+        """
+        key = self.template_key(url)
+        template = self._template(key)
+        template.fetches += 1
+        template.new += bool(new_content)
+        template.recent.append(bool(new_content))
+        self._judge(key, template)
+
+    def _judge(self, key, template):
+        """Set a template's state from the yield of its recent fetches."""
+        if len(template.recent) < self.min_fetches or template.state == PRUNED:
+            return
+
+        ratio = sum(template.recent) / len(template.recent)
+        if ratio < self.prune_ratio:
+            self._set_state(key, template, PRUNED, 'yield_collapsed')
+        elif ratio < self.throttle_ratio:
+            self._set_state(key, template, THROTTLED, 'low_yield')
+        elif template.saturated and ratio < self.fan_out_ratio:
+            self._set_state(key, template, THROTTLED, 'fan_out')
+        elif template.state == THROTTLED:
+            self._set_state(key, template, NORMAL, 'yield_recovered')
+
+    def to_dict(self):
+        """Return the counters, template states and seen page texts, saved in crawl checkpoints."""
+        return {
+            'stats': dict(self.stats, reasons=dict(self.stats['reasons'])),
+            'templates': {key: template.to_dict() for key, template in self.templates.items()},
+            'seen_texts': _pack(self._seen_texts),
+        }
+
+    def restore(self, saved):
+        """Continue from the state returned by to_dict (of an interrupted crawl)."""
+        stats = saved.get('stats', {})
+        self.stats.update(stats, reasons=dict(stats.get('reasons', {})))
+        for key, template in saved.get('templates', {}).items():
+            self._template(key).restore(template)
+        self._seen_texts.update(_unpack(saved.get('seen_texts', "")))
+
+    def summary(self, max_templates=20):
+        """
+        Return the link decisions and the throttled and pruned templates.
+
+        Returns:
+            Dictionary with the link counters, the count per reason, and
+            'templates': {template: {'state', 'reason', 'links', 'fetches', 'new'}}
+            for up to max_templates flagged templates, most fetched first
+        """
+        flagged = sorted(((key, template) for key, template in self.templates.items()
+                          if template.state != NORMAL),
+                         key=lambda item: item[1].fetches, reverse=True)
+        return dict(
+            self.stats,
+            reasons=dict(self.stats['reasons']),
+            templates_throttled=sum(1 for _, template in flagged if template.state == THROTTLED),
+            templates_pruned=sum(1 for _, template in flagged if template.state == PRUNED),
+            templates={
+                key: {
+                    'state': template.state,
+                    'reason': template.reason,
+                    'links': len(template.urls),
+                    'fetches': template.fetches,
+                    'new': template.new,
+                }
+                for key, template in flagged[:max_templates]
+            }
+        )
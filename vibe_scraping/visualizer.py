@@ -12,6 +12,9 @@ import matplotlib.pyplot as plt
 from urllib.parse import urlparse
 import logging
 
+from vibe_scraping.journal import load_crawl_metadata
+from vibe_scraping.crawl_index import open_crawl_index
+
 try:
     from jinja2 import Template
 except ImportError:
@@ -48,17 +51,9 @@ def generate_crawl_graph(crawl_data_path, output_file=None, max_nodes=100, title
         logger.error(f"Crawl data directory not found: {crawl_data_path}")
         return None
     
-    # Load the metadata file
-    metadata_file = os.path.join(crawl_data_path, "metadata.json")
-    if not os.path.exists(metadata_file):
-        logger.error(f"Metadata file not found: {metadata_file}")
-        return None
-    
-    try:
-        with open(metadata_file, 'r') as f:
-            metadata = json.load(f)
-    except Exception as e:
-        logger.error(f"Error loading metadata: {str(e)}")
+    # Load the metadata file (or the crawl journal of an unfinished crawl)
+    metadata = _load_crawl_metadata(crawl_data_path)
+    if metadata is None:
         return None
     
     # Get the links data
@@ -239,17 +234,9 @@ def generate_domain_graph(crawl_data_path, output_file=None, title=None,
         logger.error(f"Crawl data directory not found: {crawl_data_path}")
         return None
     
-    # Load the metadata file
-    metadata_file = os.path.join(crawl_data_path, "metadata.json")
-    if not os.path.exists(metadata_file):
-        logger.error(f"Metadata file not found: {metadata_file}")
-        return None
-    
-    try:
-        with open(metadata_file, 'r') as f:
-            metadata = json.load(f)
-    except Exception as e:
-        logger.error(f"Error loading metadata: {str(e)}")
+    # Load the metadata file (or the crawl journal of an unfinished crawl)
+    metadata = _load_crawl_metadata(crawl_data_path)
+    if metadata is None:
         return None
     
     # Get the crawled URLs
@@ -359,17 +346,9 @@ def create_dynamic_graph(crawl_data_path, output_file=None):
         logger.error(f"Crawl data directory not found: {crawl_data_path}")
         return None
     
-    # Load the metadata file
-    metadata_file = os.path.join(crawl_data_path, "metadata.json")
-    if not os.path.exists(metadata_file):
-        logger.error(f"Metadata file not found: {metadata_file}")
-        return None
-    
-    try:
-        with open(metadata_file, 'r') as f:
-            metadata = json.load(f)
-    except Exception as e:
-        logger.error(f"Error loading metadata: {str(e)}")
+    # Load the metadata file (or the crawl journal of an unfinished crawl)
+    metadata = _load_crawl_metadata(crawl_data_path)
+    if metadata is None:
         return None
     
     # Get the crawled URLs
@@ -620,17 +599,9 @@ def create_tree_visualization(crawl_data_path, output_file=None):
         logger.error(f"Crawl data directory not found: {crawl_data_path}")
         return None
     
-    # Load the metadata file
-    metadata_file = os.path.join(crawl_data_path, "metadata.json")
-    if not os.path.exists(metadata_file):
-        logger.error(f"Metadata file not found: {metadata_file}")
-        return None
-    
-    try:
-        with open(metadata_file, 'r') as f:
-            metadata = json.load(f)
-    except Exception as e:
-        logger.error(f"Error loading metadata: {str(e)}")
+    # Load the metadata file (or the crawl journal of an unfinished crawl)
+    metadata = _load_crawl_metadata(crawl_data_path)
+    if metadata is None:
         return None
     
     # Get the crawled URLs
@@ -770,6 +741,25 @@ def create_tree_visualization(crawl_data_path, output_file=None):
     logger.info(f"Tree visualization saved to {output_file}")
     return output_file
 
+def _load_crawl_metadata(crawl_data_path):
+    """Load crawl metadata from the crawl index, metadata.json or the crawl journal, logging failures."""
+    try:
+        index = open_crawl_index(crawl_data_path)
+        if index is not None:
+            # The index holds links and depths without parsing the full metadata.json
+            try:
+                return index.to_metadata()
+            finally:
+                index.close()
+        metadata = load_crawl_metadata(crawl_data_path)
+    except Exception as e:
+        logger.error(f"Error loading metadata: {str(e)}")
+        return None
+    
+    if metadata is None:
+        logger.error(f"Metadata file not found: {os.path.join(crawl_data_path, 'metadata.json')}")
+    return metadata
+
 def _get_display_name(url):
     """Get a shorter display name for a URL."""
     parsed = urlparse(url)